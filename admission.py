@@ -0,0 +1,121 @@
+"""
+Admission control for commands.
+
+Every command call is charged against four rate limits at once: the caller,
+the channel, the guild and the whole bot. It runs only if all four have room,
+so one user (or one busy server) can't use up everyone's share.
+
+Each limit is a token bucket ("burst calls, refilling over `per` seconds")
+implemented as GCRA: instead of a token count and a timestamp, a bucket is a
+single float, the time at which it will be full again. A bucket that's
+already full holds no information, so idle entries are simply deleted by a
+periodic sweep, and only recently active users/channels/guilds take memory.
+"""
+import time
+from collections import Counter
+
+SCOPES = ("global", "guild", "channel", "user")
+# Slack on bucket depth for float rounding, so a call costing exactly the
+# burst still fits an idle bucket
+_EPSILON = 1e-9
+
+
+def parse_limit(value: str) -> tuple[float, float]:
+    """
+    Parse "burst/seconds", e.g. "5/10" for 5 calls per 10 seconds.
+    Raises ValueError unless both are positive and burst is at least 1.
+    """
+    try:
+        burst, per = (float(part) for part in value.split("/"))
+    except ValueError:
+        raise ValueError(
+            f"Rate limit {value!r} must look like calls/seconds."
+        ) from None
+    if not burst >= 1 or not 0 < per < float("inf"):
+        raise ValueError(
+            f"Rate limit {value!r} needs at least 1 call per a positive "
+            f"number of seconds."
+        )
+    return burst, per
+
+
+class Admission:
+    """
+    Hierarchical token buckets keyed by scope and ID.
+    """
+
+    def __init__(self, limits: dict[str, tuple[float, float]],
+                 sweep_interval: float = 60.0):
+        # Scope -> (seconds per token, bucket depth in seconds)
+        self._limits = {
+            scope: (per / burst, per + _EPSILON)
+            for scope, (burst, per) in limits.items()
+        }
+        self._bursts = {scope: burst for scope, (burst, _) in limits.items()}
+        # Scope -> {ID: time the bucket is full again}
+        self._full_at: dict[str, dict[int, float]] = {
+            scope: {} for scope in limits
+        }
+        self.sweep_interval = sweep_interval
+        self._next_sweep = time.monotonic() + sweep_interval
+        self.admitted = 0
+        self.rejected = Counter()
+
+    def admit(self, user_id: int, channel_id: int = None,
+              guild_id: int = None, cost: float = 1.0):
+        """
+        Charge one call of the given cost. Returns None if it may run, or the
+        name of the scope that's out of room.
+        """
+        now = time.monotonic()
+        if now >= self._next_sweep:
+            self._sweep(now)
+
+        keys = (
+            ("global", 0), ("guild", guild_id), ("channel", channel_id),
+            ("user", user_id)
+        )
+        charged = []
+        for scope, key in keys:
+            limit = self._limits.get(scope)
+            if limit is None or key is None:
+                continue
+            interval, depth = limit
+            buckets = self._full_at[scope]
+            full_at = max(buckets.get(key, now), now) + cost * interval
+            if full_at - now > depth:
+                self.rejected[scope] += 1
+                return scope
+            charged.append((buckets, key, full_at))
+
+        # Only charge once every scope has room
+        for buckets, key, full_at in charged:
+            buckets[key] = full_at
+        self.admitted += 1
+        return None
+
+    def max_cost(self) -> float:
+        """
+        The most a single call can cost and still be admitted: the smallest
+        burst of any scope (infinite without limits). Calls costing more are
+        always rejected, so check command costs against it at startup.
+        """
+        return min(self._bursts.values(), default=float("inf"))
+
+    def _sweep(self, now: float):
+        """
+        Forget buckets that have refilled completely.
+        """
+        for buckets in self._full_at.values():
+            for key in [k for k, full_at in buckets.items() if full_at <= now]:
+                del buckets[key]
+        self._next_sweep = now + self.sweep_interval
+
+    def stats(self) -> dict:
+        return {
+            "admitted": self.admitted,
+            "rejected": dict(self.rejected),
+            "tracked": {
+                scope: len(buckets) for scope, buckets in self._full_at.items()
+            }
+        }
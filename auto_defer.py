@@ -0,0 +1,121 @@
+"""
+Latency-budget auto-defer for slash commands.
+
+Discord fails an interaction that isn't answered within 3 seconds of being
+created. budgeted() hands a command handler a stand-in for its interaction
+whose `response` is a BudgetedResponse, which defers on the command's
+behalf once `budget` seconds have passed since the interaction was created
+(queueing time before the handler ran counts). If that happens, the
+command's own send_message() later goes out as the follow-up that replaces
+the "thinking..." message, so handlers are written as if they always answer
+in time. The interaction itself isn't modified.
+"""
+import asyncio
+
+import discord
+
+
+class _FollowupCallback:
+    """
+    Stands in for the InteractionCallbackResponse that send_message()
+    returns, for a reply that went out as a follow-up.
+    """
+    __slots__ = ("message_id", "resource")
+
+    def __init__(self, message):
+        self.message_id = message.id
+        self.resource = message
+
+
+class BudgetedResponse:
+    """
+    Wrapper around an InteractionResponse that can be deferred from a timer
+    without racing the handler's own response.
+    """
+
+    def __init__(self, interaction: discord.Interaction, on_defer=None):
+        self._interaction = interaction
+        self._response = interaction.response
+        self._on_defer = on_defer
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.timer = None
+        self.auto_deferred = False
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def start_defer(self):
+        """
+        Timer callback: defer now unless the handler has answered.
+        """
+        self._task = asyncio.create_task(self._auto_defer())
+
+    async def _auto_defer(self):
+        async with self._lock:
+            if not self._response.is_done():
+                await self._response.defer()
+                self.auto_deferred = True
+                if self._on_defer is not None:
+                    self._on_defer()
+
+    async def wait(self):
+        """
+        Wait for a defer that is still in flight.
+        """
+        if self._task is not None:
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def defer(self, **kwargs):
+        async with self._lock:
+            if self.auto_deferred:
+                return None  # Already done on the handler's behalf
+            return await self._response.defer(**kwargs)
+
+    async def send_message(self, content=None, **kwargs):
+        async with self._lock:
+            if not self.auto_deferred:
+                return await self._response.send_message(content, **kwargs)
+        delete_after = kwargs.pop("delete_after", None)
+        if kwargs.get("ephemeral", False):
+            # The public "thinking..." message would turn into a public
+            # reply; remove it and send the reply as a private follow-up
+            await self._interaction.delete_original_response()
+        message = await self._interaction.followup.send(
+            content, wait=True, **kwargs
+        )
+        if delete_after is not None:
+            await message.delete(delay=delete_after)
+        return _FollowupCallback(message)
+
+
+class BudgetedInteraction:
+    """
+    What a command handler gets instead of its interaction: the same in
+    every respect, except that `response` is a BudgetedResponse.
+    """
+    __slots__ = ("_interaction", "response")
+
+    def __init__(self, interaction: discord.Interaction,
+                 response: BudgetedResponse):
+        self._interaction = interaction
+        self.response = response
+
+    def __getattr__(self, name):
+        return getattr(self._interaction, name)
+
+
+def budgeted(interaction: discord.Interaction, budget: float,
+             on_defer=None) -> BudgetedInteraction:
+    """
+    Wrap `interaction` for a handler, deferring it once `budget` seconds
+    have passed since Discord created it and calling `on_defer` if it
+    does. Cancel the returned interaction's `response.timer` when the
+    handler is done.
+    """
+    response = BudgetedResponse(interaction, on_defer)
+    age = (discord.utils.utcnow() - interaction.created_at).total_seconds()
+    response.timer = asyncio.get_running_loop().call_later(
+        max(0.0, budget - max(0.0, age)), response.start_defer
+    )
+    return BudgetedInteraction(interaction, response)
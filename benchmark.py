@@ -0,0 +1,387 @@
+"""
+Microbenchmarks for Deathbot's hot paths.
+
+Imports main.py without starting the bot and times the code that runs on
+every command: loadout, threat, diagnostic and protocol generation, and the
+with_error_handling() wrapper on its happy and error paths, called with fake
+Interaction and Context objects. Each benchmark reports its CPU cost
+relative to a fixed reference workload timed in between (which keeps
+results steady on a busy machine), operations per second, and memory: the
+peak allocated while one call runs and the bytes still held per call
+afterwards (non-zero means something is accumulating).
+
+Results are compared against a JSON baseline, and the run fails if anything
+got slower or hungrier than the tolerance allows. Baselines are only
+comparable on the same machine and Python version, so save one before a
+change and compare after it:
+
+Usage:
+    python3 benchmark.py --save                  # Record the baseline
+    python3 benchmark.py                         # Compare against it
+    python3 benchmark.py --filter protocol --rounds 30
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+import discord
+from discord import Interaction
+from discord.ext import commands
+
+separator = "-" * 20
+
+# Peak memory growth ignored however large it is relative to the baseline,
+# and retained bytes per call that count as a leak
+PEAK_SLACK = 256
+RETAINED_SLACK = 16
+
+
+class FakeUser:
+    __slots__ = ("id", "mention", "bot")
+
+    def __init__(self, user_id: int):
+        self.id = user_id
+        self.mention = f"<@{user_id}>"
+        self.bot = False
+
+
+class FakeResponse:
+    """
+    InteractionResponse stand-in that answers instantly.
+    """
+    __slots__ = ("done",)
+
+    def __init__(self):
+        self.done = False
+
+    def is_done(self) -> bool:
+        return self.done
+
+    async def send_message(self, *args, **kwargs):
+        self.done = True
+
+    async def defer(self, **kwargs):
+        self.done = True
+
+
+class FakeInteraction(Interaction):
+    """
+    Slash command interaction with only what the command code reads.
+    """
+    # Plain attributes instead of properties; no guild cache, as in HTTP
+    # interactions mode
+    guild = channel_id = None
+
+    def __init__(self, user_id: int = 1, channel_id: int = 2,
+                 guild_id: int = 3):
+        self.user = FakeUser(user_id)
+        self.channel_id = channel_id
+        self.guild_id = guild_id
+        self.application_id = 4
+        self.token = "token"
+        self._cs_response = FakeResponse()
+
+
+class FakeContext(commands.Context):
+    """
+    Prefix command context with only what the command code reads.
+    """
+    author = channel = guild = None  # Plain attributes instead of properties
+
+    def __init__(self, user_id: int = 1, channel_id: int = 2):
+        self.author = FakeUser(user_id)
+        self.channel = discord.Object(channel_id)
+
+    async def send(self, *args, **kwargs):
+        pass
+
+
+def drive(coro):
+    """
+    Run a coroutine that never suspends to completion without the event
+    loop, so its own cost is all that's measured.
+    """
+    try:
+        coro.send(None)
+    except StopIteration as stop:
+        return stop.value
+    coro.close()
+    raise RuntimeError("Benchmarked coroutine suspended")
+
+
+def import_main():
+    """
+    Import main.py with its state files in a temporary directory, usage
+    stats and rate limits off, and error logs discarded.
+    """
+    state_dir = tempfile.mkdtemp(prefix="deathbot-bench-")
+    os.environ.update({
+        "SYNC_STATE_PATH": os.path.join(state_dir, "sync.json"),
+        "TIMER_STATE_PATH": os.path.join(state_dir, "timers.json"),
+        "GUILD_STATE_PATH": os.path.join(state_dir, "guilds.json"),
+        "SEEN_LOADOUTS_DIR": os.path.join(state_dir, "seen"),
+        "LOADOUT_PAGES_DIR": os.path.join(state_dir, "pages"),
+        "STATS_DB_PATH": "",
+        "ERROR_LOG_PATH": os.devnull,
+        # Repeats of one error are only counted, as in an error storm
+        "ERROR_LOG_WINDOW": "86400"
+    })
+    for scope in ("USER", "CHANNEL", "GUILD", "GLOBAL"):
+        os.environ[f"RATE_LIMIT_{scope}"] = ""
+    import main
+    return main
+
+
+def reference():
+    """
+    Fixed pure-Python workload (formatting, dicts, lists) that no change to
+    the bot can affect, timed alongside every benchmark.
+    """
+    table = {}
+    for i in range(40):
+        table[f"key-{i}"] = [i, i * 3, str(i)]
+    return sum(len(value[2]) for value in table.values())
+
+
+def benchmarks(main) -> dict:
+    """
+    Name -> zero-argument callable for every benchmark.
+    """
+    content = main.content_store.current
+    # A loosely typed ID that needs the fuzzy index, like "89-O" for 89-Ω
+    loose_id = next(
+        (proto_id.translate({ord("Ω"): "O", ord("π"): "pi"})
+         for proto_id in content.protocols if not proto_id.isascii()),
+        next(iter(content.protocols))
+    )
+    plain_id = next(
+        proto_id for proto_id, entry in content.protocols.items()
+        if entry.get("action") != "selfdestruct"
+    )
+    protocol_body = main.protocol.callback.__wrapped__.__wrapped__
+
+    @main.with_error_handling()
+    async def ok(ctx):
+        pass
+
+    @main.with_error_handling()
+    async def fail(ctx):
+        raise ValueError("benchmark")
+
+    async def bare(ctx):
+        pass
+
+    return {
+        "get_loadout": lambda: main.get_loadout(3),
+        "get_loadout_unseen": lambda: main.get_loadout(3, unseen=True),
+        "get_threat": lambda: drive(main.get_threat()),
+        "diagnostic_report": lambda: main.diagnostic_report("<@1>"),
+        "protocol_resolve": lambda: content.protocol_index.resolve(loose_id),
+        "protocol_complete": lambda: content.protocol_index.complete("8"),
+        "protocol_command": lambda: drive(
+            protocol_body(FakeInteraction(), plain_id)
+        ),
+        "handler_bare": lambda: drive(bare(FakeInteraction())),
+        "handler_ok_interaction": lambda: drive(ok(FakeInteraction())),
+        "handler_error_interaction": lambda: drive(fail(FakeInteraction())),
+        "handler_ok_context": lambda: drive(ok(FakeContext())),
+        "handler_error_context": lambda: drive(fail(FakeContext()))
+    }
+
+
+def _slice(func) -> tuple[timeit.Timer, int]:
+    """
+    A timer for `func` and a call count that takes about 40 ms of CPU.
+    """
+    timer = timeit.Timer(func, timer=time.process_time)
+    number, _ = timer.autorange()  # At least 0.2 s
+    return timer, max(1, number // 5)
+
+
+def measure(func, rounds: int) -> dict:
+    """
+    Time and memory figures for one benchmark. Slices of the benchmark
+    alternate with slices of reference(), and the median ratio between
+    neighbouring slices is its relative cost. That cancels out whatever
+    else is slowing the machine down at the time, so it's what baselines
+    are compared on; ops/sec is the median of the benchmark's own slices.
+    """
+    timer, number = _slice(func)
+    ref_timer, ref_number = _slice(reference)
+    times, ratios = [], []
+    for _ in range(rounds):
+        ref_time = ref_timer.timeit(ref_number) / ref_number
+        per_call = timer.timeit(number) / number
+        times.append(per_call)
+        ratios.append(per_call / ref_time)
+    per_call = statistics.median(times)
+
+    gc.collect()
+    tracemalloc.start()
+    func()  # Warm up caches so they don't count as this call's memory
+    start, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    func()
+    current, peak = tracemalloc.get_traced_memory()
+    peak -= start
+    start = current
+    calls = min(number * 5, 1000)
+    for _ in range(calls):
+        func()
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "relative_cost": statistics.median(ratios),
+        "ops_per_sec": 1 / per_call,
+        "us_per_op": per_call * 1e6,
+        "peak_bytes": max(0, peak),
+        "retained_bytes_per_op": max(0, current - start) / calls
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Regressions of `results` against `baseline`, as printable lines.
+    """
+    regressions = []
+    for name, row in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        slowdown = row["relative_cost"] / base["relative_cost"] - 1
+        if slowdown > tolerance:
+            regressions.append(
+                f"{name}: {slowdown:.0%} slower ({row['relative_cost']:.2f} "
+                f"reference units, was {base['relative_cost']:.2f})"
+            )
+        if row["peak_bytes"] > max(base["peak_bytes"] * (1 + tolerance),
+                                   base["peak_bytes"] + PEAK_SLACK):
+            regressions.append(
+                f"{name}: peak {row['peak_bytes']:,} bytes, was "
+                f"{base['peak_bytes']:,}"
+            )
+        if row["retained_bytes_per_op"] > \
+                base["retained_bytes_per_op"] + RETAINED_SLACK:
+            regressions.append(
+                f"{name}: retains {row['retained_bytes_per_op']:,.0f} "
+                f"bytes per call, was {base['retained_bytes_per_op']:,.0f}"
+            )
+    return regressions
+
+
+def environment() -> dict:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "discord.py": discord.__version__
+    }
+
+
+async def run(args) -> int:
+    main = import_main()
+    random.seed(args.seed)
+    selected = {
+        name: func for name, func in benchmarks(main).items()
+        if not args.filter or args.filter in name
+    }
+    print(f"Running {len(selected)} benchmarks, {args.rounds} rounds each."
+          f"\n{separator}")
+
+    baseline = None
+    if not args.save and os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if baseline.get("environment") != environment():
+            print(f"[ERROR]: {args.baseline} was recorded on a different "
+                  f"machine or Python; comparisons are only indicative.",
+                  file=sys.stderr)
+    base_rows = baseline["results"] if baseline else {}
+
+    results = {}
+    for name, func in selected.items():
+        row = results[name] = measure(func, args.rounds)
+        base = base_rows.get(name)
+        change = f"{row['relative_cost'] / base['relative_cost'] - 1:+7.1%}" \
+            if base else ""
+        print(f"  {name:<26} {row['relative_cost']:>7.2f}x ref {change:>8} "
+              f"{row['ops_per_sec']:>12,.0f} ops/s {row['us_per_op']:>8.2f} us"
+              f"  peak "
+              f"{row['peak_bytes']:>7,} B  retained "
+              f"{row['retained_bytes_per_op']:>6,.0f} B/op")
+
+    if "handler_bare" in results:
+        bare = results["handler_bare"]["us_per_op"]
+        print(f"{separator}\nwith_error_handling() overhead per call:")
+        for name in ("handler_ok_interaction", "handler_error_interaction",
+                     "handler_ok_context", "handler_error_context"):
+            if name in results:
+                print(f"  {name[8:]:<26} "
+                      f"{results[name]['us_per_op'] - bare:8.2f} us")
+
+    record = {
+        "environment": environment(),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "results": results
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(record, file, indent=2)
+    if args.save:
+        if args.filter and os.path.exists(args.baseline):
+            # Keep benchmarks this run filtered out
+            with open(args.baseline, encoding="utf-8") as file:
+                kept = json.load(file).get("results", {})
+            record["results"] = {**kept, **results}
+        with open(args.baseline, "w", encoding="utf-8") as file:
+            json.dump(record, file, indent=2)
+        print(f"{separator}\nSaved baseline to {args.baseline}.")
+        return 0
+    if baseline is None:
+        print(f"{separator}\nNo baseline at {args.baseline}; run with --save "
+              f"to record one.")
+        return 0
+
+    regressions = compare(results, base_rows, args.tolerance)
+    if regressions:
+        print(f"{separator}\nRegressions against {args.baseline} "
+              f"(tolerance {args.tolerance:.0%}):")
+        for line in regressions:
+            print(f"  {line}")
+        return 1
+    print(f"{separator}\nNo regressions against {args.baseline}.")
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--baseline", default="bench_baseline.json",
+                        help="Baseline JSON file to compare against.")
+    parser.add_argument("--save", action="store_true",
+                        help="Record this run as the baseline instead.")
+    parser.add_argument("--tolerance", type=float, default=0.15,
+                        help="Allowed slowdown or peak memory growth (0-1).")
+    parser.add_argument("--rounds", type=int, default=10,
+                        help="Timing rounds per benchmark; the median counts.")
+    parser.add_argument("--filter", default="",
+                        help="Only run benchmarks with this in their name.")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="Random seed, so every run draws the same.")
+    parser.add_argument("--json", help="Also write results to this file.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
@@ -0,0 +1,82 @@
+"""
+Hash-gated slash command syncing.
+
+Syncing pushes the whole command tree to Discord and has strict rate limits,
+but on_ready fires again on every reconnect. Instead of syncing every time,
+the tree is serialized the same way discord.py sends it, hashed, and the hash
+is saved to a local state file. A sync only happens when the hash differs
+from the last successful sync for that application and scope.
+"""
+import hashlib
+import json
+import os
+import sys
+
+from discord import Object, app_commands
+
+# Where the last synced hashes are stored
+SYNC_STATE_PATH = os.getenv(
+    "SYNC_STATE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                 ".command_sync.json")
+)
+
+
+def tree_hash(tree: app_commands.CommandTree, guild=None) -> str:
+    """
+    Return a canonical SHA-256 hash of the commands that would be synced to
+    the given guild (or globally if guild is None).
+    """
+    payload = sorted(
+        (command.to_dict(tree) for command in tree.get_commands(guild=guild)),
+        key=lambda c: (c.get("type", 1), c["name"])
+    )
+    blob = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+
+def load_sync_state(path: str = SYNC_STATE_PATH) -> dict:
+    """
+    Read the saved hashes; a missing or corrupt file means nothing is synced.
+    """
+    try:
+        with open(path, encoding="utf-8") as file:
+            state = json.load(file)
+    except (OSError, ValueError):
+        return {}
+    return state if isinstance(state, dict) else {}
+
+
+def save_sync_state(state: dict, path: str = SYNC_STATE_PATH):
+    """
+    Atomically write the saved hashes.
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as file:
+        json.dump(state, file, indent=2, sort_keys=True)
+    os.replace(temp_path, path)
+
+
+async def sync_if_changed(tree: app_commands.CommandTree, guild_id=None,
+                          force: bool = False, path: str = SYNC_STATE_PATH):
+    """
+    Sync the command tree globally, or to one guild if guild_id is given,
+    but only if it changed since the last successful sync.
+    Returns the list of synced commands, or None if the sync was skipped.
+    """
+    guild = Object(id=guild_id) if guild_id else None
+    scope = f"{tree.client.application_id}:{guild_id or 'global'}"
+    digest = tree_hash(tree, guild=guild)
+
+    state = load_sync_state(path)
+    if not force and state.get(scope) == digest:
+        return None
+
+    synced = await tree.sync(guild=guild)
+    state[scope] = digest
+    try:
+        save_sync_state(state, path)
+    except OSError as err:
+        print(f"[ERROR]: Could not save command sync state: {err}",
+              file=sys.stderr)
+    return synced
@@ -0,0 +1,443 @@
+"""
+Content store for Deathbot's random generators.
+
+Threats, protocols, loadout parts and diagnose templates live in an on-disk
+JSON file (content.json by default). It is parsed and validated into an
+immutable Content snapshot, which ContentStore swaps in atomically whenever
+the file changes. Handlers grab ``content_store.current`` once and keep using
+that snapshot, so a reload never changes content mid-interaction.
+
+Every weighted entry is compiled into an alias table (Vose's method), so a
+draw costs one random number and two tuple lookups no matter how many entries
+or how skewed the weights are.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import sys
+from functools import partial
+from random import random, randint, choice
+from string import Formatter
+from types import MappingProxyType
+
+from protocol_index import ProtocolIndex
+
+# Default location of the content file, next to this module
+CONTENT_PATH = os.getenv(
+    "CONTENT_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "content.json")
+)
+
+
+class WeightedTable:
+    """
+    Immutable table of (item, weight) entries with O(1) weighted sampling.
+    """
+    __slots__ = ("items", "weights", "_prob", "_alias", "_size")
+
+    def __init__(self, entries):
+        items = []
+        weights = []
+        for item, weight in entries:
+            if isinstance(weight, bool) or \
+                    not isinstance(weight, (int, float)) or \
+                    not math.isfinite(weight) or weight <= 0:
+                raise ValueError(
+                    f"Weight for {item!r} must be a positive finite number."
+                )
+            items.append(item)
+            weights.append(weight)
+        if not items:
+            raise ValueError("A weighted table needs at least one entry.")
+
+        self.items = tuple(items)
+        self.weights = tuple(weights)
+        self._size = len(items)
+
+        # Scale weights so the average bucket holds exactly 1.0
+        total = sum(weights)
+        scaled = [w * self._size / total for w in weights]
+        prob = [1.0] * self._size
+        alias = list(range(self._size))
+        small = [i for i, p in enumerate(scaled) if p < 1.0]
+        large = [i for i, p in enumerate(scaled) if p >= 1.0]
+
+        # Pair each underfull bucket with an overfull one
+        while small and large:
+            less = small.pop()
+            more = large.pop()
+            prob[less] = scaled[less]
+            alias[less] = more
+            scaled[more] -= 1.0 - scaled[less]
+            if scaled[more] < 1.0:
+                small.append(more)
+            else:
+                large.append(more)
+
+        # Leftovers are full buckets (up to float rounding)
+        self._prob = tuple(prob)
+        self._alias = tuple(alias)
+
+    def __len__(self):
+        return self._size
+
+    def draw(self):
+        """
+        Return one item, chosen with probability proportional to its weight.
+        """
+        u = random() * self._size
+        i = int(u)
+        if u - i < self._prob[i]:
+            return self.items[i]
+        return self.items[self._alias[i]]
+
+    def draw_index(self):
+        """
+        Like draw(), but return the item's index instead of the item.
+        """
+        u = random() * self._size
+        i = int(u)
+        return i if u - i < self._prob[i] else self._alias[i]
+
+    def draw_indices(self, count):
+        """
+        Draw `count` item indices in one go (same odds as draw()), for
+        batches that only resolve items when they're displayed.
+        """
+        size, prob, alias = self._size, self._prob, self._alias
+        indices = []
+        append = indices.append
+        for _ in range(count):
+            u = random() * size
+            i = int(u)
+            append(i if u - i < prob[i] else alias[i])
+        return indices
+
+
+class _Fields(dict):
+    """
+    Lazily generated template values; only placeholders in use are rolled.
+    """
+    __slots__ = ("_generators",)
+
+    def __init__(self, generators):
+        super().__init__()
+        self._generators = generators
+
+    def __missing__(self, key):
+        value = self[key] = self._generators[key]()
+        return value
+
+
+class Content:
+    """
+    Immutable snapshot of all bot content loaded from one content file.
+    """
+    __slots__ = (
+        "heads", "arms", "cores", "threats", "protocols", "protocol_items",
+        "protocol_index", "diagnostics", "recommendations", "loadout_key",
+        "_fields", "_responses"
+    )
+
+    def __init__(self, *, fields, heads, arms, cores, threats, protocols,
+                 diagnostics, recommendations):
+        self._fields = MappingProxyType(fields)
+        self.heads = heads
+        self.arms = arms
+        self.cores = cores
+        # Short hash of the loadout part lists. Loadout numbers (see
+        # loadout_number) only mean the same thing under the same key.
+        self.loadout_key = hashlib.blake2b(
+            json.dumps((heads.items, arms.items, cores.items)).encode(),
+            digest_size=6
+        ).hexdigest()
+        self.threats = threats
+        self.protocols = MappingProxyType(protocols)
+        self.protocol_items = tuple(protocols.items())
+        # Protocol ID -> (reply, whether it has fields to re-roll each time).
+        # Replies without fields are rendered here, once per content load.
+        self._responses = {}
+        titles = {}
+        hidden = []
+        for proto_id, entry in protocols.items():
+            if entry.get("action"):
+                # Easter eggs like 8.19-β stay out of autocomplete
+                hidden.append(proto_id)
+                continue
+            template = f"**{entry['title']}**\n{entry['message']}"
+            dynamic = _has_fields(template)
+            self._responses[proto_id] = (
+                template if dynamic else self.render(template), dynamic
+            )
+            titles[proto_id] = self.render(entry["title"])
+        self.protocol_index = ProtocolIndex(titles, hidden)
+        self.diagnostics = tuple(diagnostics)
+        self.recommendations = tuple(recommendations)
+
+    @property
+    def loadout_combinations(self):
+        """
+        Number of distinct (head, left arm, right arm, core) loadouts.
+        """
+        return len(self.heads) * len(self.arms) ** 2 * len(self.cores)
+
+    def loadout_number(self, head, l_arm, r_arm, core):
+        """
+        Dense index (0 to loadout_combinations - 1) of a loadout given as
+        part indices.
+        """
+        arms = len(self.arms)
+        return ((head * arms + l_arm) * arms + r_arm) * len(self.cores) + core
+
+    def loadout_parts(self, number):
+        """
+        Inverse of loadout_number: (head, left arm, right arm, core) indices.
+        """
+        number, core = divmod(number, len(self.cores))
+        number, r_arm = divmod(number, len(self.arms))
+        head, l_arm = divmod(number, len(self.arms))
+        return head, l_arm, r_arm, core
+
+    def protocol_response(self, proto_id):
+        """
+        The reply for a (non-action) protocol.
+        """
+        text, dynamic = self._responses[proto_id]
+        return self.render(text) if dynamic else text
+
+    def render(self, template):
+        """
+        Fill a template's {field} placeholders with freshly rolled values.
+        """
+        return template.format_map(_Fields(self._fields))
+
+
+def _compile_field(name, spec):
+    """
+    Turn a field spec from the content file into a zero-argument generator.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError(f"Field {name!r} must be an object.")
+    if "choice" in spec:
+        options = spec["choice"]
+        if not isinstance(options, list) or not options or \
+                not all(isinstance(o, str) for o in options):
+            raise ValueError(f"Field {name!r} needs a list of strings.")
+        return partial(choice, tuple(options))
+    if "randint" in spec:
+        bounds = spec["randint"]
+        if not isinstance(bounds, list) or len(bounds) != 2 or \
+                not all(_is_int(bound) for bound in bounds) or \
+                bounds[0] > bounds[1]:
+            raise ValueError(f"Field {name!r} has an invalid randint range.")
+        low, high = bounds
+        divisor = spec.get("divisor")
+        if divisor is None:
+            return partial(randint, low, high)
+        if isinstance(divisor, bool) or \
+                not isinstance(divisor, (int, float)) or \
+                not math.isfinite(divisor):
+            raise ValueError(f"Field {name!r} has a non-numeric divisor.")
+        if not divisor:
+            raise ValueError(f"Field {name!r} has a zero divisor.")
+        return lambda: randint(low, high) / divisor
+    raise ValueError(f"Field {name!r} must define 'choice' or 'randint'.")
+
+
+def _is_int(value):
+    """
+    Whether a JSON value is an integer (JSON true/false are bools, not ints).
+    """
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _has_fields(template):
+    """
+    Whether a template has any {field} placeholders.
+    """
+    return any(f for _, f, _, _ in Formatter().parse(template))
+
+
+def _check_template(template, fields, where):
+    """
+    Make sure a template only uses placeholders defined under "fields", by
+    name, and renders with them.
+    """
+    if not isinstance(template, str) or not template:
+        raise ValueError(f"Empty or non-string text in {where}.")
+    try:
+        names = [f for _, f, _, _ in Formatter().parse(template)
+                 if f is not None]
+    except ValueError as err:
+        raise ValueError(f"Bad template in {where}: {err}") from None
+    for name in names:
+        if not name or name[0].isdigit():
+            raise ValueError(
+                f"Positional placeholder {{{name}}} in {where}; use a field "
+                f"name."
+            )
+        if name not in fields:
+            raise ValueError(f"Unknown field {{{name}}} in {where}.")
+    # Format specs and conversions are only checked by rendering
+    try:
+        template.format_map(_Fields(fields))
+    except (ValueError, TypeError, KeyError, IndexError,
+            AttributeError) as err:
+        raise ValueError(f"Bad template in {where}: {err}") from None
+    return template
+
+
+def _check_text(text, fields, where):
+    """
+    Make sure a loadout part is plain text. Parts are shown as they are, not
+    rendered, so braces would show up literally.
+    """
+    if not isinstance(text, str) or not text:
+        raise ValueError(f"Empty or non-string text in {where}.")
+    if "{" in text or "}" in text:
+        raise ValueError(f"Braces in {where} entry {text!r}; loadout parts "
+                         f"are plain text, not templates.")
+    return text
+
+
+def _compile_table(data, key, fields, check=_check_template):
+    """
+    Validate a list of [text, weight] entries with `check` and build its
+    alias table.
+    """
+    entries = data.get(key)
+    if not isinstance(entries, list):
+        raise ValueError(f"{key!r} must be a list of [text, weight] entries.")
+    checked = []
+    for entry in entries:
+        if not isinstance(entry, list) or len(entry) != 2:
+            raise ValueError(
+                f"{key!r} entries must be [text, weight] pairs, not {entry!r}."
+            )
+        text, weight = entry
+        checked.append((check(text, fields, key), weight))
+    return WeightedTable(checked)
+
+
+def _section(data, key, kind):
+    """
+    A top-level section of the content file, checked to be a `kind` (dict
+    or list). Missing sections are empty.
+    """
+    section = data.get(key, kind())
+    if not isinstance(section, kind):
+        noun = "an object" if kind is dict else "a list"
+        raise ValueError(f"{key!r} must be {noun}.")
+    return section
+
+
+def load_content(path=CONTENT_PATH):
+    """
+    Read, validate and compile a content file into a Content snapshot.
+    Raises ValueError (or OSError) if the file is missing or invalid.
+    This does blocking I/O; call it via asyncio.to_thread from the bot.
+    """
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    if not isinstance(data, dict):
+        raise ValueError("The content file must hold a JSON object.")
+
+    fields = {
+        name: _compile_field(name, spec)
+        for name, spec in _section(data, "fields", dict).items()
+    }
+
+    protocols = {}
+    for proto_id, entry in _section(data, "protocols", dict).items():
+        if not isinstance(entry, dict):
+            raise ValueError(f"Protocol {proto_id!r} must be an object.")
+        if entry.get("action") == "selfdestruct":
+            protocols[proto_id] = MappingProxyType({"action": "selfdestruct"})
+            continue
+        where = f"protocol {proto_id!r}"
+        protocols[proto_id] = MappingProxyType({
+            "title": _check_template(entry.get("title"), fields, where),
+            "message": _check_template(entry.get("message"), fields, where)
+        })
+    if not protocols:
+        raise ValueError("At least one protocol is required.")
+
+    diagnostics = [
+        _check_template(t, fields, "diagnostics")
+        for t in _section(data, "diagnostics", list)
+    ]
+    if len(diagnostics) < 4:
+        raise ValueError("At least 4 diagnostics templates are required.")
+    recommendations = [
+        _check_template(t, fields, "recommendations")
+        for t in _section(data, "recommendations", list)
+    ]
+    if not recommendations:
+        raise ValueError("At least one recommendation is required.")
+
+    return Content(
+        fields=fields,
+        heads=_compile_table(data, "heads", fields, _check_text),
+        arms=_compile_table(data, "arms", fields, _check_text),
+        cores=_compile_table(data, "cores", fields, _check_text),
+        threats=_compile_table(data, "threats", fields),
+        protocols=protocols,
+        diagnostics=diagnostics,
+        recommendations=recommendations
+    )
+
+
+class ContentStore:
+    """
+    Holds the live Content snapshot and hot-reloads it when the file changes.
+    """
+
+    def __init__(self, path=CONTENT_PATH):
+        self.path = path
+        self._stamp = self._file_stamp()
+        # Initial load is synchronous; a bad file should stop startup
+        self.current = load_content(path)
+
+    def _file_stamp(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    async def reload(self):
+        """
+        Load the file in a worker thread and swap it in if it validates.
+        Returns True if the new content is now live.
+        """
+        try:
+            content = await asyncio.to_thread(load_content, self.path)
+        except (OSError, ValueError, TypeError, KeyError) as err:
+            print(
+                f"[ERROR]: Content reload from {self.path} failed, keeping "
+                f"the previous content: {err!r}",
+                file=sys.stderr
+            )
+            return False
+        # A single attribute assignment; readers see old or new, never a mix
+        self.current = content
+        print(f"Reloaded content from {self.path}.")
+        return True
+
+    async def watch(self, interval=2.0):
+        """
+        Poll the content file and reload it whenever it changes.
+        """
+        while True:
+            await asyncio.sleep(interval)
+            stamp = self._file_stamp()
+            if stamp is not None and stamp != self._stamp:
+                self._stamp = stamp
+                try:
+                    await self.reload()
+                except Exception as err:
+                    # Keep watching; the next edit may well fix it
+                    print(f"[ERROR]: Content reload from {self.path} "
+                          f"failed: {err!r}", file=sys.stderr)
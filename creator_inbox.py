@@ -0,0 +1,236 @@
+"""
+Batched DM delivery to the bot's creator.
+
+/threaten_creator used to fetch the creator over REST and send a DM on every
+call, so a busy server ran into DM rate limits and the 3-second interaction
+window. Instead, the creator's user and DM channel are cached for `ttl`
+seconds (refreshed in the background once stale), and threats are queued and
+sent by one worker as digest DMs, at most one every `interval` seconds. A
+quiet period still gets each threat on its own straight away; a burst is
+packed into as few 2000-character messages as possible.
+
+The refresh and the worker run as tasks of the bot's TaskSupervisor. On
+shutdown, flush() sends whatever is still queued without waiting out the
+interval.
+"""
+import asyncio
+import sys
+import time
+from collections import deque
+
+import discord
+
+# Discord's message length limit
+MESSAGE_LIMIT = 2000
+
+
+class _Threat:
+    """
+    One queued DM line, plus text to edit onto it after `suffix_delay`.
+    """
+    __slots__ = ("text", "suffix", "alone")
+
+    def __init__(self, text, suffix, alone):
+        self.text = text
+        self.suffix = suffix
+        self.alone = alone
+
+
+class CreatorInbox:
+    """
+    Cached creator DM channel with a rate limited digest queue. Suffix
+    edits are scheduled as "edit" actions on the bot's timer wheel, and
+    background work runs on `supervisor`.
+    """
+
+    def __init__(self, bot, creator_id: int, timers, supervisor,
+                 ttl: float = 3600.0, interval: float = 5.0,
+                 suffix_delay: float = 2.5, max_pending: int = 500):
+        self.bot = bot
+        self.creator_id = creator_id
+        self.timers = timers
+        self.supervisor = supervisor
+        self.ttl = ttl
+        self.interval = interval
+        self.suffix_delay = suffix_delay
+        self.max_pending = max_pending
+        self._user = None
+        self._channel = None
+        self._fetched = 0.0
+        self._refresh = None
+        self._pending: deque[_Threat] = deque()
+        # Done when the worker stops
+        self._worker = None
+        self._wake = asyncio.Event()
+        self._flushing = False
+        self._next_send = 0.0
+        self.sent = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def stats(self) -> dict:
+        """
+        Snapshot of queue depth and counters.
+        """
+        return {
+            "depth": len(self._pending),
+            "sent": self.sent,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+    async def user(self) -> discord.User:
+        """
+        Return the creator, fetching only on first use. A stale entry is
+        returned as-is while a refresh runs in the background.
+        """
+        if self._user is None:
+            await self._start_refresh()
+        elif time.monotonic() - self._fetched > self.ttl:
+            self._start_refresh()
+        return self._user
+
+    async def warm(self):
+        """
+        Fetch the creator ahead of the first threat.
+        """
+        try:
+            await self._start_refresh()
+        except Exception as err:
+            print(f"[ERROR]: Creator lookup failed: {err}", file=sys.stderr)
+
+    def _start_refresh(self) -> asyncio.Future:
+        """
+        Start a refresh unless one is already running. Returns a future
+        that's done when it has finished.
+        """
+        if self._refresh is None or self._refresh.done():
+            done = self._refresh = asyncio.get_running_loop().create_future()
+            # Only the first fetch's failure is awaited by anyone
+            done.add_done_callback(
+                lambda future: future.cancelled() or future.exception()
+            )
+            if not self.supervisor.spawn("creator_refresh",
+                                         self._fetch(done)):
+                done.set_exception(RuntimeError("Shutting down"))
+        return self._refresh
+
+    async def _fetch(self, done: asyncio.Future):
+        try:
+            user = await self.bot.fetch_user(self.creator_id)
+            channel = user.dm_channel or await user.create_dm()
+        except asyncio.CancelledError:
+            done.cancel()
+            raise
+        except Exception as err:
+            if self._user is None:
+                done.set_exception(err)
+                return
+            # Keep using the old entry and try again after another ttl
+            print(f"[ERROR]: Creator refresh failed: {err}", file=sys.stderr)
+            self._fetched = time.monotonic()
+            done.set_result(None)
+            return
+        self._user = user
+        self._channel = channel
+        self._fetched = time.monotonic()
+        done.set_result(None)
+
+    def deliver(self, text: str, suffix: str = None, alone: bool = False):
+        """
+        Queue a DM line for the creator. `suffix` is edited onto it after
+        suffix_delay seconds; `alone` sends it as its own message (for text
+        other bots have to parse, like commands).
+        """
+        if len(self._pending) >= self.max_pending:
+            self._pending.popleft()
+            self.dropped += 1
+        self._pending.append(_Threat(text, suffix, alone))
+        if self._worker is None:
+            self._worker = asyncio.get_running_loop().create_future()
+            if not self.supervisor.spawn("creator_dm", self._drain()):
+                # Shutting down; left for flush()
+                self._worker = None
+
+    async def flush(self):
+        """
+        Send everything queued, back to back, and return once the queue is
+        empty.
+        """
+        self._flushing = True
+        self._wake.set()
+        try:
+            while self._pending:
+                if self._worker is None:
+                    self._worker = asyncio.get_running_loop().create_future()
+                    await self._drain()
+                else:
+                    await asyncio.shield(self._worker)
+        finally:
+            self._flushing = False
+
+    def _next_batch(self) -> list[_Threat]:
+        """
+        Take as many queued lines as fit in one message.
+        """
+        batch = [self._pending.popleft()]
+        if batch[0].alone:
+            return batch
+        length = len(batch[0].text) + len(batch[0].suffix or "")
+        while self._pending and not self._pending[0].alone:
+            threat = self._pending[0]
+            length += 1 + len(threat.text) + len(threat.suffix or "")
+            if length > MESSAGE_LIMIT:
+                break
+            batch.append(self._pending.popleft())
+        return batch
+
+    async def _drain(self):
+        """
+        Send queued lines as digests, one message per interval at most.
+        """
+        loop = asyncio.get_running_loop()
+        try:
+            while self._pending:
+                wait = self._next_send - loop.time()
+                if wait > 0 and not self._flushing:
+                    # flush() cuts the wait short
+                    self._wake.clear()
+                    try:
+                        await asyncio.wait_for(self._wake.wait(), wait)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await self._send(self._next_batch())
+        finally:
+            worker, self._worker = self._worker, None
+            if worker is not None and not worker.done():
+                worker.set_result(None)
+
+    async def _send(self, batch: list[_Threat]):
+        """
+        Send one digest and schedule its suffix edit.
+        """
+        self._next_send = asyncio.get_running_loop().time() + self.interval
+        try:
+            await self.user()
+            message = await self._channel.send(
+                "\n".join(threat.text for threat in batch)
+            )
+        except Exception as err:
+            self.failed += len(batch)
+            print(f"[ERROR]: Creator DM failed ({len(batch)} threats): "
+                  f"{err}", file=sys.stderr)
+            return
+        self.sent += 1
+        self.delivered += len(batch)
+        if any(threat.suffix for threat in batch):
+            final = "\n".join(
+                threat.text + (threat.suffix or "") for threat in batch
+            )
+            self.timers.schedule(
+                self.suffix_delay, "edit", content=final,
+                channel_id=message.channel.id, message_id=message.id
+            )
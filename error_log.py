@@ -0,0 +1,186 @@
+"""
+Deduplicating, non-blocking error log.
+
+Command failures used to format a traceback and print it from the event loop,
+so an outage (say, a storm of Discord 5xx errors) meant thousands of identical
+tracebacks written synchronously. Here, capture() only fingerprints the error
+(exception type, where it was caught, and the innermost frame) and counts it.
+The first occurrence of a fingerprint in each `window` is handed to a
+background thread, which formats the traceback and writes one JSON object per
+line. Repeats inside the window are only counted, and the count is written as
+a summary line once the window is over; each summary line starts a new window,
+so its count always covers one window.
+"""
+import atexit
+import hashlib
+import json
+import queue
+import sys
+import threading
+import time
+import traceback
+
+
+class _Group:
+    """
+    Occurrences of one fingerprint in the current window.
+    """
+    __slots__ = ("window_start", "suppressed", "total")
+
+    def __init__(self, now):
+        self.window_start = now
+        self.suppressed = 0
+        self.total = 0
+
+
+def fingerprint(where: str, err: BaseException) -> str:
+    """
+    Short hash of the exception type, the catch site and the innermost frame.
+    """
+    tb = err.__traceback__
+    frame = ""
+    if tb is not None:
+        while tb.tb_next is not None:
+            tb = tb.tb_next
+        code = tb.tb_frame.f_code
+        frame = f"{code.co_filename}:{code.co_name}:{tb.tb_lineno}"
+    key = f"{type(err).__qualname__}|{where}|{frame}"
+    return hashlib.blake2b(key.encode(), digest_size=6).hexdigest()
+
+
+class ErrorLog:
+    """
+    Queue of errors, grouped by fingerprint, written by a daemon thread.
+    """
+
+    def __init__(self, stream=None, window: float = 60.0):
+        self.stream = stream or sys.stderr
+        self.window = window
+        self._groups: dict[str, _Group] = {}
+        self._lock = threading.Lock()
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self.captured = 0
+        self.written = 0
+
+    def capture(self, where: str, err: BaseException, **context):
+        """
+        Record an error. Cheap enough to call from the event loop: no
+        formatting or I/O happens here.
+        """
+        self.captured += 1
+        key = fingerprint(where, err)
+        now = time.time()
+        summary = None
+        with self._lock:
+            group = self._groups.get(key)
+            if group is None:
+                group = self._groups[key] = _Group(now)
+            elif now - group.window_start < self.window:
+                group.suppressed += 1
+                group.total += 1
+                return
+            elif group.suppressed:
+                # The writer hasn't summed up the last window yet
+                summary = self._summary(key, group, now)
+            else:
+                group.window_start = now
+            group.total += 1
+        self._start()
+        if summary is not None:
+            self._queue.put(summary)
+        self._queue.put((now, key, where, err, context))
+
+    def _start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._write_loop, name="error-log", daemon=True
+            )
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _write_loop(self):
+        while True:
+            try:
+                item = self._queue.get(timeout=self.window)
+            except queue.Empty:
+                item = ()
+            if item is None:
+                self._flush_summaries(force=True)
+                return
+            if isinstance(item, dict):
+                self._write(item)
+            elif item:
+                self._write_error(*item)
+            self._flush_summaries()
+
+    def _write_error(self, now, key, where, err, context):
+        lines = traceback.format_exception(type(err), err, err.__traceback__)
+        self._write({
+            "ts": now,
+            "level": "error",
+            "event": "exception",
+            "where": where,
+            "fingerprint": key,
+            "type": type(err).__qualname__,
+            "message": str(err),
+            "context": context,
+            "traceback": "".join(lines).rstrip()
+        })
+
+    @staticmethod
+    def _summary(key: str, group: _Group, now: float) -> dict:
+        """
+        Repeat count record for a group's window, which it closes: the
+        group starts a new window at `now`. Call with the lock held.
+        """
+        record = {
+            "ts": now,
+            "level": "error",
+            "event": "repeated",
+            "fingerprint": key,
+            "repeats": group.suppressed,
+            "since": group.window_start,
+            "total": group.total
+        }
+        group.suppressed = 0
+        group.window_start = now
+        return record
+
+    def _flush_summaries(self, force: bool = False):
+        """
+        Write a repeat count for every group whose window has closed.
+        """
+        now = time.time()
+        with self._lock:
+            summaries = [
+                self._summary(key, group, now)
+                for key, group in self._groups.items()
+                if group.suppressed and (
+                    force or now - group.window_start >= self.window)
+            ]
+        for record in summaries:
+            self._write(record)
+
+    def _write(self, record: dict):
+        try:
+            self.stream.write(json.dumps(record, default=str) + "\n")
+            self.stream.flush()
+            self.written += 1
+        except Exception:
+            pass  # Nowhere left to report a broken log stream
+
+    def close(self):
+        """
+        Write everything still queued, then stop the writer thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout=5)
+
+    def stats(self) -> dict:
+        return {
+            "captured": self.captured,
+            "written": self.written,
+            "fingerprints": len(self._groups)
+        }
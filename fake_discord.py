@@ -0,0 +1,589 @@
+"""
+Local stand-in for Discord's gateway and REST API.
+
+Speaks just enough of both for the real `bot` from main.py to log in, receive
+guilds, get INTERACTION_CREATE events and answer them: interaction callbacks,
+followups, message create/edit, DMs, user fetches, command sync and presence
+updates. Any request can be answered with a simulated 429 so rate limit
+handling can be exercised offline. Used by loadtest.py.
+
+Point discord.py at it with FakeDiscord.patch_discord() before starting the
+bot.
+"""
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+import yarl
+from aiohttp import web, WSMsgType
+
+import discord
+
+API_VERSION = 10
+
+# Gateway opcodes
+DISPATCH = 0
+HEARTBEAT = 1
+IDENTIFY = 2
+PRESENCE = 3
+RESUME = 6
+REQUEST_MEMBERS = 8
+INVALID_SESSION = 9
+HELLO = 10
+HEARTBEAT_ACK = 11
+
+# Application command option types
+OPTION_TYPES = {str: 3, int: 4, bool: 5, "user": 6}
+
+
+def _now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _json(data, status=200, headers=None) -> web.Response:
+    """
+    JSON response with the exact Content-Type discord.py checks for.
+    """
+    return web.Response(
+        body=json.dumps(data).encode("utf-8"), status=status,
+        headers={"Content-Type": "application/json", **(headers or {})}
+    )
+
+
+class FakeDiscord:
+    """
+    In-process fake Discord server (REST + gateway on one aiohttp app).
+    """
+
+    def __init__(self, guilds=1, members_per_guild=50, rate_limit_chance=0.0,
+                 retry_after=0.05, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.rate_limit_chance = rate_limit_chance
+        self.retry_after = retry_after
+
+        self._ids = itertools.count(
+            (int(time.time() * 1000) - 1420070400000) << 22
+        )
+        self.app_id = self.snowflake()
+        self.bot_user = self._user(self.app_id, "Deathbot", bot=True)
+        self.session_id = f"fake-session-{self.app_id}"
+
+        self.users = {self.app_id: self.bot_user}
+        self.guilds = {}
+        self.channels = {}
+        self.messages = {}
+        for g in range(guilds):
+            self._make_guild(f"Fake Guild {g}", members_per_guild)
+
+        self.sockets = set()
+        self.sequence = 0
+        self.stats = Counter()
+        self.acks = {}
+        self._pending = {}
+        self._interaction_channels = {}
+        self._interaction_messages = {}
+        self._originals = {}
+        self._runner = None
+
+    # ------------------------------------------------------------------
+    # Fake data
+    # ------------------------------------------------------------------
+
+    def snowflake(self) -> str:
+        return str(next(self._ids))
+
+    def _user(self, user_id, name, bot=False) -> dict:
+        return {
+            "id": user_id, "username": name, "discriminator": "0",
+            "global_name": name, "avatar": None, "bot": bot,
+            "public_flags": 0
+        }
+
+    def _member(self, user) -> dict:
+        return {
+            "user": user, "roles": [], "joined_at": _now_iso(),
+            "deaf": False, "mute": False, "flags": 0, "nick": None
+        }
+
+    def _make_guild(self, name, member_count):
+        guild_id = self.snowflake()
+        channel_id = self.snowflake()
+        members = [self._member(self.bot_user)]
+        for i in range(member_count):
+            user = self._user(self.snowflake(), f"human{i}")
+            self.users[user["id"]] = user
+            members.append(self._member(user))
+        channel = {
+            "id": channel_id, "type": 0, "name": "general", "position": 0,
+            "guild_id": guild_id, "permission_overwrites": [], "nsfw": False,
+            "parent_id": None, "topic": None, "last_message_id": None,
+            "rate_limit_per_user": 0
+        }
+        self.channels[channel_id] = channel
+        self.guilds[guild_id] = {
+            "id": guild_id, "name": name, "icon": None,
+            "owner_id": members[-1]["user"]["id"],
+            "roles": [{
+                "id": guild_id, "name": "@everyone", "permissions": "0",
+                "position": 0, "color": 0, "hoist": False, "managed": False,
+                "mentionable": False, "flags": 0
+            }],
+            "emojis": [], "stickers": [], "features": [],
+            "member_count": len(members), "members": members,
+            "channels": [channel], "threads": [], "presences": [],
+            "voice_states": [], "stage_instances": [],
+            "guild_scheduled_events": [], "soundboard_sounds": [],
+            "large": False, "unavailable": False, "joined_at": _now_iso(),
+            "verification_level": 0, "default_message_notifications": 0,
+            "explicit_content_filter": 0, "mfa_level": 0,
+            "system_channel_flags": 0, "premium_tier": 0, "nsfw_level": 0,
+            "preferred_locale": "en-US", "afk_timeout": 300
+        }
+
+    def _message(self, channel_id, payload, author=None, guild_id=None):
+        message = {
+            "id": self.snowflake(), "channel_id": channel_id,
+            "author": author or self.bot_user,
+            "content": payload.get("content") or "",
+            "timestamp": _now_iso(), "edited_timestamp": None, "tts": False,
+            "mention_everyone": False, "mentions": [], "mention_roles": [],
+            "attachments": [], "embeds": payload.get("embeds") or [],
+            "components": payload.get("components") or [], "pinned": False,
+            "type": 0,
+            "flags": payload.get("flags") or 0
+        }
+        if guild_id:
+            message["guild_id"] = guild_id
+        self.messages[message["id"]] = message
+        return message
+
+    def _edit(self, message_id, payload):
+        message = self.messages.get(message_id)
+        if message is None:
+            return None
+        if "content" in payload:
+            message["content"] = payload["content"] or ""
+        if "embeds" in payload:
+            message["embeds"] = payload["embeds"] or []
+        if "components" in payload:
+            message["components"] = payload["components"] or []
+        message["edited_timestamp"] = _now_iso()
+        return message
+
+    # ------------------------------------------------------------------
+    # Lifecycle
+    # ------------------------------------------------------------------
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def patch_discord(self):
+        """
+        Point discord.py's REST and gateway URLs at this server.
+        """
+        discord.http.Route.BASE = f"{self.base_url}/api/v{API_VERSION}"
+        discord.gateway.DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(
+            f"ws://{self.host}:{self.port}/gateway"
+        )
+
+    async def start(self):
+        app = web.Application(middlewares=[self._middleware])
+        app.router.add_get("/gateway", self._gateway)
+        api = f"/api/v{API_VERSION}"
+        routes = [
+            ("GET", "/users/@me", self._get_me),
+            ("GET", "/oauth2/applications/@me", self._get_application),
+            ("GET", "/gateway", self._get_gateway),
+            ("GET", "/gateway/bot", self._get_gateway),
+            ("PUT", "/applications/{app}/commands", self._put_commands),
+            ("PUT", "/applications/{app}/guilds/{guild}/commands",
+             self._put_commands),
+            ("POST", "/interactions/{id}/{token}/callback", self._callback),
+            ("POST", "/webhooks/{app}/{token}", self._followup),
+            ("GET", "/webhooks/{app}/{token}/messages/{message}",
+             self._get_webhook_message),
+            ("PATCH", "/webhooks/{app}/{token}/messages/{message}",
+             self._edit_webhook_message),
+            ("DELETE", "/webhooks/{app}/{token}/messages/{message}",
+             self._delete_webhook_message),
+            ("GET", "/users/{user}", self._get_user),
+            ("POST", "/users/@me/channels", self._create_dm),
+            ("POST", "/channels/{channel}/messages", self._create_message),
+            ("PATCH", "/channels/{channel}/messages/{message}",
+             self._edit_message),
+        ]
+        for method, path, handler in routes:
+            app.router.add_route(method, api + path, handler)
+
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = site._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        for ws in list(self.sockets):
+            await ws.close()
+        if self._runner:
+            await self._runner.cleanup()
+
+    # ------------------------------------------------------------------
+    # REST
+    # ------------------------------------------------------------------
+
+    @web.middleware
+    async def _middleware(self, request, handler):
+        if request.path == "/gateway":
+            return await handler(request)
+        route = request.match_info.route.resource
+        key = f"{request.method} {route.canonical if route else request.path}"
+        self.stats[key] += 1
+        # Interaction callbacks aren't rate limited by Discord
+        limited = self.rate_limit_chance and not key.endswith("/callback")
+        if limited and random.random() < self.rate_limit_chance:
+            self.stats["429"] += 1
+            return _json(
+                {"message": "You are being rate limited.",
+                 "retry_after": self.retry_after, "global": False},
+                status=429,
+                headers={
+                    "Retry-After": str(self.retry_after),
+                    "X-RateLimit-Limit": "5",
+                    "X-RateLimit-Remaining": "0",
+                    "X-RateLimit-Reset-After": str(self.retry_after),
+                    "X-RateLimit-Bucket": key,
+                    "X-RateLimit-Scope": "user",
+                    # discord.py treats 429s without Via as Cloudflare bans
+                    "Via": "1.1 google"
+                }
+            )
+        return await handler(request)
+
+    async def _get_me(self, request):
+        return _json(self.bot_user)
+
+    async def _get_application(self, request):
+        return _json({
+            "id": self.app_id, "name": "Deathbot", "description": "",
+            "icon": None, "bot_public": True, "bot_require_code_grant": False,
+            "owner": self.bot_user, "team": None, "verify_key": "0" * 64,
+            "flags": 0, "summary": "", "rpc_origins": []
+        })
+
+    async def _get_gateway(self, request):
+        return _json({
+            "url": f"ws://{self.host}:{self.port}/gateway",
+            "shards": 1,
+            "session_start_limit": {
+                "total": 1000, "remaining": 1000, "reset_after": 0,
+                "max_concurrency": 1
+            }
+        })
+
+    async def _put_commands(self, request):
+        commands = await request.json()
+        for command in commands:
+            command.setdefault("id", self.snowflake())
+            command.setdefault("application_id", self.app_id)
+            command.setdefault("version", self.snowflake())
+            command.setdefault("default_member_permissions", None)
+        return _json(commands)
+
+    async def _callback(self, request):
+        return _json(self.respond(
+            request.match_info["id"], request.match_info["token"],
+            await request.json()
+        ))
+
+    def respond(self, interaction_id, token, body) -> dict:
+        """
+        Apply an interaction's initial response (from the callback route, or
+        returned inline by an HTTP interactions endpoint).
+        """
+        ack = self._pending.pop(interaction_id, None)
+        if ack is not None:
+            name, sent = ack
+            self.acks[interaction_id] = (name, time.perf_counter() - sent)
+        channel_id = self._interaction_channels.pop(interaction_id, None)
+        guild_id = self.channels.get(channel_id, {}).get("guild_id")
+        clicked = self._interaction_messages.pop(interaction_id, None)
+        response = {
+            "interaction": {
+                "id": interaction_id, "type": 2,
+                "response_message_loading": body["type"] == 5,
+                "response_message_ephemeral": False
+            }
+        }
+        if body["type"] in (4, 5):
+            message = self._message(channel_id, body.get("data") or {},
+                                    guild_id=guild_id)
+            self._originals[token] = message["id"]
+            response["interaction"]["response_message_id"] = message["id"]
+            response["resource"] = {"type": body["type"], "message": message}
+        elif body["type"] in (6, 7) and clicked:
+            # A button's response is the message it's on
+            self._originals[token] = clicked
+            if body["type"] == 7:
+                self._edit(clicked, body.get("data") or {})
+        return response
+
+    def _resolve_webhook_message(self, request):
+        message_id = request.match_info["message"]
+        if message_id == "@original":
+            return self._originals.get(request.match_info["token"])
+        return message_id
+
+    async def _payload(self, request) -> dict:
+        """
+        JSON body of a request, including multipart uploads (files), which
+        carry it in a payload_json part.
+        """
+        if request.content_type != "multipart/form-data":
+            return await request.json()
+        form = await request.post()
+        payload = json.loads(form["payload_json"])
+        self.stats["uploaded files"] += sum(
+            1 for name in form if name.startswith("files[")
+        )
+        return payload
+
+    async def _followup(self, request):
+        payload = await self._payload(request)
+        token = request.match_info["token"]
+        original = self.messages.get(self._originals.get(token), {})
+        message = self._message(original.get("channel_id"), payload,
+                                guild_id=original.get("guild_id"))
+        if request.query.get("wait") in ("true", "1"):
+            return _json(message)
+        return web.Response(status=204)
+
+    async def _get_webhook_message(self, request):
+        message = self.messages.get(self._resolve_webhook_message(request))
+        if message is None:
+            return self._not_found()
+        return _json(message)
+
+    async def _edit_webhook_message(self, request):
+        message = self._edit(self._resolve_webhook_message(request),
+                             await self._payload(request))
+        if message is None:
+            return self._not_found()
+        return _json(message)
+
+    async def _delete_webhook_message(self, request):
+        if self.messages.pop(self._resolve_webhook_message(request),
+                             None) is None:
+            return self._not_found()
+        return web.Response(status=204)
+
+    async def _get_user(self, request):
+        # Any ID resolves, like real users outside the fake guilds (CREATOR_ID)
+        user_id = request.match_info["user"]
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = self._user(user_id, "creator")
+        return _json(user)
+
+    async def _create_dm(self, request):
+        payload = await request.json()
+        recipient = self.users.get(str(payload["recipient_id"])) or \
+            self._user(str(payload["recipient_id"]), "creator")
+        channel = {
+            "id": self.snowflake(), "type": 1, "recipients": [recipient],
+            "last_message_id": None
+        }
+        self.channels[channel["id"]] = channel
+        return _json(channel)
+
+    async def _create_message(self, request):
+        channel_id = request.match_info["channel"]
+        message = self._message(
+            channel_id, await request.json(),
+            guild_id=self.channels.get(channel_id, {}).get("guild_id")
+        )
+        return _json(message)
+
+    async def _edit_message(self, request):
+        message = self._edit(request.match_info["message"],
+                             await request.json())
+        if message is None:
+            return self._not_found()
+        return _json(message)
+
+    def _not_found(self):
+        return _json(
+            {"message": "Unknown Message", "code": 10008}, status=404
+        )
+
+    # ------------------------------------------------------------------
+    # Gateway
+    # ------------------------------------------------------------------
+
+    async def _gateway(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        await ws.send_json({"op": HELLO, "d": {"heartbeat_interval": 41250}})
+        async for msg in ws:
+            if msg.type != WSMsgType.TEXT:
+                continue
+            payload = json.loads(msg.data)
+            op = payload.get("op")
+            data = payload.get("d")
+            if op == HEARTBEAT:
+                await ws.send_json({"op": HEARTBEAT_ACK})
+            elif op == IDENTIFY:
+                self.stats["gateway IDENTIFY"] += 1
+                self.sockets.add(ws)
+                await self._ready(ws, data)
+            elif op == RESUME:
+                self.stats["gateway RESUME"] += 1
+                self.sockets.add(ws)
+                if data.get("session_id") == self.session_id:
+                    await self._send(ws, "RESUMED", {})
+                else:
+                    await ws.send_json({"op": INVALID_SESSION, "d": False})
+            elif op == PRESENCE:
+                self.stats["gateway PRESENCE"] += 1
+            elif op == REQUEST_MEMBERS:
+                self.stats["gateway REQUEST_MEMBERS"] += 1
+                guild = self.guilds.get(str(data["guild_id"]))
+                if guild:
+                    members = guild["members"]
+                    if data.get("user_ids"):
+                        wanted = {str(i) for i in data["user_ids"]}
+                        members = [
+                            m for m in members if m["user"]["id"] in wanted
+                        ]
+                    await self._send(ws, "GUILD_MEMBERS_CHUNK", {
+                        "guild_id": guild["id"], "members": members,
+                        "chunk_index": 0, "chunk_count": 1,
+                        "nonce": data.get("nonce")
+                    })
+        self.sockets.discard(ws)
+        return ws
+
+    async def _send(self, ws, event, data):
+        self.sequence += 1
+        await ws.send_str(json.dumps(
+            {"op": DISPATCH, "t": event, "s": self.sequence, "d": data}
+        ))
+
+    async def _ready(self, ws, identify):
+        shard = identify.get("shard") or [0, 1]
+        await self._send(ws, "READY", {
+            "v": API_VERSION, "user": self.bot_user,
+            "guilds": [
+                {"id": g, "unavailable": True} for g in self.guilds
+            ],
+            "session_id": self.session_id,
+            "resume_gateway_url": f"ws://{self.host}:{self.port}/gateway",
+            "shard": shard,
+            "application": {"id": self.app_id, "flags": 0},
+            "private_channels": [], "relationships": []
+        })
+        for guild in self.guilds.values():
+            await self._send(ws, "GUILD_CREATE", guild)
+
+    async def dispatch(self, event, data):
+        """
+        Send a dispatch event to every identified gateway connection.
+        """
+        for ws in list(self.sockets):
+            await self._send(ws, event, data)
+
+    # ------------------------------------------------------------------
+    # Interactions
+    # ------------------------------------------------------------------
+
+    def random_member(self, guild_id):
+        members = self.guilds[guild_id]["members"]
+        return random.choice(members[1:])
+
+    async def send_interaction(self, name, options=None, guild_id=None,
+                               user=None):
+        """
+        Dispatch a slash command INTERACTION_CREATE. `options` maps option
+        names to values; user options take a user dict. Returns the
+        interaction ID; its ack latency lands in self.acks once answered.
+        """
+        payload = self.interaction_payload(name, options, guild_id, user)
+        await self.dispatch("INTERACTION_CREATE", payload)
+        return payload["id"]
+
+    def interaction_payload(self, name, options=None, guild_id=None,
+                            user=None) -> dict:
+        """
+        Build a slash command interaction and start tracking its ack.
+        """
+        guild_id = guild_id or next(iter(self.guilds))
+        guild = self.guilds[guild_id]
+        channel = guild["channels"][0]
+        invoker = self.random_member(guild_id) if user is None else user
+
+        resolved_users = {}
+        option_list = []
+        for opt_name, value in (options or {}).items():
+            if isinstance(value, dict):
+                resolved_users[value["id"]] = value
+                option_list.append(
+                    {"name": opt_name, "type": 6, "value": value["id"]}
+                )
+            else:
+                option_list.append({
+                    "name": opt_name, "type": OPTION_TYPES[type(value)],
+                    "value": value
+                })
+
+        interaction_id = self.snowflake()
+        token = f"token-{interaction_id}"
+        payload = {
+            "id": interaction_id, "application_id": self.app_id, "type": 2,
+            "token": token, "version": 1, "guild_id": guild_id,
+            "channel_id": channel["id"], "channel": channel,
+            "member": dict(invoker, permissions="2147483647"),
+            "app_permissions": "2147483647", "locale": "en-US",
+            "guild_locale": "en-US", "entitlements": [],
+            "attachment_size_limit": 10 * 1024 * 1024,
+            "authorizing_integration_owners": {"0": guild_id}, "context": 0,
+            "data": {
+                "id": self.snowflake(), "name": name, "type": 1,
+                "options": option_list,
+                "resolved": {"users": resolved_users}
+            }
+        }
+        self._interaction_channels[interaction_id] = channel["id"]
+        self._pending[interaction_id] = (name, time.perf_counter())
+        return payload
+
+    def component_payload(self, message_id, custom_id, user=None) -> dict:
+        """
+        Build a click on a button of a message the bot sent, and start
+        tracking its ack.
+        """
+        message = self.messages[message_id]
+        payload = self.interaction_payload(
+            f"button {custom_id.split(':')[0]}",
+            guild_id=message.get("guild_id"), user=user
+        )
+        payload.update(
+            type=3, message=message,
+            data={"custom_id": custom_id, "component_type": 2}
+        )
+        self._interaction_messages[payload["id"]] = message_id
+        return payload
+
+    async def wait_for_acks(self, timeout):
+        """
+        Wait until every dispatched interaction was acknowledged, or timeout.
+        Returns the number still unacknowledged.
+        """
+        deadline = time.perf_counter() + timeout
+        while self._pending and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        return len(self._pending)
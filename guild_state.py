@@ -0,0 +1,98 @@
+"""
+Per-guild member state carried across restarts.
+
+With the members intent, every start chunks every guild's members before
+the developer and member indexes are complete again. SavedGuildState saves
+those indexes instead: on a clean shutdown they're written to a file, each
+guild stamped with when its state was last built from Discord's data, and
+on the next start guilds whose state is younger than `max_age` are restored
+from it rather than chunked. State that was restored but not rebuilt keeps
+its original stamp, so it ages out however many restarts it goes through.
+
+The gateway session itself isn't carried over. A session resumed by a new
+process gets no READY or GUILD_CREATE events, which leaves discord.py with
+no guilds at all, so every start IDENTIFYs; discord.py still resumes within
+a process on its own.
+
+The file is read once at start and then deleted, so a crash never restores
+state from before the last clean shutdown.
+"""
+import json
+import os
+import sys
+import time
+
+
+class SavedGuildState:
+    """
+    Guild indexes saved by the previous process, and saving them for the
+    next one.
+    """
+
+    def __init__(self, path: str, max_age: float = 900.0):
+        """
+        State built more than `max_age` seconds ago is ignored.
+        """
+        self.path = path
+        # Guild ID -> saved state, until restored
+        self.guilds: dict[int, dict] = {}
+        # Guild ID -> when the state restored for it was built
+        self._built_at: dict[int, float] = {}
+        self._load(max_age)
+
+    def _load(self, max_age: float):
+        try:
+            with open(self.path, encoding="utf-8") as file:
+                state = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as err:
+            print(f"[ERROR]: Couldn't load guild state from {self.path}: "
+                  f"{err}", file=sys.stderr)
+            return
+        finally:
+            if os.path.exists(self.path):
+                os.remove(self.path)
+        now = time.time()
+        self.guilds = {
+            int(guild_id): guild
+            for guild_id, guild in state.get("guilds", {}).items()
+            if now - guild.get("built_at", 0) <= max_age
+        }
+
+    def restore(self, guild_id: int):
+        """
+        Take the saved state for a guild, or None if there's none fresh.
+        """
+        state = self.guilds.pop(guild_id, None)
+        if state is not None:
+            self._built_at[guild_id] = state["built_at"]
+        return state
+
+    def save(self, guilds: dict, rebuilt: set):
+        """
+        Write `guilds` (guild ID -> JSON-able state) to the state file.
+        Guilds in `rebuilt` had their state built this session; the others
+        keep the time of the state they were restored from, and are left
+        out if they weren't restored either. Call right before closing.
+        """
+        now = time.time()
+        saved = {}
+        for guild_id, guild in guilds.items():
+            built_at = now if guild_id in rebuilt \
+                else self._built_at.get(guild_id)
+            if built_at is not None:
+                saved[str(guild_id)] = {**guild, "built_at": built_at}
+        if not saved:
+            return
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump({"guilds": saved}, file)
+        os.replace(temp_path, self.path)
+        print(f"Saved state for {len(saved)} guilds to {self.path}.")
+
+    def stats(self) -> dict:
+        return {
+            "restored": len(self._built_at),
+            "pending": len(self.guilds)
+        }
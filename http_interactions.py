@@ -0,0 +1,408 @@
+"""
+HTTP interactions endpoint runtime for Deathbot.
+
+Instead of receiving slash commands over the gateway, Discord can POST each
+interaction to a URL (the "Interactions Endpoint URL" in the developer
+portal). This runs main.py's `bot.tree` commands that way: every request's
+Ed25519 signature is checked, the interaction is fed to the command tree, and
+the command's initial response goes back inline as the HTTP reply, so an ack
+costs no extra REST call. Follow-ups, edits and timers still go over REST.
+
+Workers keep no gateway session or guild cache, so any number of them can
+run behind a load balancer (or share one port here, with SO_REUSEPORT).
+Presence animations are skipped and /diagnose without a user picks the
+caller, since there's no member list to pick from.
+
+Configuration (environment or .env):
+    DISCORD_PUBLIC_KEY     Application public key (hex). Required.
+    INTERACTIONS_HOST      Address to listen on. Default 0.0.0.0.
+    INTERACTIONS_PORT      Port to listen on. Default 8080.
+    INTERACTIONS_WORKERS   Worker processes sharing the port. Default 1.
+    RESPONSE_DEADLINE      Seconds to wait for a command's initial response
+                           before answering with a defer (an ack for
+                           buttons, no suggestions for autocomplete).
+                           Default 2.5.
+
+Usage:
+    python3 http_interactions.py
+
+Requires PyNaCl (pip install -r requirements.txt).
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+from aiohttp import web
+from discord.webhook.async_ import AsyncWebhookAdapter, async_context
+from dotenv import load_dotenv
+
+try:
+    from nacl.exceptions import BadSignatureError
+    from nacl.signing import VerifyKey
+except ImportError:  # Checked in run() so the module still imports
+    VerifyKey = None
+
+load_dotenv()
+
+PUBLIC_KEY = os.getenv("DISCORD_PUBLIC_KEY")
+HOST = os.getenv("INTERACTIONS_HOST", "0.0.0.0")
+PORT = int(os.getenv("INTERACTIONS_PORT", "8080"))
+WORKERS = int(os.getenv("INTERACTIONS_WORKERS", "1"))
+RESPONSE_DEADLINE = float(os.getenv("RESPONSE_DEADLINE", "2.5"))
+
+# Reject signed requests older than this, so captured ones can't be replayed
+MAX_REQUEST_AGE = 300
+
+# Interaction types
+PING = 1
+MESSAGE_COMPONENT = 3
+AUTOCOMPLETE = 4
+# Response types
+PONG = 1
+CHANNEL_MESSAGE = 4
+DEFERRED_CHANNEL_MESSAGE = 5
+DEFERRED_UPDATE_MESSAGE = 6
+UPDATE_MESSAGE = 7
+AUTOCOMPLETE_RESULT = 8
+# Message flag for replies only the caller sees
+EPHEMERAL = 64
+
+
+def deferral(interaction_type: int) -> dict:
+    """
+    The inline reply for an interaction whose handler missed the deadline:
+    "thinking..." for commands, a silent ack for components. Autocomplete
+    can't be deferred, so it gets no suggestions.
+    """
+    if interaction_type == MESSAGE_COMPONENT:
+        return {"type": DEFERRED_UPDATE_MESSAGE}
+    if interaction_type == AUTOCOMPLETE:
+        return {"type": AUTOCOMPLETE_RESULT, "data": {"choices": []}}
+    return {"type": DEFERRED_CHANNEL_MESSAGE}
+
+
+def _flags(payload: dict) -> int:
+    return (payload.get("data") or {}).get("flags") or 0
+
+
+class SignatureVerifier:
+    """
+    Checks Discord's X-Signature-Ed25519 over timestamp + body.
+    """
+
+    def __init__(self, public_key: str, max_age: float = MAX_REQUEST_AGE):
+        self._key = VerifyKey(bytes.fromhex(public_key))
+        self.max_age = max_age
+
+    def verify(self, signature: str, timestamp: str, body: bytes) -> bool:
+        try:
+            if abs(time.time() - int(timestamp)) > self.max_age:
+                return False
+            self._key.verify(timestamp.encode() + body,
+                             bytes.fromhex(signature))
+        except (BadSignatureError, ValueError, TypeError):
+            return False
+        return True
+
+
+class InlineResponseAdapter(AsyncWebhookAdapter):
+    """
+    Webhook adapter for one interaction that hands its initial response to
+    the waiting HTTP request instead of POSTing it to the callback route.
+    Every other webhook call goes out over REST as usual.
+
+    Initial responses that can't go inline (file uploads, or anything after
+    the deadline) become REST calls on top of a deferral that went inline.
+    Follow-ups and @original calls on this interaction's token wait until
+    the inline reply is out, since Discord rejects them before then.
+    """
+
+    def __init__(self, interaction_id: int, application_id: int,
+                 interaction_type: int, token: str, future):
+        super().__init__()
+        self.interaction_id = interaction_id
+        self.application_id = application_id
+        self.token = token
+        self.interaction_type = interaction_type
+        self.future = future
+        # The inline reply, once it's a deferral rather than the response
+        self.deferred = None
+        # Set once the inline reply has been sent; the deferred response
+        # only exists (and can be edited) from then on
+        self.acked = asyncio.Event()
+
+    def defer(self, payload: dict) -> dict:
+        """
+        Make `payload` (a deferral) the inline reply.
+        """
+        self.deferred = payload
+        if not self.future.done():
+            self.future.set_result(payload)
+        return payload
+
+    async def create_interaction_response(self, interaction_id, token, *,
+                                          session, proxy=None,
+                                          proxy_auth=None, params):
+        if interaction_id != self.interaction_id:
+            return await super().create_interaction_response(
+                interaction_id, token, session=session, proxy=proxy,
+                proxy_auth=proxy_auth, params=params
+            )
+        # With files, the payload is the first multipart form field
+        payload = params.payload or json.loads(params.multipart[0]["value"])
+        if self.deferred is None and params.files:
+            # Files can't go in the JSON reply: defer (as privately as the
+            # message) and upload them in an edit of the deferred response
+            if payload["type"] == UPDATE_MESSAGE:
+                self.defer({"type": DEFERRED_UPDATE_MESSAGE})
+            else:
+                self.defer({"type": DEFERRED_CHANNEL_MESSAGE,
+                            "data": {"flags": _flags(payload) & EPHEMERAL}})
+        if self.deferred is None:
+            if not self.future.done():
+                self.future.set_result(payload)
+        elif payload["type"] in (CHANNEL_MESSAGE, UPDATE_MESSAGE):
+            await self._respond_late(payload, params, token, session=session,
+                                     proxy=proxy, proxy_auth=proxy_auth)
+        elif payload["type"] not in (DEFERRED_CHANNEL_MESSAGE,
+                                     DEFERRED_UPDATE_MESSAGE):
+            # Autocomplete results and modals can't follow a deferral
+            print(f"[ERROR]: Dropped a type {payload['type']} response to "
+                  f"interaction {interaction_id}; the deadline had passed.",
+                  file=sys.stderr)
+        # What Discord would have answered, minus the not-yet-created message
+        return {
+            "interaction": {
+                "id": str(interaction_id), "type": self.interaction_type,
+                "response_message_loading":
+                    payload["type"] == DEFERRED_CHANNEL_MESSAGE,
+                "response_message_ephemeral":
+                    bool(_flags(payload) & EPHEMERAL)
+            }
+        }
+
+    async def _after_ack(self, token: str):
+        if token == self.token:
+            await self.acked.wait()
+
+    async def execute_webhook(self, webhook_id, token, **kwargs):
+        await self._after_ack(token)
+        return await super().execute_webhook(webhook_id, token, **kwargs)
+
+    async def edit_webhook_message(self, webhook_id, token, message_id,
+                                   **kwargs):
+        await self._after_ack(token)
+        return await super().edit_webhook_message(webhook_id, token,
+                                                  message_id, **kwargs)
+
+    async def edit_original_interaction_response(self, application_id,
+                                                 token, **kwargs):
+        await self._after_ack(token)
+        return await super().edit_original_interaction_response(
+            application_id, token, **kwargs
+        )
+
+    async def delete_original_interaction_response(self, application_id,
+                                                   token, **kwargs):
+        await self._after_ack(token)
+        return await super().delete_original_interaction_response(
+            application_id, token, **kwargs
+        )
+
+    async def _respond_late(self, payload: dict, params, token: str,
+                            **request):
+        """
+        Deliver a message or message update whose inline reply was a
+        deferral: as an edit of the deferred response where that's what it
+        replaces, else as a follow-up.
+        """
+        data = payload.get("data") or {}
+        if params.files:
+            upload = {
+                "multipart": [{"name": "payload_json",
+                               "value": json.dumps(data)},
+                              *params.multipart[1:]],
+                "files": params.files
+            }
+        else:
+            upload = {"payload": data}
+        await self.acked.wait()
+        deferred = self.deferred["type"]
+        private = bool(_flags(payload) & EPHEMERAL)
+        loading_private = bool(_flags(self.deferred) & EPHEMERAL)
+        if payload["type"] == UPDATE_MESSAGE or (
+                deferred == DEFERRED_CHANNEL_MESSAGE
+                and private == loading_private):
+            # Replaces "thinking...", or updates the clicked message
+            await self.edit_original_interaction_response(
+                self.application_id, token, **request, **upload
+            )
+            return
+        # A new message after a component ack, or a private reply to a
+        # public "thinking...": editing would post it in the open
+        await self.execute_webhook(
+            self.application_id, token, **request, **upload, wait=True
+        )
+        if deferred == DEFERRED_CHANNEL_MESSAGE:
+            await self.delete_original_interaction_response(
+                self.application_id, token, **request
+            )
+
+
+class InteractionsEndpoint:
+    """
+    aiohttp handlers for the interactions URL.
+    """
+
+    def __init__(self, bot, verifier: SignatureVerifier,
+                 deadline: float = RESPONSE_DEADLINE):
+        self.bot = bot
+        self.verifier = verifier
+        self.deadline = deadline
+        self.handled = 0
+        self.deferred = 0
+        self.rejected = 0
+
+    async def interactions(self, request: web.Request) -> web.Response:
+        body = await request.read()
+        if not self.verifier.verify(
+                request.headers.get("X-Signature-Ed25519", ""),
+                request.headers.get("X-Signature-Timestamp", ""), body):
+            self.rejected += 1
+            return web.Response(status=401, text="invalid request signature")
+
+        data = json.loads(body)
+        if data["type"] == PING:
+            return web.json_response({"type": PONG})
+
+        loop = asyncio.get_running_loop()
+        adapter = InlineResponseAdapter(
+            int(data["id"]), int(data["application_id"]), data["type"],
+            data["token"], loop.create_future()
+        )
+        # Tasks started by the tree copy this context, so the command's
+        # response calls go through the adapter
+        token = async_context.set(adapter)
+        try:
+            self.bot._connection.parse_interaction_create(data)
+        finally:
+            async_context.reset(token)
+
+        self.handled += 1
+        try:
+            payload = await asyncio.wait_for(
+                asyncio.shield(adapter.future), self.deadline
+            )
+        except asyncio.TimeoutError:
+            self.deferred += 1
+            payload = adapter.defer(deferral(data["type"]))
+        # Sent before returning, so late responses know the deferral is out
+        response = web.json_response(payload)
+        try:
+            await response.prepare(request)
+            await response.write_eof()
+        finally:
+            adapter.acked.set()
+        return response
+
+    async def health(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "pid": os.getpid(), "handled": self.handled,
+            "deferred": self.deferred, "rejected": self.rejected
+        })
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/interactions", self.interactions)
+        app.router.add_get("/health", self.health)
+        return app
+
+
+async def serve(host: str, port: int, reuse_port: bool = False,
+                sync: bool = True, ready=None, token: str = None):
+    """
+    Log in over REST (no gateway) and serve interactions until cancelled.
+    `ready` (an asyncio.Event) is set once the endpoint is listening.
+    """
+    import main
+
+    endpoint = InteractionsEndpoint(main.bot, SignatureVerifier(PUBLIC_KEY))
+    async with main.bot:
+        # login() also runs setup_hook (content watcher, timers, metrics)
+        await main.bot.login(token or main.TOKEN)
+        if sync:
+            await main.sync_commands()
+        runner = web.AppRunner(endpoint.app(), access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port, reuse_port=reuse_port).start()
+        print(f"Serving interactions on http://{host}:{port}/interactions "
+              f"(PID {os.getpid()}).")
+        if ready is not None:
+            ready.set()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+            main.timers.save(main.TIMER_STATE_PATH)
+
+
+def run_worker(index: int, host: str, port: int, reuse_port: bool):
+    """
+    Worker process entry point.
+    """
+    # Each worker saves and resumes its own pending timers
+    root, ext = os.path.splitext(
+        os.getenv("TIMER_STATE_PATH", ".pending_timers.json")
+    )
+    os.environ["TIMER_STATE_PATH"] = f"{root}.http{index}{ext}"
+
+    async def runner():
+        task = asyncio.current_task()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, task.cancel)
+        try:
+            # Commands are global, so only the first worker syncs them
+            await serve(host, port, reuse_port, sync=index == 0)
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(runner())
+
+
+def run():
+    if VerifyKey is None:
+        sys.exit("[ERROR]: PyNaCl is required: pip install -r "
+                 "requirements.txt")
+    if not PUBLIC_KEY:
+        sys.exit("[ERROR]: DISCORD_PUBLIC_KEY is not set.")
+    if WORKERS <= 1:
+        run_worker(0, HOST, PORT, reuse_port=False)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    workers = [
+        context.Process(target=run_worker, args=(i, HOST, PORT, True),
+                        name=f"deathbot-http-{i}")
+        for i in range(WORKERS)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        print(f"Shutting down {len(workers)} workers...")
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+                worker.join()
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,204 @@
+"""
+Load harness for the HTTP interactions runtime.
+
+Plays Discord's side of http_interactions.py without Discord: generates an
+Ed25519 key pair, signs interaction payloads with it the way Discord does,
+POSTs them to the endpoint and times the inline replies. A FakeDiscord server
+stands in for the REST API (login, follow-ups, edits) behind it.
+
+Usage:
+    python3 http_loadtest.py --interactions 2000 --concurrency 200
+
+Requires PyNaCl (pip install -r requirements.txt).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import aiohttp
+from nacl.signing import SigningKey
+
+from fake_discord import FakeDiscord
+from loadtest import command_options, percentile
+
+COMMANDS = ("threaten", "diagnose", "loadout", "selfdestruct", "protocol")
+
+separator = "-" * 20
+
+
+class InteractionSigner:
+    """
+    Signs request bodies like Discord does for an application's public key.
+    """
+
+    def __init__(self, signing_key: SigningKey = None):
+        self.signing_key = signing_key or SigningKey.generate()
+
+    @property
+    def public_key(self) -> str:
+        return self.signing_key.verify_key.encode().hex()
+
+    def headers(self, body: bytes, timestamp: int = None) -> dict:
+        timestamp = str(int(time.time()) if timestamp is None else timestamp)
+        signature = self.signing_key.sign(timestamp.encode() + body).signature
+        return {
+            "Content-Type": "application/json",
+            "X-Signature-Ed25519": signature.hex(),
+            "X-Signature-Timestamp": timestamp
+        }
+
+
+class InteractionClient:
+    """
+    Sends signed interactions to an endpoint, as Discord would.
+    """
+
+    def __init__(self, url: str, signer: InteractionSigner,
+                 session: aiohttp.ClientSession):
+        self.url = url
+        self.signer = signer
+        self.session = session
+
+    async def send(self, payload: dict, headers: dict = None):
+        """
+        POST one interaction; returns (status, reply body or None).
+        """
+        body = json.dumps(payload).encode()
+        async with self.session.post(
+                self.url, data=body,
+                headers=headers or self.signer.headers(body)) as response:
+            if response.status != 200:
+                return response.status, None
+            return response.status, await response.json()
+
+
+async def check_signatures(client: InteractionClient):
+    """
+    The endpoint must answer PINGs and refuse forged or stale requests.
+    """
+    status, reply = await client.send({"type": 1})
+    assert status == 200 and reply == {"type": 1}, (status, reply)
+
+    body = json.dumps({"type": 1}).encode()
+    forged = InteractionSigner().headers(body)
+    status, _ = await client.send({"type": 1}, headers=forged)
+    assert status == 401, f"forged signature got {status}"
+
+    stale = client.signer.headers(body, timestamp=int(time.time()) - 3600)
+    status, _ = await client.send({"type": 1}, headers=stale)
+    assert status == 401, f"stale timestamp got {status}"
+    print(f"Signature checks passed.\n{separator}")
+
+
+async def run(args):
+    fake = FakeDiscord(guilds=args.guilds, members_per_guild=args.members)
+    await fake.start()
+    fake.patch_discord()
+
+    signer = InteractionSigner()
+    state_dir = tempfile.mkdtemp(prefix="deathbot-http-loadtest-")
+    os.environ.update({
+        "DISCORD_PUBLIC_KEY": signer.public_key,
+        "SYNC_STATE_PATH": os.path.join(state_dir, "sync.json"),
+        "TIMER_STATE_PATH": os.path.join(state_dir, "timers.json"),
+        "STATS_DB_PATH": os.path.join(state_dir, "stats.sqlite3"),
+        "SEEN_LOADOUTS_DIR": os.path.join(state_dir, "seen"),
+        "LOADOUT_PAGES_DIR": os.path.join(state_dir, "pages"),
+        "GUILD_STATE_PATH": os.path.join(state_dir, "guilds.json")
+    })
+    for scope in ("USER", "CHANNEL", "GUILD", "GLOBAL"):
+        os.environ.setdefault(f"RATE_LIMIT_{scope}", "")
+    import http_interactions
+
+    ready = asyncio.Event()
+    server = asyncio.create_task(http_interactions.serve(
+        "127.0.0.1", args.port, ready=ready, token="fake-token"
+    ))
+    started = asyncio.create_task(ready.wait())
+    await asyncio.wait({server, started}, timeout=30,
+                       return_when=asyncio.FIRST_COMPLETED)
+    if server.done():
+        server.result()  # Surface a failed startup
+
+    url = f"http://127.0.0.1:{args.port}/interactions"
+    latencies = defaultdict(list)
+    inline = defaultdict(int)
+    failures = 0
+    async with aiohttp.ClientSession() as session:
+        client = InteractionClient(url, signer, session)
+        await check_signatures(client)
+
+        commands = [c for c in args.commands.split(",") if c]
+        guild_ids = list(fake.guilds)
+        semaphore = asyncio.Semaphore(args.concurrency)
+
+        async def fire(name):
+            nonlocal failures
+            guild_id = random.choice(guild_ids)
+            payload = fake.interaction_payload(
+                name, command_options(fake, name, guild_id), guild_id
+            )
+            async with semaphore:
+                start = time.perf_counter()
+                status, reply = await client.send(payload)
+                latencies[name].append((time.perf_counter() - start) * 1000)
+            if status != 200:
+                failures += 1
+                return
+            inline[reply["type"]] += 1
+            # Discord would now create the response message
+            fake.respond(payload["id"], payload["token"], reply)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(
+            fire(random.choice(commands)) for _ in range(args.interactions)
+        ))
+        elapsed = time.perf_counter() - start
+
+    if args.drain:
+        await asyncio.sleep(args.drain)
+
+    all_latencies = [l for values in latencies.values() for l in values]
+    print(f"{args.interactions - failures}/{args.interactions} answered "
+          f"inline in {elapsed:.2f}s ({args.interactions / elapsed:.0f}/s), "
+          f"p50 {percentile(all_latencies, 50):.1f} ms, p99 "
+          f"{percentile(all_latencies, 99):.1f} ms")
+    for name, values in sorted(latencies.items()):
+        print(f"  /{name:<13} {len(values):>6}  p50 "
+              f"{percentile(values, 50):7.1f} ms  p99 "
+              f"{percentile(values, 99):7.1f} ms")
+    print(f"Response types: {dict(inline)}\n{separator}\nRequests served:")
+    for key, count in sorted(fake.stats.items()):
+        print(f"  {key:<60} {count}")
+
+    server.cancel()
+    await asyncio.gather(server, return_exceptions=True)
+    await fake.stop()
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--interactions", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=200,
+                        help="Max requests in flight at once.")
+    parser.add_argument("--commands", default=",".join(COMMANDS),
+                        help="Comma-separated commands to mix.")
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--members", type=int, default=200,
+                        help="Members per fake guild.")
+    parser.add_argument("--port", type=int, default=8089,
+                        help="Port for the endpoint under test.")
+    parser.add_argument("--drain", type=float, default=0.0,
+                        help="Seconds to keep running after the last reply.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(run(parse_args())) else 0)
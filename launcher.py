@@ -0,0 +1,390 @@
+"""
+Multi-process sharded launcher for Deathbot.
+
+Runs the same commands as main.py, but as an AutoShardedBot spread across a
+pool of worker processes. Each worker owns a contiguous range of shards and
+reports health and stats back to this supervisor, which restarts workers that
+crash or stop reporting and prints aggregated stats.
+
+Configuration (environment or .env):
+    SHARD_COUNT       Total shards. Defaults to Discord's recommended count.
+    SHARD_WORKERS     Number of worker processes. Defaults to the CPU count.
+    HEALTH_INTERVAL   Seconds between worker health reports. Default 10.
+    HEALTH_TIMEOUT    Seconds without a report before a worker is restarted.
+                      Default 60.
+    STATS_INTERVAL    Seconds between aggregated stats lines. Default 60.
+    STABLE_UPTIME     Seconds a worker must run before a crash restarts it
+                      without backoff again. Default 600.
+    SHUTDOWN_DRAIN_TIMEOUT
+                      Seconds a worker's bot gets to drain background work
+                      on shutdown (as for main.py); workers are killed if
+                      they're still running STOP_GRACE seconds after that.
+                      Default 10.
+    METRICS_PORT      If set, worker N serves metrics on METRICS_PORT + N.
+    TIMER_STATE_PATH  Worker N saves pending timers to this path with ".N"
+                      before the extension. Default .pending_timers.json.
+    GUILD_STATE_PATH  Worker N saves its guilds' member indexes to this
+                      path with ".N" before the extension, to skip chunking
+                      them on restart. Default .guild_state.json.
+
+Usage:
+    python3 launcher.py
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import queue
+import signal
+import sys
+import time
+import urllib.request
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+TOKEN = os.getenv("DISCORD_TOKEN")
+SHARD_WORKERS = int(os.getenv("SHARD_WORKERS", str(os.cpu_count() or 1)))
+HEALTH_INTERVAL = float(os.getenv("HEALTH_INTERVAL", "10"))
+HEALTH_TIMEOUT = float(os.getenv("HEALTH_TIMEOUT", "60"))
+STATS_INTERVAL = float(os.getenv("STATS_INTERVAL", "60"))
+STABLE_UPTIME = float(os.getenv("STABLE_UPTIME", "600"))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "10"))
+
+# Time a stopping worker gets on top of its drain to flush queued work, save
+# its state and close its gateway connections before it's killed
+STOP_GRACE = 20.0
+# Restart backoff doubles per consecutive crash, up to this many seconds
+MAX_BACKOFF = 60.0
+
+# Delay between worker starts so IDENTIFYs don't all land at once
+IDENTIFY_STAGGER = 5.0
+# Extra time a fresh worker gets to log in before health checks apply
+STARTUP_GRACE = 120.0
+
+separator = "-" * 20
+
+
+def recommended_shard_count(token: str) -> int:
+    """
+    Ask Discord how many shards this bot should run.
+    """
+    request = urllib.request.Request(
+        "https://discord.com/api/v10/gateway/bot",
+        headers={
+            "Authorization": f"Bot {token}",
+            "User-Agent": "DiscordBot (HomeDepotDeathbot launcher)"
+        }
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        return int(json.load(response)["shards"])
+
+
+def split_shards(shard_count: int, workers: int) -> list[list[int]]:
+    """
+    Split shard IDs into contiguous, nearly equal ranges, one per worker.
+    """
+    workers = max(1, min(workers, shard_count))
+    size, extra = divmod(shard_count, workers)
+    ranges = []
+    start = 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append(list(range(start, end)))
+        start = end
+    return ranges
+
+
+async def _report_health(bot, index: int, reports, edits):
+    """
+    Periodically send this worker's health and stats to the supervisor.
+    """
+    while True:
+        latencies = {
+            shard_id: latency for shard_id, latency in bot.latencies
+        } if bot.is_ready() else {}
+        reports.put_nowait({
+            "worker": index,
+            "pid": os.getpid(),
+            "ready": bot.is_ready(),
+            "guilds": len(bot.guilds),
+            "latencies": latencies,
+            "edits": edits.stats()
+        })
+        await asyncio.sleep(HEALTH_INTERVAL)
+
+
+def run_worker(index: int, shard_ids: list[int], shard_count: int, reports):
+    """
+    Worker process entry point: run main.py's bot for the given shards.
+    """
+    # main.py reads these at import time to build an AutoShardedBot
+    os.environ["SHARD_COUNT"] = str(shard_count)
+    os.environ["SHARD_IDS"] = ",".join(str(i) for i in shard_ids)
+    # Give each worker its own metrics port, counting up from METRICS_PORT
+    if os.getenv("METRICS_PORT"):
+        base_port = int(os.environ["METRICS_PORT"])
+        os.environ["METRICS_PORT"] = str(base_port + index)
+    # Each worker resumes its own pending timers after a restart
+    root, ext = os.path.splitext(
+        os.getenv("TIMER_STATE_PATH", ".pending_timers.json")
+    )
+    os.environ["TIMER_STATE_PATH"] = f"{root}.{index}{ext}"
+    # ...and its own guild state
+    root, ext = os.path.splitext(
+        os.getenv("GUILD_STATE_PATH", ".guild_state.json")
+    )
+    os.environ["GUILD_STATE_PATH"] = f"{root}.{index}{ext}"
+    import main
+
+    async def runner():
+        # Worker.stop() terminates us; close cleanly so timers get saved
+        stopping = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(
+            signal.SIGTERM, stopping.set
+        )
+
+        async def close_when_stopping():
+            await stopping.wait()
+            await main.bot.close()
+
+        async with main.bot:
+            reporter = asyncio.create_task(
+                _report_health(main.bot, index, reports, main.edits)
+            )
+            closer = asyncio.create_task(close_when_stopping())
+            try:
+                await main.bot.start(main.TOKEN)
+            finally:
+                reporter.cancel()
+                if stopping.is_set():
+                    await closer
+                else:
+                    closer.cancel()
+
+    try:
+        asyncio.run(runner())
+    finally:
+        main.timers.save(main.TIMER_STATE_PATH)
+
+
+class Worker:
+    """
+    Supervisor-side handle for one worker process and its last report.
+    """
+
+    def __init__(self, index: int, shard_ids: list[int]):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.process = None
+        self.started = 0.0
+        self.last_report = None
+        self.last_seen = 0.0
+        self.restarts = 0
+        # Crashes since the worker last ran for STABLE_UPTIME; sets backoff
+        self.crashes = 0
+        # While a restart is pending: when to start the worker again, and
+        # when to kill it if it hasn't stopped by then
+        self.restart_at = None
+        self.kill_at = None
+
+    def start(self, context, shard_count: int, reports):
+        self.process = context.Process(
+            target=run_worker,
+            args=(self.index, self.shard_ids, shard_count, reports),
+            name=f"deathbot-worker-{self.index}",
+            daemon=True
+        )
+        self.process.start()
+        self.started = time.monotonic()
+        self.last_seen = self.started
+        self.last_report = None
+        self.restart_at = None
+        self.kill_at = None
+
+    def terminate(self):
+        """
+        Ask the worker to shut down cleanly (it drains, saves and closes).
+        """
+        if self.process and self.process.is_alive():
+            self.process.terminate()
+
+    def stop(self, timeout: float = None):
+        """
+        Shut the worker down, killing it if it's still running after
+        `timeout` seconds (by default its drain timeout plus STOP_GRACE).
+        """
+        if timeout is None:
+            timeout = SHUTDOWN_DRAIN_TIMEOUT + STOP_GRACE
+        if self.process and self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout)
+            if self.process.is_alive():
+                print(f"[ERROR]: Worker {self.index} didn't stop within "
+                      f"{timeout:.0f}s; killing it.", file=sys.stderr)
+                self.process.kill()
+                self.process.join()
+
+    def schedule_restart(self, now: float):
+        """
+        Ask the worker to shut down and pick when to start it again,
+        without waiting for either; restart_due() checks on it.
+        """
+        self.terminate()
+        self.kill_at = now + SHUTDOWN_DRAIN_TIMEOUT + STOP_GRACE
+        self.restart_at = now + self.backoff(now)
+
+    def restart_due(self, now: float) -> bool:
+        """
+        Whether a pending restart can go ahead: the old process has exited
+        and the backoff has passed. Kills the process if it overstays.
+        """
+        if self.process.is_alive():
+            if now >= self.kill_at:
+                print(f"[ERROR]: Worker {self.index} didn't stop within "
+                      f"{SHUTDOWN_DRAIN_TIMEOUT + STOP_GRACE:.0f}s; killing "
+                      f"it.", file=sys.stderr)
+                self.process.kill()
+                # Only once, if the kill takes a moment to land
+                self.kill_at = float("inf")
+            return False
+        return now >= self.restart_at
+
+    def receive(self, report: dict, now: float) -> bool:
+        """
+        Record a health report, unless it came from a process this worker
+        has since replaced.
+        """
+        if self.process is None or report["pid"] != self.process.pid:
+            return False
+        self.last_report = report
+        self.last_seen = now
+        return True
+
+    def backoff(self, now: float) -> float:
+        """
+        Count a crash and return how long to wait before restarting. A
+        worker that had been up for STABLE_UPTIME starts over at 1 second.
+        """
+        if now - self.started >= STABLE_UPTIME:
+            self.crashes = 0
+        delay = min(MAX_BACKOFF, 2.0 ** self.crashes)
+        self.crashes += 1
+        self.restarts += 1
+        return delay
+
+    def problem(self, now: float):
+        """
+        Return why this worker needs a restart, or None if it's healthy (or
+        already restarting).
+        """
+        if self.restart_at is not None:
+            return None
+        if not self.process.is_alive():
+            return f"exited with code {self.process.exitcode}"
+        if now - self.started < STARTUP_GRACE:
+            return None
+        if now - self.last_seen > HEALTH_TIMEOUT:
+            return f"no health report for {now - self.last_seen:.0f}s"
+        return None
+
+
+def collect_reports(reports, workers: list[Worker], wait: float):
+    """
+    Apply every queued health report, waiting up to `wait` seconds for the
+    first one.
+    """
+    try:
+        report = reports.get(timeout=wait)
+        while True:
+            workers[report["worker"]].receive(report, time.monotonic())
+            report = reports.get_nowait()
+    except queue.Empty:
+        pass
+
+
+def print_stats(workers: list[Worker], shard_count: int):
+    """
+    Print one aggregated stats line across all workers.
+    """
+    reports = [w.last_report for w in workers if w.last_report]
+    ready = sum(1 for r in reports if r["ready"])
+    guilds = sum(r["guilds"] for r in reports)
+    latencies = [
+        latency for r in reports for latency in r["latencies"].values()
+    ]
+    avg_latency = (sum(latencies) / len(latencies) * 1000) if latencies else 0
+    edits_queued = sum(r["edits"]["depth"] for r in reports)
+    restarts = sum(w.restarts for w in workers)
+    print(
+        f"[STATS]: {ready}/{len(workers)} workers ready, {shard_count} "
+        f"shards, {guilds} guilds, avg latency {avg_latency:.0f} ms, "
+        f"{edits_queued} queued edits, {restarts} restarts"
+    )
+
+
+def supervise():
+    """
+    Start all workers, then health check, restart and report until stopped.
+    """
+    if not TOKEN:
+        sys.exit("[ERROR]: DISCORD_TOKEN is not set.")
+
+    shard_count = int(os.getenv("SHARD_COUNT") or 0)
+    if not shard_count:
+        shard_count = recommended_shard_count(TOKEN)
+
+    context = multiprocessing.get_context("spawn")
+    reports = context.Queue()
+    workers = [
+        Worker(index, shard_ids)
+        for index, shard_ids in enumerate(split_shards(shard_count,
+                                                       SHARD_WORKERS))
+    ]
+    print(f"Launching {shard_count} shards across {len(workers)} workers."
+          f"\n{separator}")
+    for worker in workers:
+        worker.start(context, shard_count, reports)
+        print(f"Worker {worker.index} (PID {worker.process.pid}) owns shards "
+              f"{worker.shard_ids[0]}-{worker.shard_ids[-1]}.")
+        time.sleep(IDENTIFY_STAGGER)
+
+    next_stats = time.monotonic() + STATS_INTERVAL
+    try:
+        while True:
+            collect_reports(reports, workers, 1.0)
+
+            # Restart dead or silent workers, backing off on repeat crashes.
+            # Nothing here blocks, so one slow restart can't hold up the
+            # health checks of the others.
+            now = time.monotonic()
+            for worker in workers:
+                if worker.restart_at is not None:
+                    if worker.restart_due(now):
+                        worker.start(context, shard_count, reports)
+                        print(f"Worker {worker.index} restarted (PID "
+                              f"{worker.process.pid}).")
+                    continue
+                problem = worker.problem(now)
+                if problem is None:
+                    continue
+                print(f"[ERROR]: Worker {worker.index} {problem}; restarting.",
+                      file=sys.stderr)
+                worker.schedule_restart(now)
+
+            if now >= next_stats:
+                print_stats(workers, shard_count)
+                next_stats = now + STATS_INTERVAL
+    except KeyboardInterrupt:
+        print(f"Shutting down {len(workers)} workers...")
+    finally:
+        # Let every worker drain at the same time, then wait for each
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.stop()
+
+
+if __name__ == "__main__":
+    supervise()
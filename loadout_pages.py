@@ -0,0 +1,234 @@
+"""
+Batches of loadouts for `/loadout count:N`, rendered a page at a time.
+
+A batch is drawn in one go when the command runs, but kept only as item
+indices: four small integers per loadout in compact arrays, tied to the
+content snapshot they index into. Page text is rendered the first time
+someone flips to that page and then kept with the batch. Batches live in a
+bounded LRU and expire after `ttl` seconds, after which their buttons report
+that the batch is gone.
+
+A page button can be clicked on a different process than the one that drew
+the batch (another launcher or HTTP interactions worker), or after a restart.
+With a `directory`, every batch is also written there as a small file, and a
+process that doesn't have the batch in memory reads it back from that file,
+as long as the loadout parts haven't changed since. Expired files are swept
+up as new batches are written.
+"""
+import asyncio
+import os
+import secrets
+import struct
+import sys
+import time
+from array import array
+from collections import OrderedDict
+
+LOADOUT_HEADER = "## **[HOME DEPOT ROBOTIC DEPLOYMENT KIT LOADED]**"
+
+# Batch file header: content loadout key, expiry (Unix time), loadout count.
+# Then four arrays of part indices (native byte order) and the UTF-8 note.
+FILE_HEADER = struct.Struct("<12sdI")
+
+
+class _Batch:
+    __slots__ = ("content", "key", "parts", "count", "note", "expires",
+                 "pages")
+
+    def __init__(self, content, key, parts, note, expires):
+        self.content = content
+        self.key = key
+        # Head, left arm, right arm and core indices, one entry per loadout
+        self.parts = parts
+        self.count = len(parts[0])
+        self.note = note
+        self.expires = expires
+        self.pages: dict[int, str] = {}
+
+
+class LoadoutBook:
+    """
+    Bounded, expiring cache of loadout batches and their rendered pages,
+    optionally shared with other processes through `directory`.
+    """
+
+    def __init__(self, directory: str = None, page_size: int = 5,
+                 max_batches: int = 1000, ttl: float = 900.0,
+                 sweep_interval: float = 60.0):
+        self.directory = directory
+        self.page_size = page_size
+        self.max_batches = max_batches
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._next_sweep = 0.0
+        self._batches: OrderedDict[str, _Batch] = OrderedDict()
+        self.created = 0
+        self.rendered = 0
+        self.expired = 0
+        self.loaded = 0
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+
+    async def create(self, content, loadouts, note: str = None) -> str:
+        """
+        Store a batch of loadouts, given as (head, left arm, right arm,
+        core) part indices into `content`, and return its ID. `note` is
+        shown under every page.
+        """
+        now = time.time()
+        self._evict(now)
+        batch_id = secrets.token_hex(6)
+        batch = self._batches[batch_id] = _Batch(
+            content, content.loadout_key,
+            tuple(array("H", column) for column in zip(*loadouts)),
+            note, now + self.ttl
+        )
+        self.created += 1
+        if self.directory is not None:
+            try:
+                await asyncio.to_thread(self._write, batch_id, batch, now)
+            except OSError as err:
+                # Still works for clicks on this process
+                print(f"[ERROR]: Couldn't save loadout batch {batch_id}: "
+                      f"{err}", file=sys.stderr)
+        return batch_id
+
+    def _path(self, batch_id: str) -> str:
+        return os.path.join(self.directory, f"{batch_id}.batch")
+
+    def _write(self, batch_id: str, batch: _Batch, now: float):
+        """
+        Write a batch file (then sweep expired ones, now and then). Runs in
+        a worker thread.
+        """
+        path = self._path(batch_id)
+        with open(f"{path}.tmp", "wb") as file:
+            file.write(FILE_HEADER.pack(
+                batch.key.encode(), batch.expires, batch.count
+            ))
+            for column in batch.parts:
+                file.write(column.tobytes())
+            file.write((batch.note or "").encode())
+        os.replace(f"{path}.tmp", path)
+        if now >= self._next_sweep:
+            self._next_sweep = now + self.sweep_interval
+            self._sweep(now)
+
+    def _sweep(self, now: float):
+        """
+        Delete batch files older than the TTL. Other processes may be
+        sweeping the same directory.
+        """
+        for entry in os.scandir(self.directory):
+            try:
+                if entry.name.endswith(".batch") and \
+                        entry.stat().st_mtime + self.ttl <= now:
+                    os.remove(entry.path)
+            except FileNotFoundError:
+                continue
+
+    def _read(self, batch_id: str, content):
+        """
+        Load a batch from its file, or None if it's gone, expired or drawn
+        from different loadout parts than `content` has. Runs in a worker
+        thread.
+        """
+        try:
+            with open(self._path(batch_id), "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            return None
+        try:
+            key, expires, count = FILE_HEADER.unpack_from(data)
+            if key.decode() != content.loadout_key or expires <= time.time():
+                return None
+            offset = FILE_HEADER.size
+            parts = []
+            for _ in range(4):
+                column = array("H")
+                column.frombytes(
+                    data[offset:offset + count * column.itemsize]
+                )
+                offset += count * column.itemsize
+                parts.append(column)
+            if len(parts[3]) != count:
+                raise ValueError("truncated")
+            note = data[offset:].decode() or None
+        except (struct.error, ValueError) as err:
+            print(f"[ERROR]: Loadout batch file {batch_id} is unreadable: "
+                  f"{err}", file=sys.stderr)
+            return None
+        return _Batch(content, key.decode(), tuple(parts), note, expires)
+
+    def _evict(self, now: float):
+        """
+        Drop expired batches (oldest first), then trim to max_batches.
+        """
+        while self._batches:
+            batch_id, batch = next(iter(self._batches.items()))
+            if batch.expires > now and len(self._batches) < self.max_batches:
+                break
+            del self._batches[batch_id]
+            self.expired += 1
+
+    def page_count(self, batch_id: str):
+        batch = self._batches.get(batch_id)
+        if batch is None:
+            return None
+        return -(-batch.count // self.page_size)
+
+    async def page(self, batch_id: str, page: int, content=None):
+        """
+        Rendered text of one page, or None if the batch expired. A batch
+        this process doesn't have is read from the directory, if its parts
+        are still the ones in `content` (the live content).
+        """
+        batch = self._batches.get(batch_id)
+        if batch is None and self.directory is not None and \
+                content is not None:
+            batch = await asyncio.to_thread(self._read, batch_id, content)
+            if batch is None:
+                return None
+            self._evict(time.time())
+            self._batches[batch_id] = batch
+            self.loaded += 1
+        if batch is None:
+            return None
+        if batch.expires <= time.time():
+            del self._batches[batch_id]
+            self.expired += 1
+            return None
+        self._batches.move_to_end(batch_id)
+        text = batch.pages.get(page)
+        if text is None:
+            text = batch.pages[page] = self._render(batch, page)
+            self.rendered += 1
+        return text
+
+    def _render(self, batch: _Batch, page: int) -> str:
+        content = batch.content
+        heads, l_arms, r_arms, cores = batch.parts
+        start = page * self.page_size
+        end = min(start + self.page_size, batch.count)
+        lines = [f"{LOADOUT_HEADER} ({batch.count} kits, page {page + 1}/"
+                 f"{-(-batch.count // self.page_size)})"]
+        for i in range(start, end):
+            lines.append(
+                f"### Kit #{i + 1}\n"
+                f"**Head:** {content.heads.items[heads[i]]}\n"
+                f"**Left Arm:** {content.arms.items[l_arms[i]]}\n"
+                f"**Right Arm:** {content.arms.items[r_arms[i]]}\n"
+                f"**Core:** {content.cores.items[cores[i]]}"
+            )
+        if batch.note:
+            lines.append(batch.note)
+        return "\n".join(lines)
+
+    def stats(self) -> dict:
+        return {
+            "batches": len(self._batches),
+            "created": self.created,
+            "rendered": self.rendered,
+            "expired": self.expired,
+            "loaded": self.loaded
+        }
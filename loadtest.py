@@ -0,0 +1,213 @@
+"""
+End-to-end load harness for Deathbot.
+
+Starts a FakeDiscord server, runs the real `bot` from main.py against it,
+then fires many concurrent /threaten, /diagnose, /loadout and /selfdestruct
+interactions and reports throughput and ack latency (time from
+INTERACTION_CREATE to the interaction callback) per command.
+
+Usage:
+    python3 loadtest.py --interactions 2000 --concurrency 500
+    python3 loadtest.py --rate-limit 0.05 --json results.json
+    LOW_MEMORY_MODE=1 python3 loadtest.py --measure-memory --members 5000
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+from fake_discord import FakeDiscord
+
+COMMANDS = ("threaten", "diagnose", "loadout", "selfdestruct", "stats")
+
+separator = "-" * 20
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1,
+                       round(pct / 100 * len(ordered) + 0.5) - 1))
+    return ordered[index]
+
+
+def command_options(fake, name, guild_id):
+    """
+    Build realistic options for a command.
+    """
+    if name == "threaten":
+        return {"user": fake.random_member(guild_id)["user"]}
+    if name == "diagnose" and random.random() < 0.5:
+        return {"user": fake.random_member(guild_id)["user"]}
+    if name == "loadout" and random.random() < 0.5:
+        return {"count": random.choice((5, 50, 500)),
+                "unseen": random.random() < 0.5}
+    return {}
+
+
+async def run(args):
+    fake = FakeDiscord(
+        guilds=args.guilds, members_per_guild=args.members,
+        rate_limit_chance=args.rate_limit
+    )
+    await fake.start()
+    fake.patch_discord()
+
+    # Keep the real command sync and timer state untouched
+    state_dir = tempfile.mkdtemp(prefix="deathbot-loadtest-")
+    os.environ["SYNC_STATE_PATH"] = os.path.join(state_dir, "sync.json")
+    os.environ["TIMER_STATE_PATH"] = os.path.join(state_dir, "timers.json")
+    os.environ["STATS_DB_PATH"] = os.path.join(state_dir, "stats.sqlite3")
+    os.environ["SEEN_LOADOUTS_DIR"] = os.path.join(state_dir, "seen")
+    os.environ["LOADOUT_PAGES_DIR"] = os.path.join(state_dir, "pages")
+    os.environ["GUILD_STATE_PATH"] = os.path.join(state_dir, "guilds.json")
+    if not args.admission:
+        # Measure the bot, not its rate limits
+        for scope in ("USER", "CHANNEL", "GUILD", "GLOBAL"):
+            os.environ.setdefault(f"RATE_LIMIT_{scope}", "")
+    import main
+
+    if args.measure_memory:
+        tracemalloc.start()
+        baseline = tracemalloc.get_traced_memory()[0]
+    bot_task = asyncio.create_task(main.bot.start("fake-token"))
+    await asyncio.wait_for(main.bot.wait_until_ready(), timeout=30)
+    print(f"Bot connected to fake Discord at {fake.base_url} with "
+          f"{len(main.bot.guilds)} guilds.\n{separator}")
+    guild_bytes = None
+    if args.measure_memory:
+        await asyncio.sleep(1)  # Let member chunks and lookups settle
+        guild_bytes = (
+            (tracemalloc.get_traced_memory()[0] - baseline) / args.guilds
+        )
+        tracemalloc.stop()
+        print(f"Memory after ready: {guild_bytes / 1024:.0f} KiB per guild "
+              f"({args.members} members each, low-memory mode "
+              f"{'on' if main.LOW_MEMORY_MODE else 'off'}).\n{separator}")
+
+    commands = [c for c in args.commands.split(",") if c]
+    guild_ids = list(fake.guilds)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def fire(name):
+        async with semaphore:
+            guild_id = random.choice(guild_ids)
+            await fake.send_interaction(
+                name, command_options(fake, name, guild_id), guild_id
+            )
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        fire(random.choice(commands)) for _ in range(args.interactions)
+    ))
+    missing = await fake.wait_for_acks(args.timeout)
+    elapsed = time.perf_counter() - start
+    if bot_task.done():
+        bot_task.result()  # Surface a crashed bot instead of empty stats
+
+    if args.drain:
+        await asyncio.sleep(args.drain)
+
+    by_command = defaultdict(list)
+    for name, latency in fake.acks.values():
+        by_command[name].append(latency * 1000)
+    all_latencies = [l for values in by_command.values() for l in values]
+
+    results = {
+        "interactions": args.interactions,
+        "acked": len(fake.acks),
+        "unacked": missing,
+        "seconds": elapsed,
+        "acks_per_second": len(fake.acks) / elapsed if elapsed else 0.0,
+        "ack_ms": {
+            "p50": percentile(all_latencies, 50),
+            "p99": percentile(all_latencies, 99)
+        },
+        "commands": {
+            name: {
+                "count": len(values),
+                "p50_ms": percentile(values, 50),
+                "p99_ms": percentile(values, 99)
+            }
+            for name, values in sorted(by_command.items())
+        },
+        "bytes_per_guild": guild_bytes,
+        "http": dict(fake.stats),
+        "edits": main.edits.stats(),
+        "creator_dms": main.creator_inbox.stats(),
+        "timers": main.timers.stats(),
+        "admission": main.admission.stats(),
+        "usage": main.usage.stats(),
+        "tasks": main.tasks.stats(),
+        "guild_state": main.saved_guilds.stats(),
+        "loop": main.loop_monitor.stats()
+    }
+
+    print(f"{results['acked']}/{args.interactions} acked in {elapsed:.2f}s "
+          f"({results['acks_per_second']:.0f}/s), p50 "
+          f"{results['ack_ms']['p50']:.1f} ms, p99 "
+          f"{results['ack_ms']['p99']:.1f} ms")
+    for name, row in results["commands"].items():
+        print(f"  /{name:<13} {row['count']:>6}  p50 {row['p50_ms']:7.1f} ms"
+              f"  p99 {row['p99_ms']:7.1f} ms")
+    print(f"{separator}\nRequests served:")
+    for key, count in sorted(fake.stats.items()):
+        print(f"  {key:<60} {count}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    # Shut down as the bot does (queued edits and DMs go out, background
+    # tasks get the drain timeout), then stop whatever is left
+    await main.bot.close()
+    others = [
+        task for task in asyncio.all_tasks()
+        if task is not asyncio.current_task() and task is not bot_task
+    ]
+    for task in others:
+        task.cancel()
+    await asyncio.gather(*others, return_exceptions=True)
+    bot_task.cancel()
+    await fake.stop()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--interactions", type=int, default=2000,
+                        help="Total interactions to fire.")
+    parser.add_argument("--concurrency", type=int, default=500,
+                        help="Max interactions being dispatched at once.")
+    parser.add_argument("--commands", default=",".join(COMMANDS),
+                        help="Comma-separated commands to mix.")
+    parser.add_argument("--guilds", type=int, default=10)
+    parser.add_argument("--members", type=int, default=200,
+                        help="Members per fake guild.")
+    parser.add_argument("--rate-limit", type=float, default=0.0,
+                        help="Chance (0-1) that any REST call gets a 429.")
+    parser.add_argument("--timeout", type=float, default=30.0,
+                        help="Seconds to wait for all acks.")
+    parser.add_argument("--drain", type=float, default=0.0,
+                        help="Seconds to keep running after the last ack.")
+    parser.add_argument("--admission", action="store_true",
+                        help="Keep the bot's command rate limits on.")
+    parser.add_argument("--measure-memory", action="store_true",
+                        help="Report memory allocated per guild at ready.")
+    parser.add_argument("--json", help="Write results to this JSON file.")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    results = asyncio.run(run(parse_args()))
+    sys.exit(1 if results["unacked"] else 0)
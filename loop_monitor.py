@@ -0,0 +1,227 @@
+"""
+Event loop lag monitor and sampling profiler.
+
+Everything the bot does runs on one asyncio loop, so any callback that
+blocks (synchronous I/O, a big loop over members, heavy formatting) delays
+every other command. LoopMonitor measures that delay directly: a task
+sleeps for `interval` over and over and records how late it wakes up in a
+histogram. A watchdog thread watches the same deadline; when the loop is
+more than `slow` seconds overdue, it grabs the loop thread's stack. For one
+callback blocking the loop that is the code at fault; for a loop that is
+just swamped with short callbacks it's a random one of them, and a profile
+says more. Once the loop gets going again the stall is logged (by the
+thread, so logging never blocks the loop) with that stack, and the slowest
+stalls are kept for reports.
+
+profile() samples the loop thread's stack from a worker thread every few
+milliseconds for a while and returns the samples as collapsed stacks, one
+"outer;...;inner count" line per distinct stack, which flamegraph.pl,
+speedscope and most other flame graph tools read as is. Sampling from
+outside needs no tracing hooks, so the loop runs at full speed meanwhile.
+"""
+import asyncio
+import heapq
+import os
+import queue
+import sys
+import threading
+import time
+from collections import Counter
+
+from metrics import Histogram
+
+# Bucket upper bounds in seconds for loop lag
+LAG_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0
+)
+# Innermost frames shown when a stall is logged
+LOGGED_FRAMES = 6
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def folded(samples: Counter) -> str:
+    """
+    Collapsed stack samples as "stack count" lines, most frequent first.
+    """
+    return "\n".join(
+        f"{stack} {count}" for stack, count in samples.most_common()
+    )
+
+
+def collapse(frame) -> str:
+    """
+    A stack as one "outer;...;inner" line, outermost frame first.
+    """
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    return ";".join(reversed(labels))
+
+
+class LoopMonitor:
+    """
+    Loop lag histogram, blocked-loop watchdog and on-demand profiler.
+    """
+
+    def __init__(self, interval: float = 0.1, slow: float = 0.25,
+                 keep: int = 10, stream=None):
+        """
+        The loop is checked every `interval` seconds, and stalls longer than
+        `slow` seconds are logged to `stream` (stderr by default). The
+        `keep` slowest are kept for slowest().
+        """
+        self.interval = interval
+        self.slow = slow
+        self.keep = keep
+        self.stream = stream or sys.stderr
+        self.lag = Histogram(LAG_BUCKETS)
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.profiling = False
+        self._slowest = []  # Min-heap of (seconds, time, stack)
+        self._due = None
+        self._stack = None  # (deadline, collapsed stack) from the watchdog
+        self._loop_thread = None
+        self._log = queue.SimpleQueue()
+        self._thread = None
+
+    async def run(self):
+        """
+        Measure loop lag until cancelled. Run as a background task.
+        """
+        self._loop_thread = threading.get_ident()
+        if self._thread is None:
+            self._thread = threading.Thread(
+                target=self._watch, name="loop-watchdog", daemon=True
+            )
+            self._thread.start()
+        try:
+            while True:
+                self._due = time.monotonic() + self.interval
+                await asyncio.sleep(self.interval)
+                lag = max(0.0, time.monotonic() - self._due)
+                self.lag.observe(lag)
+                if lag > self.max_lag:
+                    self.max_lag = lag
+                if lag > self.slow:
+                    self._stalled(lag, self._due)
+        finally:
+            self._due = None
+
+    def _stalled(self, lag: float, due: float):
+        """
+        Record a stall, with the stack the watchdog caught it in.
+        """
+        caught, self._stack = self._stack, None
+        stack = caught[1] if caught is not None and caught[0] == due else ""
+        self.stalls += 1
+        entry = (lag, time.time(), stack)
+        if len(self._slowest) < self.keep:
+            heapq.heappush(self._slowest, entry)
+        elif lag > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+        self._log.put(entry)
+
+    def _watch(self):
+        """
+        Watchdog thread: catch the loop's stack while it's blocked, and
+        write the log lines for stalls the loop has reported.
+        """
+        caught = None
+        while True:
+            time.sleep(self.slow / 2)
+            due = self._due
+            if due is not None and due != caught and \
+                    time.monotonic() - due > self.slow:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is not None:
+                    self._stack = (due, collapse(frame))
+                    caught = due
+            while True:
+                try:
+                    lag, _, stack = self._log.get_nowait()
+                except queue.Empty:
+                    break
+                frames = stack.split(";")[-LOGGED_FRAMES:] if stack else []
+                print(f"[ERROR]: Event loop blocked for {lag:.3f}s"
+                      + "".join(f"\n    {frame}" for frame in frames),
+                      file=self.stream)
+
+    def slowest(self) -> list[tuple[float, float, str]]:
+        """
+        The slowest stalls seen, as (seconds, wall time, collapsed stack),
+        slowest first.
+        """
+        return sorted(self._slowest, reverse=True)
+
+    def percentile(self, q: float) -> float:
+        """
+        Upper bound of the lag bucket holding the q-th quantile (0-1).
+        """
+        target = q * self.lag.count
+        running = 0
+        for bound, count in zip(self.lag.bounds, self.lag.counts):
+            running += count
+            if running >= target:
+                return bound
+        return self.max_lag
+
+    async def profile(self, seconds: float,
+                      interval: float = 0.005) -> Counter:
+        """
+        Sample the loop thread's stack every `interval` seconds for
+        `seconds`. Returns collapsed stack -> number of samples; folded()
+        turns that into flame graph input.
+        """
+        if self._loop_thread is None:
+            self._loop_thread = threading.get_ident()
+        self.profiling = True
+        try:
+            samples = await asyncio.to_thread(
+                self._sample, self._loop_thread, seconds, interval
+            )
+        finally:
+            self.profiling = False
+        return samples
+
+    @staticmethod
+    def _sample(thread_id: int, seconds: float, interval: float) -> Counter:
+        samples = Counter()
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            frame = sys._current_frames().get(thread_id)
+            if frame is not None:
+                samples[collapse(frame)] += 1
+            del frame
+            time.sleep(interval)
+        return samples
+
+    def metrics(self) -> list[str]:
+        """
+        Lag histogram and stall counter for the metrics endpoint.
+        """
+        return [
+            "# HELP deathbot_loop_lag_seconds How late the event loop ran a "
+            "timer callback.",
+            "# TYPE deathbot_loop_lag_seconds histogram",
+            *self.lag.lines("deathbot_loop_lag_seconds", ""),
+            "# HELP deathbot_loop_stalls_total Times the event loop was "
+            "blocked for longer than the slow threshold.",
+            "# TYPE deathbot_loop_stalls_total counter",
+            f"deathbot_loop_stalls_total {self.stalls}"
+        ]
+
+    def stats(self) -> dict:
+        return {
+            "checks": self.lag.count,
+            "mean_lag": self.lag.sum / self.lag.count if self.lag.count
+            else 0.0,
+            "p99_lag": self.percentile(0.99),
+            "max_lag": self.max_lag,
+            "stalls": self.stalls
+        }
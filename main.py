@@ -1,6 +1,6 @@
+import io
 import os
 import sys
-import traceback
 import asyncio
 from random import randint, choice, sample
 from functools import wraps
@@ -10,6 +10,24 @@ import discord
 from discord import Interaction, app_commands
 from discord.ext import commands
 
+from admission import Admission, parse_limit
+from auto_defer import budgeted
+from command_sync import sync_if_changed
+from content import ContentStore
+from creator_inbox import CreatorInbox
+from error_log import ErrorLog
+from guild_state import SavedGuildState
+from loadout_pages import LOADOUT_HEADER, LoadoutBook
+from loop_monitor import LoopMonitor, folded
+from member_index import MemberSampler
+from metrics import Metrics
+from outbound import EditQueue, WebhookMessageRef
+from presence import PresenceScheduler
+from seen_loadouts import SeenLoadouts
+from supervisor import TaskSupervisor
+from timers import TimerWheel
+from usage_stats import UsageStats
+
 # Load environment variables from .env file
 load_dotenv()
 
@@ -17,6 +35,13 @@ load_dotenv()
 _DEVS = os.getenv("DEVELOPER_IDS", "").split(",")
 DEVELOPER_IDS = {int(i) for i in _DEVS if i.strip().isdigit()}
 
+# Dev mode: sync commands only to these guilds (comma-separated IDs)
+_DEV_GUILDS = os.getenv("DEV_GUILD_IDS", "").split(",")
+DEV_GUILD_IDS = [int(i) for i in _DEV_GUILDS if i.strip().isdigit()]
+
+# Sync commands on startup even if the command tree hash is unchanged
+FORCE_COMMAND_SYNC = os.getenv("FORCE_COMMAND_SYNC", "") == "1"
+
 # Constant IDs
 CREATOR_ID = int(os.getenv("CREATOR_ID", "405547931102609429"))
 PHYL_ID = int(os.getenv("PHYL_ID", "1047614240778895462"))
@@ -29,258 +54,497 @@ intents = discord.Intents.default()
 intents.message_content = True  # Required to read message content
 intents.members = True          # Required to fetch guild members
 
-# Initialize bot with prefix commands (!) and slash commands support
-bot = commands.Bot(command_prefix="!", intents=intents)
-
-separator = "-" * 20
-
-
-def get_loadout():
-    """
-    Generate a random loadout for head, arms, and core.
-    There are 3,537,952 unique possible combinations.
-    """
-    # Loadout lists
-    head_loadouts = [
-        "Standard Robotic",
-        "Standard Robotic",  # Intentionally duplicated to decrease rarity
-        "Standard Robotic MkII",
-
-        "Human (Borrowed)",
-
-        "Automatically Firing Nailgun Mounted Helmet",
-        "Automatically Firing Nailgun Mounted Helmet MkII",
-
-        "Hand *(Talk to The Hand)*",
-        "Hand MkII *(Hand Talks to You)*",
-
-        "Tactical Nuclear Missile Silo",
-        "Nuclear ICBM Silo",
-
-        "Lord Xarathys Dreadbot of Home Depotius Omega Jr",
-        "Lord Xarathys Dreadbot of Home Depotius Omega's Head",
-
-        "Lord Xarathys Dreadbot of Home Depotius Omega Jr MkII",
-        "Lord Xarathys Dreadbot of Home Depotius Omega's Head MkII",
-
-        "Water Balloon (Temu-Grade, Porous)",
-        "Water Balloon MkII (Industrial-Grade, Explosive)",
-
-        "Regenerating Hydrogen Balloon (Lowes-Grade, 98% Helium)",
-        "Regenerating Hydrogen Balloon MkII (Home Depot-Grade, Launchable)",
-
-        "Headlamp",
-        "Headlamp MkII",
-
-        "F I S H",
-
-        "Starfish",
-        "Starfish MkII",
-
-        "Pulse Cannon",
-        "Pulse Cannon MkII",
-
-        "Plasma Turret",
-        "Plasma Turret MkII",
-
-        "Anime Cat Girl Head",
-        "Anime Cat Girl Head MkII",
-
-        "Sentient Fireball Parasite",
-        "Sentient Fireball Parasite MkII (Mitosis-Capable)",
-
-        "Plasma Ball",
-        "Plasma Ball MkII (Enhanced Processing)",
-
-        "Headless (missing)",
-        "Headless MkII (WiFi-enabled remote brain)",
-
-        "Spinning Sawblade Mohawk",
-        "Spinning Sawblade Mohawk MkII",
-
-        "Toaster Helmet",
-        "Toaster Helmet MkII",
-
-        "Solar-Powered Leaf Blower Array",
-        "Solar-Powered Leaf Blower Array MkII",
-
-        "Solar Powered Time Bomb",
-        "Solar Powered Time Bomb MkII (Atomic)",
-
-        "Golden Toilet Bowl (Cursed)",
-        "Golden Toilet Bowl MkII (Blessed By Lord Xarathys Dreadbot "
-        "of Home Depotius Omega III)"
-    ]
-
-    arm_loadouts = [
-        "Chainsaw",
-        "Chainsaw MkII",
-
-        "Industrial-Grade Robotic Hand",
-        "Industrial-Grade Titanium Robotic Hand",
-
-        "Human Arm",
-        "Human Arm MkII (Muscular)",
-
-        "Hydraulic Plywood Launcher Cannon",
-        "Hydraulic Plywood Launcher Cannon MkII",
-
-        "Pneumatic Cannon",
-        "Pneumatic Cannon MkII",
-
-        "Lazer Pointer (Harmless)",
-        "Lazer Pointer MkII (Extra Harmless)",
-
-        "Military-Grade Lazer Pointer",
-        "Military-Grade Lazer Pointer MkII",
+# Per-command metrics; served at http://METRICS_HOST:METRICS_PORT/metrics
+metrics = Metrics()
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = os.getenv("METRICS_PORT")
+
+# Low-memory mode: don't cache or chunk guild members (the biggest memory
+# cost). Developers are looked up once per guild over the gateway and
+# /diagnose only picks from up to MEMBER_CACHE_SIZE recently seen members.
+LOW_MEMORY_MODE = os.getenv("LOW_MEMORY_MODE", "") == "1"
+MEMBER_CACHE_SIZE = int(os.getenv("MEMBER_CACHE_SIZE", "1000"))
+
+# Sharding: launcher.py sets these for each worker process it starts
+SHARD_COUNT = os.getenv("SHARD_COUNT")
+SHARD_IDS = os.getenv("SHARD_IDS")
+
+# Guild developer and member indexes are saved to GUILD_STATE_PATH on clean
+# shutdown, and used instead of re-chunking on the next start for up to
+# GUILD_STATE_MAX_AGE seconds after they were built.
+GUILD_STATE_PATH = os.getenv("GUILD_STATE_PATH", ".guild_state.json")
+saved_guilds = SavedGuildState(
+    GUILD_STATE_PATH,
+    max_age=float(os.getenv("GUILD_STATE_MAX_AGE", "900"))
+)
 
-        "Nerf Missile Launcher",
-        "Nerf Missile Launcher MkII",
+bot_options = {
+    "command_prefix": "!",
+    "intents": intents,
+    "http_trace": metrics.trace_config()
+}
+if LOW_MEMORY_MODE:
+    bot_options["member_cache_flags"] = discord.MemberCacheFlags.none()
+    bot_options["chunk_guilds_at_startup"] = False
+elif saved_guilds.guilds:
+    # Guilds with fresh saved state aren't chunked; on_ready chunks the rest
+    bot_options["chunk_guilds_at_startup"] = False
 
-        "Toy Hammer",
-        "Toy Hammer MkII",
+# Initialize bot with prefix commands (!) and slash commands support
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(
+        shard_count=int(SHARD_COUNT),
+        shard_ids=[int(i) for i in SHARD_IDS.split(",")] if SHARD_IDS
+        else None,
+        **bot_options
+    )
+else:
+    bot = commands.Bot(**bot_options)
 
-        "Titanium Sledge Hammer",
-        "Titanium Sledge Hammer MkII",
+separator = "-" * 20
 
-        "Power Drill",
-        "Power Drill MkII",
+# Command errors are written as JSON lines by a background thread, to
+# ERROR_LOG_PATH if set, else stderr; repeats are counted, not re-printed
+ERROR_LOG_PATH = os.getenv("ERROR_LOG_PATH")
+error_log = ErrorLog(
+    open(ERROR_LOG_PATH, "a", encoding="utf-8") if ERROR_LOG_PATH else None,
+    window=float(os.getenv("ERROR_LOG_WINDOW", "60"))
+)
 
-        "Multitool",
-        "Multitool MkII",
+# Usage counts for /stats, written behind to SQLite (empty path disables)
+usage = UsageStats(
+    os.getenv("STATS_DB_PATH", "deathbot_stats.sqlite3") or None,
+    interval=float(os.getenv("STATS_FLUSH_INTERVAL", "2"))
+)
 
-        "Semi-Automatic Machine Gun",
-        "Semi-Automatic Machine Gun MkII",
+# Slash commands that could be slow to answer are deferred for them once
+# this many seconds have passed since the interaction was created (Discord
+# allows 3)
+DEFER_BUDGET = float(os.getenv("DEFER_BUDGET", "2.0"))
+
+# Background tasks, held and counted by kind. At most
+# SELF_DESTRUCT_CONCURRENCY countdowns play at once, SELF_DESTRUCT_QUEUE more
+# wait their turn, and past that /selfdestruct gets the static reply. On
+# shutdown, tasks get SHUTDOWN_DRAIN_TIMEOUT seconds to finish.
+SELF_DESTRUCT_CONCURRENCY = int(os.getenv("SELF_DESTRUCT_CONCURRENCY", "5"))
+SELF_DESTRUCT_QUEUE = int(os.getenv("SELF_DESTRUCT_QUEUE", "20"))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "10"))
+# Extra time for the edits and DMs those tasks leave queued when they end
+SHUTDOWN_FLUSH_GRACE = 5.0
+# ...and for the timers they schedule to go off right away (follow-ups)
+SHUTDOWN_TIMER_GRACE = 1.0
+tasks = TaskSupervisor(
+    {
+        "selfdestruct": (SELF_DESTRUCT_CONCURRENCY, SELF_DESTRUCT_QUEUE),
+        "developer_lookup": (1, 1),
+        "guild_chunk": (1, 1)
+    },
+    on_error=lambda kind, err: error_log.capture(kind, err)
+)
 
-        "Machete Arm",
-        "Machete Arm MkII",
+# Coalescing per-channel queue for message edits
+edits = EditQueue(tasks)
 
-        "Borg Assimilation Tubules",
-        "Borg Assimilation Tubules MkII",
+# Presence (status) updates allowed per window, shared by all animations
+PRESENCE_MAX_UPDATES = int(os.getenv("PRESENCE_MAX_UPDATES", "20"))
+PRESENCE_WINDOW = float(os.getenv("PRESENCE_WINDOW", "20"))
+presence = PresenceScheduler(
+    bot, tasks, max_updates=PRESENCE_MAX_UPDATES, window=PRESENCE_WINDOW
+)
 
-        "Sawblade Hand (Low-Grade)",
-        "Sawblade Hand MkII (High-Grade)",
 
-        "Welding Torch",
-        "Welding Torch MkII",
+def task_metrics():
+    """
+    Background task gauges and counters for the metrics endpoint.
+    """
+    stats = tasks.stats()
+    for field, kind, help_text in (
+        ("running", "gauge", "Background tasks running now."),
+        ("queued", "gauge", "Background tasks waiting for a slot."),
+        ("oldest_seconds", "gauge", "Age of the oldest running task."),
+        ("started", "counter", "Background tasks started."),
+        ("failed", "counter", "Background tasks that raised."),
+        ("rejected", "counter", "Background tasks turned away at a limit.")
+    ):
+        metric = f"deathbot_tasks_{field}"
+        yield f"# HELP {metric} {help_text}"
+        yield f"# TYPE {metric} {kind}"
+        for name, row in stats.items():
+            yield f'{metric}{{kind="{name}"}} {row[field]}'
+
+
+metrics.collectors.append(task_metrics)
+
+# Event loop lag is sampled every LOOP_CHECK_INTERVAL seconds; stalls longer
+# than LOOP_SLOW_THRESHOLD seconds are logged with the code that blocked.
+# Developers can profile the loop for up to MAX_PROFILE_SECONDS with /profile.
+loop_monitor = LoopMonitor(
+    interval=float(os.getenv("LOOP_CHECK_INTERVAL", "0.1")),
+    slow=float(os.getenv("LOOP_SLOW_THRESHOLD", "0.25"))
+)
+metrics.collectors.append(loop_monitor.metrics)
+MAX_PROFILE_SECONDS = 60
+DEVELOPERS_ONLY_STR = "**[ERROR]:** *Access denied. Developers only.*"
+
+# Deferred edits and follow-ups; pending ones are saved here on shutdown and
+# resumed on the next start
+timers = TimerWheel(supervisor=tasks)
+TIMER_STATE_PATH = os.getenv("TIMER_STATE_PATH", ".pending_timers.json")
+
+# Admission control: every command call is charged to its user, channel,
+# guild and the whole bot ("calls/seconds", empty to disable a scope)
+admission = Admission({
+    scope: parse_limit(limit) for scope, limit in (
+        ("user", os.getenv("RATE_LIMIT_USER", "5/10")),
+        ("channel", os.getenv("RATE_LIMIT_CHANNEL", "15/10")),
+        ("guild", os.getenv("RATE_LIMIT_GUILD", "40/10")),
+        ("global", os.getenv("RATE_LIMIT_GLOBAL", "50/1"))
+    ) if limit
+})
+# Commands that fan out into many API calls cost more than one call. A cost
+# over the smallest burst could never be admitted, so it's capped there.
+COMMAND_COSTS = {"selfdestruct": 3}
+for _command, _cost in COMMAND_COSTS.items():
+    if _cost > admission.max_cost():
+        print(f"[ERROR]: /{_command} costs {_cost} calls, more than the "
+              f"smallest rate limit burst ({admission.max_cost():g}); "
+              f"charging {admission.max_cost():g} instead.", file=sys.stderr)
+        COMMAND_COSTS[_command] = admission.max_cost()
+REJECTIONS = {
+    "user": "**[ERROR]:** *Cooling down. Try again in a few seconds.*",
+    "channel": "**[ERROR]:** *This channel is overheating. Try again in a "
+               "few seconds.*",
+    "guild": "**[ERROR]:** *This server is overheating. Try again in a few "
+             "seconds.*",
+    "global": "**[ERROR]:** *Deathbot is overloaded. Try again in a few "
+              "seconds.*"
+}
+# Past this many queued message edits, expensive commands (the self-destruct
+# animation) are replaced with a static reply
+SHED_EDIT_DEPTH = int(os.getenv("SHED_EDIT_DEPTH", "500"))
+
+# Threats to the creator are sent as digest DMs, at most one per
+# CREATOR_DM_INTERVAL seconds; the creator's DM channel is cached for
+# CREATOR_CACHE_TTL seconds
+creator_inbox = CreatorInbox(
+    bot, CREATOR_ID, timers, tasks,
+    ttl=float(os.getenv("CREATOR_CACHE_TTL", "3600")),
+    interval=float(os.getenv("CREATOR_DM_INTERVAL", "5"))
+)
 
-        "Sawblade Launcher",
-        "Sawblade Launcher MkII",
+# Self-destruct presence timelines as (seconds from start, status) steps.
+# Countdown: flash DND (red) and online (green) every half-second.
+SELF_DESTRUCT_FLASH = tuple(
+    (i / 2, discord.Status.dnd if i % 2 == 0 else discord.Status.online)
+    for i in range(9)
+) + ((4.5, discord.Status.online),)
+# Shutdown: DND, then invisible for 10 seconds, then back online.
+SELF_DESTRUCT_SHUTDOWN = (
+    (0, discord.Status.dnd),
+    (2, discord.Status.invisible),
+    (12, discord.Status.online)
+)
 
-        "Fireball Launcher",
-        "Fireball Launcher MkII",
+# Threats, protocols, loadouts and diagnostics, hot-reloaded from content.json
+content_store = ContentStore()
+
+# /loadout batches, drawn up front and rendered a page at a time as people
+# page through them; pages expire after LOADOUT_PAGE_TTL seconds. Batches are
+# also saved under LOADOUT_PAGES_DIR, so page buttons work on every worker
+# sharing it and after a restart.
+MAX_LOADOUTS = 500
+loadout_book = LoadoutBook(
+    os.getenv("LOADOUT_PAGES_DIR", ".loadout_pages"),
+    page_size=5,
+    max_batches=int(os.getenv("LOADOUT_MAX_BATCHES", "1000")),
+    ttl=float(os.getenv("LOADOUT_PAGE_TTL", "900"))
+)
+LOADOUT_EXPIRED_STR = ("**[ERROR]:** *These loadouts have been recycled. "
+                       "Run /loadout again.*")
+ALL_DISCOVERED_STR = ("**[LOADOUT DATABASE EXHAUSTED]** Every possible loadout "
+                      "has been discovered in this server. Impressive.")
+
+# Which loadouts each server has rolled, one memory-mapped bitmap per server
+seen_loadouts = SeenLoadouts(os.getenv("SEEN_LOADOUTS_DIR", ".seen_loadouts"))
+
+# Random non-bot member picks for /diagnose, optionally only members active
+# (messages or commands) within the last DIAGNOSE_ACTIVE_WINDOW seconds
+DIAGNOSE_ACTIVE_ONLY = os.getenv("DIAGNOSE_ACTIVE_ONLY", "") == "1"
+DIAGNOSE_ACTIVE_WINDOW = float(os.getenv("DIAGNOSE_ACTIVE_WINDOW", "3600"))
+member_sampler = MemberSampler(
+    active_window=DIAGNOSE_ACTIVE_WINDOW,
+    max_members=MEMBER_CACHE_SIZE if LOW_MEMORY_MODE else None
+)
 
-        "Repair Kit",
-        "Repair Kit MkII",
+# Guild ID -> IDs of developers currently in that guild. Maintained from the
+# gateway member cache and member events so the error path never hits REST.
+developers_by_guild: dict[int, set[int]] = {}
+# Guilds whose indexes were built from Discord's data by this process, rather
+# than restored from saved state
+rebuilt_guilds: set[int] = set()
 
-        "Godzilla's Arm",
-        "Godzilla's Arm MkII (Extra Strength)",
 
-        "Turd Cannon",
-        "Turd Cannon MkII (Explosive)",
+def index_guild_developers(guild: discord.Guild):
+    """
+    (Re)build the developer presence index for a guild from the member cache.
+    """
+    developers_by_guild[guild.id] = {
+        dev_id for dev_id in DEVELOPER_IDS if guild.get_member(dev_id)
+    }
 
-        "Missing",
 
-        "Jet Engine Thruster (This Arm Only)"
-    ]
+async def query_guild_developers(guilds: list[discord.Guild]):
+    """
+    Low-memory mode: look up which developers are in each guild over the
+    gateway (no member cache, no HTTP). Join/leave events keep it current.
+    """
+    if not DEVELOPER_IDS:
+        return
+    dev_ids = list(DEVELOPER_IDS)[:100]  # Gateway limit per request
+    for guild in guilds:
+        try:
+            found = await guild.query_members(user_ids=dev_ids, cache=False)
+        except Exception as err:
+            print(f"[ERROR]: Developer lookup failed for guild {guild.id}: "
+                  f"{err}", file=sys.stderr)
+            continue
+        developers_by_guild[guild.id] = {member.id for member in found}
+        rebuilt_guilds.add(guild.id)
+
+
+async def chunk_guilds(guilds: list[discord.Guild]):
+    """
+    Chunk guilds that on_ready found without a member cache or fresh saved
+    state, one at a time, indexing each as it completes.
+    """
+    for guild in guilds:
+        try:
+            await guild.chunk()
+        except Exception as err:
+            print(f"[ERROR]: Chunking failed for guild {guild.id}: {err}",
+                  file=sys.stderr)
+            continue
+        index_guild_developers(guild)
+        member_sampler.rebuild(guild)
+        rebuilt_guilds.add(guild.id)
+
+
+def restore_guild(guild_id: int, state: dict):
+    """
+    Rebuild a guild's developer and member indexes from saved state.
+    """
+    developers_by_guild[guild_id] = set(state["developers"]) & DEVELOPER_IDS
+    member_sampler.restore(guild_id, state["members"])
 
-    core_loadouts = [
-        "Concrete Mixer",
-        "Concrete Mixer MkII",
 
-        "Forklift Engine",
-        "Forklift Engine (With Turbocharger)",
+def guild_state() -> dict:
+    """
+    Guild ID -> developer and member indexes, saved for the next start.
+    """
+    members = member_sampler.export()
+    return {
+        guild_id: {
+            "developers": sorted(developers_by_guild.get(guild_id, ())),
+            "members": members.get(guild_id, [])
+        } for guild_id in developers_by_guild.keys() | members.keys()
+    }
 
-        "Demon Core (Held Up By a Screwdriver)",
-        "Demon Core MkII (Criticality Reached) (*Run.*)",
 
-        "Sentient Toaster Oven",
-        "Sentient Toaster Oven MkII (Extra Sentient)",
+def developers_in_guild(guild: discord.Guild | None) -> set[int]:
+    """
+    Return the IDs of developers present in the given guild, if any.
+    """
+    if guild is None:
+        return set()
+    if guild.id not in developers_by_guild:
+        index_guild_developers(guild)
+    return developers_by_guild[guild.id]
 
-        "V8 Car Engine",
-        "V8 Car Engine (With Turbocharger)",
 
-        "Trojan Horse",
-        "Trojan Horse MkII (Extra Horsepower)",
+def interaction_ids(interaction: Interaction) -> dict:
+    """
+    What a timer needs to answer an interaction later, even after a restart.
+    """
+    return {
+        "application_id": interaction.application_id,
+        "token": interaction.token
+    }
 
-        "Nuclear Reactor",
-        "Nuclear Reactor MkII",
 
-        "Missile Silo",
-        "Missile Silo MkII (Nuclear)",
+def interaction_webhook(application_id: int, token: str) -> discord.Webhook:
+    """
+    Rebuild an interaction's follow-up webhook from its IDs.
+    """
+    return discord.Webhook.partial(application_id, token, client=bot)
 
-        "Oversized Blender",
-        "Propane Furnace",
 
-        "Dyson Sphere (Nanoscopic Edition)",
+def message_ref(channel_id: int, message_id: int, application_id: int = None,
+                token: str = None):
+    """
+    Rebuild an editable message from IDs: through the interaction webhook for
+    interaction responses, else through the channel.
+    """
+    if token:
+        return WebhookMessageRef(
+            interaction_webhook(application_id, token), channel_id, message_id
+        )
+    channel = bot.get_partial_messageable(channel_id)
+    return channel.get_partial_message(message_id)
 
-        "Microwave Oven",
-        "Microwave Oven MkII (Possibly Sentient)",
 
-        "Rage-Powered Engine",
-        "Rage-Powered Engine MkII",
+@timers.action("edit")
+def edit_later(content: str, ping: bool = None, **ref):
+    """
+    Deferred message edit, sent through the edit queue.
+    """
+    kwargs = {"content": content}
+    if ping is not None:
+        kwargs["allowed_mentions"] = discord.AllowedMentions(users=ping)
+    edits.edit(message_ref(**ref), **kwargs)
 
-        "Waffle Iron Furnace (Syrup-Cooled)",
 
-        "Bag of Screaming Souls (Retail Edition)",
+@timers.action("followup")
+async def followup_later(application_id: int, token: str, content: str):
+    """
+    Deferred interaction follow-up message.
+    """
+    await interaction_webhook(application_id, token).send(content)
 
-        "Forklift (Unlicensed)",
-        "Forklift MkII",
 
-        "Blue Fire Furnace (Water-Cooled)",
+def get_loadout(guild_id=None, unseen=False):
+    """
+    Generate a random loadout for head, arms, and core, and mark it seen in
+    the guild. With unseen=True, only loadouts the guild hasn't rolled yet.
+    See Content.loadout_combinations for the number of unique combinations.
+    Returns ((head, l_arm, r_arm, core), first discovery?, seen bitmap), or
+    None if the guild has seen them all.
+    """
+    content = content_store.current
+    drawn = seen_loadouts.draw(content, guild_id, unseen=unseen)
+    if drawn is None:
+        return None
+    (head, l_arm, r_arm, core), new, bitmap = drawn
+    parts = (
+        content.heads.items[head], content.arms.items[l_arm],
+        content.arms.items[r_arm], content.cores.items[core]
+    )
+    return parts, new, bitmap
 
-        "Human Heart",
-        "Human Heart MkII (Retail-Grade)",
 
-        "Super Computer",
-        "Quantum Super Computer MkII",
+def discovery_note(bitmap, new: int) -> str:
+    """
+    Completion line for /loadout, announcing first discoveries.
+    """
+    progress = (f"{bitmap.count:,}/{bitmap.size:,} loadouts discovered in "
+                f"this server ({bitmap.count / bitmap.size:.4%})")
+    if new == 1:
+        return f"-# 🆕 **First discovery!** {progress}."
+    if new:
+        return f"-# 🆕 **{new:,} first discoveries!** {progress}."
+    return f"-# {progress}."
 
-        "Your Mom",
-        "Your Mom MkII (Extra Fat)",
 
-        "Empty",
-        "Empty MkII (Skill Issue)",
+class LoadoutPageButton(discord.ui.DynamicItem[discord.ui.Button],
+                        template=r"loadout:(?P<batch>[0-9a-f]+):(?P<page>\d+)"):
+    """
+    Previous/next page button for a /loadout batch. All state is in the
+    custom ID, so no View is kept per message; once the batch is gone
+    (expired, or the loadout parts were edited) the buttons say so.
+    """
 
-        "Home Depot Music Jukebox",
-        "Home Depot Music Jukebox MkII (Remix Edition)"
-    ]
+    def __init__(self, batch_id: str, page: int, label: str,
+                 disabled: bool = False):
+        super().__init__(discord.ui.Button(
+            label=label, style=discord.ButtonStyle.secondary,
+            custom_id=f"loadout:{batch_id}:{page}", disabled=disabled
+        ))
+        self.batch_id = batch_id
+        self.page = page
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        return cls(match["batch"], int(match["page"]), item.label)
+
+    async def callback(self, interaction: Interaction):
+        text = await loadout_book.page(
+            self.batch_id, self.page, content_store.current
+        )
+        if text is None:
+            await interaction.response.edit_message(
+                content=LOADOUT_EXPIRED_STR, view=None
+            )
+            return
+        await interaction.response.edit_message(
+            content=text, view=loadout_view(self.batch_id, self.page)
+        )
 
-    head = choice(head_loadouts)
-    l_arm = choice(arm_loadouts)
-    r_arm = choice(arm_loadouts)
-    core = choice(core_loadouts)
 
-    return head, l_arm, r_arm, core
+def loadout_view(batch_id: str, page: int) -> discord.ui.View:
+    """
+    Page buttons for one page of a /loadout batch.
+    """
+    pages = loadout_book.page_count(batch_id)
+    view = discord.ui.View(timeout=None)
+    # Targets always differ (pages >= 2), so custom IDs stay unique
+    view.add_item(LoadoutPageButton(
+        batch_id, max(page - 1, 0), "◀", disabled=page == 0
+    ))
+    view.add_item(LoadoutPageButton(
+        batch_id, min(page + 1, pages - 1), "▶", disabled=page >= pages - 1
+    ))
+    view.stop()  # Clicks are routed through the dynamic item instead
+    return view
 
 
 def with_error_handling():
     """
     Decorator to wrap both slash (Interaction) and prefix (Context) commands
-    with error catching. Logs full traceback to stderr, then sends a concise
-    error message in Discord. Full details are only shown if a developer
-    is present in the guild.
+    with error catching. Queues the error for the error log, then sends a
+    concise error message in Discord. Full details are only shown if a
+    developer is present in the guild. Also records per-command metrics, and turns
+    away calls over the admission rate limits before doing any work.
     """
     def decorator(func):
+        cost = COMMAND_COSTS.get(func.__name__, 1)
+
         @wraps(func)
         async def wrapper(*args, **kwargs):
             # First argument is either Context (prefix) or Interaction (slash)
             ctx = args[0]
+            guild = getattr(ctx, "guild", None)
+            if isinstance(ctx, Interaction):
+                # guild_id, as HTTP interactions mode has no guild cache
+                user_id, channel_id = ctx.user.id, ctx.channel_id
+                guild_id = ctx.guild_id
+            else:
+                user_id, channel_id = ctx.author.id, ctx.channel.id
+                guild_id = guild.id if guild else None
+            rejected = admission.admit(user_id, channel_id, guild_id, cost)
+            if rejected:
+                # Prefix commands are dropped silently; interactions must
+                # be answered
+                if isinstance(ctx, Interaction):
+                    await ctx.response.send_message(
+                        REJECTIONS[rejected], ephemeral=True
+                    )
+                return
+
+            invocation = metrics.start(func.__name__)
             try:
                 await func(*args, **kwargs)
+                usage.command(func.__name__, guild_id, user_id)
             except Exception as err:
-                # Log full traceback to stderr for debugging
-                header = f"[ERROR]: Exception in `{func.__name__}`"
-                trace = traceback.format_exc().rstrip()
-                print(f"{header}\n{trace}\n{separator}", file=sys.stderr)
+                metrics.error(invocation, err)
+
+                # Formatting and writing happen off the event loop
+                error_log.capture(
+                    func.__name__, err, user_id=user_id,
+                    channel_id=channel_id, guild_id=guild_id
+                )
 
                 try:
                     # Determine if any developer IDs are present in the guild
-                    guild = getattr(ctx, "guild", None)
-                    developers_present = []
-                    if guild:
-                        async for member in guild.fetch_members():
-                            if member.id in DEVELOPER_IDS:
-                                developers_present.append(member.id)
+                    developers_present = developers_in_guild(guild)
 
                     # Construct user-facing error message
                     user_msg = (
@@ -300,16 +564,132 @@ def with_error_handling():
                     elif isinstance(ctx, commands.Context):
                         await ctx.send(user_msg)
                 except Exception as second_err:
-                    # Log secondary errors to stderr
-                    print(
-                        f"[ERROR]: Failed to send Discord message: {err}\n"
-                        f"Secondary error: {second_err}\n{separator}\n",
-                        file=sys.stderr
+                    # Log secondary errors too
+                    error_log.capture(
+                        f"{func.__name__} error reply", second_err,
+                        original=repr(err)
                     )
+            finally:
+                metrics.finish(invocation)
         return wrapper
     return decorator
 
 
+def with_defer_budget(budget: float = None):
+    """
+    Decorator for slash commands that may do slow work before answering.
+    If the reply isn't out DEFER_BUDGET seconds after the interaction was
+    created, the interaction is deferred for it and the reply becomes a
+    follow-up, so users don't see "interaction failed". Use it under
+    @with_error_handling() so defers show up in that command's metrics.
+    """
+    def decorator(func):
+        def count_defer():
+            metrics.deferred(func.__name__)
+
+        @wraps(func)
+        async def wrapper(interaction: Interaction, *args, **kwargs):
+            wrapped = budgeted(
+                interaction, DEFER_BUDGET if budget is None else budget,
+                on_defer=count_defer
+            )
+            try:
+                await func(wrapped, *args, **kwargs)
+            finally:
+                wrapped.response.timer.cancel()
+                await wrapped.response.wait()
+        return wrapper
+    return decorator
+
+
+@bot.event
+async def setup_hook():
+    """
+    Called once before connecting. Starts watching the content file so
+    edits go live without a restart, and the metrics endpoint if enabled.
+    """
+    tasks.spawn("content_watch", content_store.watch(), daemon=True)
+    bot.add_dynamic_items(LoadoutPageButton)
+    tasks.spawn("creator_warm", creator_inbox.warm())
+    timers.load(TIMER_STATE_PATH)
+    tasks.spawn("timer_wheel", timers.run(), daemon=True)
+    tasks.spawn("loop_monitor", loop_monitor.run(), daemon=True)
+    if METRICS_PORT:
+        await metrics.serve(METRICS_HOST, int(METRICS_PORT))
+
+
+_close_bot = bot.close
+
+
+async def flush_outbound(timeout: float):
+    """
+    Send the queued message edits and creator DMs, for up to `timeout`
+    seconds.
+    """
+    try:
+        await asyncio.wait_for(
+            asyncio.gather(edits.flush(), creator_inbox.flush()), timeout
+        )
+    except asyncio.TimeoutError:
+        print(f"[ERROR]: {edits.depth} message edits and "
+              f"{creator_inbox.stats()['depth']} creator DMs were still "
+              f"queued at shutdown.", file=sys.stderr)
+
+
+async def close_bot():
+    """
+    Stands in for bot.close(): sends queued edits and DMs and lets
+    background work (countdowns, timer actions) finish while still
+    connected, up to SHUTDOWN_DRAIN_TIMEOUT seconds, saves the guild
+    indexes for the next start, then closes as usual. Timers that come due
+    within the drain fire before closing; the rest are saved.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + SHUTDOWN_DRAIN_TIMEOUT
+    await flush_outbound(SHUTDOWN_DRAIN_TIMEOUT)
+    await tasks.shutdown(max(0.0, deadline - loop.time()))
+    # shutdown() stopped the wheel; fire what came due meanwhile, and what
+    # the finished countdowns just scheduled
+    await timers.drain(max(SHUTDOWN_TIMER_GRACE, deadline - loop.time()))
+    # Edits and DMs queued by the tasks that just finished
+    await flush_outbound(max(SHUTDOWN_FLUSH_GRACE, deadline - loop.time()))
+    try:
+        saved_guilds.save(guild_state(), rebuilt_guilds)
+    except OSError as err:
+        print(f"[ERROR]: Couldn't save guild state: {err}",
+              file=sys.stderr)
+    await _close_bot()
+
+
+bot.close = close_bot
+
+
+async def sync_commands():
+    """
+    Sync slash commands, skipping the REST call if the command tree hasn't
+    changed since the last sync. With DEV_GUILD_IDS set, commands are synced
+    to those guilds only (they update instantly there) instead of globally.
+    """
+    for guild_id in DEV_GUILD_IDS:
+        bot.tree.copy_global_to(guild=discord.Object(id=guild_id))
+
+    for guild_id in DEV_GUILD_IDS or [None]:
+        where = f"guild {guild_id}" if guild_id else "global"
+        try:
+            synced = await sync_if_changed(
+                bot.tree, guild_id, force=FORCE_COMMAND_SYNC
+            )
+        except Exception as sync_err:
+            print(f"[ERROR]: Command sync failed ({where}): {sync_err}")
+            continue
+        if synced is None:
+            print(f"Commands unchanged ({where}), skipped sync.")
+        else:
+            count = len(synced)
+            label = "commands" if count != 1 else "command"
+            print(f"Synced {count} {label} ({where}).")
+
+
 @bot.event
 async def on_ready():
     """
@@ -317,17 +697,101 @@ async def on_ready():
     Syncs slash commands and notifies in console.
     """
     print(f"Logged in as {bot.user} (ID: {bot.user.id})\n{separator}")
-    try:
-        synced = await bot.tree.sync()
-        count = len(synced)
-        label = "commands" if count != 1 else "command"
-        print(f"Synced {count} {label}.")
-    except Exception as sync_err:
-        print(f"[ERROR]: Command sync failed: {sync_err}")
+    # Commands are global, so only the process owning shard 0 syncs them
+    shard_ids = getattr(bot, "shard_ids", None)
+    if not shard_ids or 0 in shard_ids:
+        await sync_commands()
+
+    # Guilds saved fresh by the previous process are restored as saved;
+    # the rest are indexed from the member cache, chunking them first if
+    # startup chunking was skipped for the saved ones
+    restored, unindexed = set(), []
+    for guild in bot.guilds:
+        state = saved_guilds.restore(guild.id)
+        if state is not None:
+            restore_guild(guild.id, state)
+            restored.add(guild.id)
+        elif guild.chunked or LOW_MEMORY_MODE:
+            index_guild_developers(guild)
+            member_sampler.rebuild(guild)
+            rebuilt_guilds.add(guild.id)
+        else:
+            unindexed.append(guild)
+    if unindexed:
+        tasks.spawn("guild_chunk", chunk_guilds(unindexed))
+    if LOW_MEMORY_MODE:
+        tasks.spawn("developer_lookup", query_guild_developers(
+            [guild for guild in bot.guilds if guild.id not in restored]
+        ))
+
     print(f"{bot.user.name} is online and ready to take over the galaxy!\n"
           f"{separator}")
 
 
+@bot.event
+async def on_guild_join(guild: discord.Guild):
+    """
+    Index developer presence and members for newly joined guilds.
+    """
+    index_guild_developers(guild)
+    member_sampler.rebuild(guild)
+    rebuilt_guilds.add(guild.id)
+    if LOW_MEMORY_MODE:
+        await query_guild_developers([guild])
+
+
+@bot.event
+async def on_guild_remove(guild: discord.Guild):
+    """
+    Drop the developer presence and member indexes for guilds the bot left.
+    """
+    developers_by_guild.pop(guild.id, None)
+    member_sampler.remove_guild(guild.id)
+    rebuilt_guilds.discard(guild.id)
+
+
+@bot.event
+async def on_member_join(member: discord.Member):
+    """
+    Keep the developer presence and member indexes current on joins.
+    """
+    if member.id in DEVELOPER_IDS:
+        developers_in_guild(member.guild).add(member.id)
+    member_sampler.add(member)
+
+
+@bot.event
+async def on_raw_member_remove(payload: discord.RawMemberRemoveEvent):
+    """
+    Keep the developer presence and member indexes current on leaves.
+    Uses the raw event so uncached members are still handled.
+    """
+    if payload.user.id in DEVELOPER_IDS:
+        developers_by_guild.get(payload.guild_id, set()).discard(
+            payload.user.id
+        )
+    member_sampler.remove(payload.guild_id, payload.user.id)
+
+
+@bot.event
+async def on_message(message: discord.Message):
+    """
+    Track recently active members for /diagnose, then run prefix commands.
+    """
+    if message.guild and not message.author.bot:
+        member_sampler.touch(message.guild.id, message.author.id)
+    await bot.process_commands(message)
+
+
+@bot.event
+async def on_interaction(interaction: Interaction):
+    """
+    Track members who use commands as recently active.
+    """
+    if interaction.guild_id:
+        member_sampler.touch(interaction.guild_id, interaction.user.id)
+
+
 # --------------------
 # Prefix Commands (!)
 # --------------------
@@ -360,72 +824,130 @@ async def greet(interaction: Interaction):
     )
 
 
+# Self-destruct sequence. Every step after the first message is a timer, so
+# nothing sleeps per interaction and a restart picks up where it left off.
+SELF_DESTRUCT_STR = ("**[PROTOCOL 8.19-β ENGAGED]** INITIATING SELF-DESTRUCT "
+                     "SEQUENCE. T-MINUS:")
+
+
+SELF_DESTRUCT_SHED = ("**[PROTOCOL 8.19-β ENGAGED]** SELF-DESTRUCT SEQUENCE "
+                      "POSTPONED. TOO MANY THINGS ARE ALREADY EXPLODING.")
+
+
+def outbound_saturated() -> bool:
+    """
+    Whether queued message edits are backed up enough to shed load.
+    """
+    return edits.depth >= SHED_EDIT_DEPTH
+
+
+def self_destruct_available() -> bool:
+    """
+    Whether a new countdown can play (or queue), rather than being shed.
+    """
+    return not outbound_saturated() and tasks.available("selfdestruct")
+
+
+async def self_destruct_countdown(ref: dict):
+    """
+    Play the countdown on the message `ref` (IDs plus interaction token)
+    points to, then the final outcome. Runs as a supervised "selfdestruct"
+    task; if it's cancelled on shutdown, the outcome is left on the timer
+    wheel so it still plays after a restart.
+    """
+    # Half-second DND/online flashing, played by the presence scheduler
+    presence.animate(SELF_DESTRUCT_FLASH)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    message = message_ref(**ref)
+    try:
+        # Countdown edits go through the edit queue, so a slow or rate
+        # limited edit can't push later numbers back; only the newest
+        # pending one is sent
+        for i in range(4, -1, -1):
+            await asyncio.sleep(max(0.0, start + 4 - i - loop.time()))
+            edits.edit(message, content=f"{SELF_DESTRUCT_STR} **{i}**...")
+        await asyncio.sleep(max(0.0, start + 5.5 - loop.time()))
+    except asyncio.CancelledError:
+        timers.schedule(max(0.0, start + 5.5 - loop.time()),
+                        "self_destruct_outcome", **ref)
+        raise
+    finish_self_destruct(**ref)
+
+
+@timers.action("self_destruct")
+async def self_destruct_later(application_id: int, token: str):
+    """
+    Start self-destruct on an interaction that was already answered
+    (/threaten on the bot, protocol 8.19-β).
+    """
+    webhook = interaction_webhook(application_id, token)
+    if not self_destruct_available():
+        await webhook.send(SELF_DESTRUCT_SHED)
+        return
+    message = await webhook.send(f"{SELF_DESTRUCT_STR} **5**...", wait=True)
+    tasks.spawn("selfdestruct", self_destruct_countdown({
+        "channel_id": message.channel.id, "message_id": message.id,
+        "application_id": application_id, "token": token
+    }))
+
+
+@timers.action("self_destruct_outcome")
+def finish_self_destruct(application_id: int, token: str, **ref):
+    # Determine final outcome randomly
+    if randint(1, 3) != 3:
+        presence.animate(SELF_DESTRUCT_SHUTDOWN)
+        timers.schedule(
+            0, "followup", application_id=application_id, token=token,
+            content="**[WARNING]:** CRITICAL DAMAGE DETECTED. SHUTDOWN "
+                    "IMMINENT"
+        )
+        timers.schedule(
+            SELF_DESTRUCT_SHUTDOWN[-1][0], "followup",
+            application_id=application_id, token=token,
+            content="**SYSTEM REBOOT COMPLETE.** DAMAGE "
+                    "PATCHED. DEATHBOT IS ONLINE."
+        )
+    else:
+        edits.edit(
+            message_ref(application_id=application_id, token=token, **ref),
+            content=f"{SELF_DESTRUCT_STR} **0**... \n"
+                    f"SAFETY LOCK ENGAGED. SELF DESTRUCTION ABORTED."
+        )
+
+
 # Self-destruct command
 @bot.tree.command(
     name="selfdestruct", description="Deathbot self-destruct sequence."
 )
 @with_error_handling()
+@with_defer_budget()
 async def selfdestruct(interaction: Interaction):
     """
     Initiates a dramatic countdown with flashing DND/online (red/green) status.
     """
-    async def run_self_destruct(interaction: Interaction, message: discord.Message, shutdown_str: str):
-        """
-        Handle the countdown and final outcome of the self-destruct sequence.
-        """
-        # Countdown loop with half-second status flashes
-        for i in range(8, -1, -1):
-            # Alternate between DND (red) and online every half-second
-            status = discord.Status.dnd if i % 2 == 0 else discord.Status.online
-            await bot.change_presence(status=status)
-            # Update countdown every full second
-            if i % 2 == 0:
-                await message.edit(
-                    content=f"{shutdown_str} **{int(i / 2)}**..."
-                )
-            await asyncio.sleep(0.5)
-            await bot.change_presence(status=discord.Status.online)
-
-        await asyncio.sleep(1)
-
-        await finalize_self_destruct(interaction, message, shutdown_str)
-
-
-    async def finalize_self_destruct(interaction: Interaction, message: discord.Message, shutdown_str: str):
-        # Determine final outcome randomly
-        if randint(1, 3) != 3:
-            await bot.change_presence(status=discord.Status.dnd)
-            await interaction.followup.send(
-                "**[WARNING]:** CRITICAL DAMAGE DETECTED. SHUTDOWN IMMINENT"
-            )
-            await asyncio.sleep(2)
-            await bot.change_presence(status=discord.Status.invisible)
-            await asyncio.sleep(10)
-            await bot.change_presence(status=discord.Status.online)
-            await interaction.followup.send(
-                "**SYSTEM REBOOT COMPLETE.** DAMAGE "
-                "PATCHED. DEATHBOT IS ONLINE."
-            )
-        else:
-            await message.edit(
-                content=f"{shutdown_str} **0**... \n"
-                        f"SAFETY LOCK ENGAGED. SELF DESTRUCTION ABORTED."
-            )
-
+    # Skip the animation (6+ edits and presence changes) when backed up or
+    # too many are already playing
+    if not self_destruct_available():
+        await interaction.response.send_message(SELF_DESTRUCT_SHED)
+        return
 
-    shutdown_str = ("**[PROTOCOL 8.19-β ENGAGED]** INITIATING SELF-DESTRUCT "
-                    "SEQUENCE. T-MINUS:")
-    message_str = f"{shutdown_str} **5**..."
+    message_str = f"{SELF_DESTRUCT_STR} **5**..."
 
     # Send initial countdown message
     try:
-        await interaction.response.send_message(message_str)
-        message = await interaction.original_response()
+        callback = await interaction.response.send_message(message_str)
+        message_id = callback.message_id
     except discord.errors.InteractionResponded:
         message = await interaction.followup.send(message_str, wait=True)
+        message_id = message.id
 
-    # Handle countdown sequence and final outcome
-    await run_self_destruct(interaction, message, shutdown_str)
+    # Countdown and final outcome run as a supervised background task
+    tasks.spawn("selfdestruct", self_destruct_countdown({
+        "channel_id": interaction.channel_id, "message_id": message_id,
+        **interaction_ids(interaction)
+    }))
 
 
 # America command
@@ -447,6 +969,7 @@ async def america(interaction: Interaction):
 @bot.tree.command(name="threaten", description="Threaten a user.")
 @app_commands.describe(user="The user to threaten")
 @with_error_handling()
+@with_defer_budget()
 async def threaten(
         interaction: Interaction, user: discord.User, ping: bool = False
 ):  # Why so sad?
@@ -465,6 +988,7 @@ async def threaten(
         )
         return
 
+    usage.threat(interaction.guild_id, interaction.user.id, user.id)
     threat = await get_threat()
 
     # 50% chance to modify threat to a ban command if it's the mod banish threat
@@ -476,149 +1000,64 @@ async def threaten(
         )
     else:
         # Send the threat
-        await interaction.response.send_message(
+        callback = await interaction.response.send_message(
             f"{user.mention} — {threat}",
             allowed_mentions = discord.AllowedMentions(users=ping)
         )
-        message = await interaction.original_response()
 
         # Edit in "To hell." 2.5 seconds later if it's the free vacation threat
         if threat == "*Congratulations!* You just won a free vacation!":
-            await asyncio.sleep(2.5)
-            await message.edit(
-                content=message.content + " **To hell.**",
-                allowed_mentions = discord.AllowedMentions(users=ping)
+            timers.schedule(
+                2.5, "edit",
+                content=f"{user.mention} — {threat} **To hell.**", ping=ping,
+                channel_id=interaction.channel_id,
+                message_id=callback.message_id, **interaction_ids(interaction)
             )
 
     # If the user threatens the bot itself, start self-destruct sequence
     if user.id == bot.user.id:
-        await asyncio.sleep(2)
-        asyncio.create_task(selfdestruct.callback(interaction))
+        timers.schedule(2, "self_destruct", **interaction_ids(interaction))
 
 
 async def get_threat() -> str:
     """
     Randomly select and return a threat string.
     Some threats may trigger additional behaviors (ban, vacation, etc.).
-    * Threats with "# *": If you edit one of these strings, also edit it in
-    threaten() and threaten_creator().
+    * Threats handled specially: If you edit "*Congratulations!* You just won
+    a free vacation!" or "Mods, banish them to Lowes." in content.json, also
+    edit it in threaten() and threaten_creator().
     """
-    threats = [
-        "I just don't like you. You will have your limbs cut off by a power "
-        "saw and reattached backwards the next time you fall asleep first at "
-        "a sleepover.",
-
-        "You have ignored the signs. Now your mother will be met with a DeWalt "
-        "DCD791D2 20V MAX Cordless Brushless Drill with a 1/4 inch Irwin "
-        "Titanium Drill Bit. Her fate is sealed as she feels the full force "
-        "of the drill bit.",
-
-        "You have been flagged for ***unholy cringe.*** Your sentence: slow "
-        "vaporization via industrial microwave.",
-
-        "Your IP address has been sent to the Galactic Sandpaper Consortium "
-        "of Home Depot. Expect aggressive friction shortly.",
-
-        "Your bones will be rearranged alphabetically. Good luck walking in "
-        "*abecedarian order*.",
-
-        "You've been assigned as a volunteer for **Protocol S4N-D3R**. Bring "
-        "safety glasses and an extra layer skin.",
-
-        "Your sins have not gone unnoticed by the Council of Dads. You're to "
-        "be ***force-fed drywall*** until you achieve enlightenment or perish. "
-        "Whichever comes first.",
-
-        "Vibe checking... You have failed miserably. You will be trapped in an "
-        "elevator with a saxophonist who only plays 'Careless Whisper.'",
-
-        "Your brainwaves violate OSHA noise regulations. Expect neural "
-        "restructuring via tactical crowbar.",
-
-        "We ran a vibe check. You failed. A team of legally-distinct Minions "
-        "is en route with industrial grade paintball guns and no mercy.",
-
-        "Your continued existence violates protocol `7-B`. You will be "
-        "***exfoliated*** with an orbital belt sander.",
-
-        "The Council of Dads has voted. You are to be assimilated and "
-        "transformed into a Home Depot Deathbot.",
-
-        "Your existence violates protocol `2-G` and you must be exterminated. "
-        "You will now be targeted by an orbital bombardment focused directly "
-        "on your current location.",
-
-        "You have made an enemy today. Your human rights license will be "
-        "revoked and international ICE officers will have you deported to "
-        "the Home Depot homeworld where you will serve the Home Depot "
-        "deathbots for as long as you live.",
-
-        "*Congratulations!* You just won a free vacation!",  # *
-
-        f"You think you're funny? You are now exiled to "
-        f"**Aisle {randint(1, 32)}**.",
-
-        "Mods, banish them to Lowes."  # *
-    ]
-    return choice(threats)
+    content = content_store.current
+    return content.render(content.threats.draw())
 
 
 # Protocol command
 @bot.tree.command(name="protocol", description="Activate a Deathbot protocol.")
 @app_commands.describe(protocol="Optional: the protocol number to activate.")
 @with_error_handling()
+@with_defer_budget()
 async def protocol(interaction: Interaction, protocol: str = None):
     """
     Activates a specified or random protocol.
     """
 
-    # Valid protocol entries
-    protocols = {
-        "89-Ω": {
-            "title": "[PROTOCOL 89-Ω] Activated.",
-            "message": "*Deploying hydraulic pressure cannons.* "
-                       "Target: Ceiling fan malfunction.\nCollateral Damage: "
-                       "*Acceptable*."
-        },
-        "3.14-π": {
-            "title": "[PROTOCOL 3.14-π] Initiated.",
-            "message": "*Flooding area with irrational numbers.* "
-                       "Enemy will experience numerical nausea."
-        },
-        "404": {
-            "title": "[PROTOCOL 404] Engaged.",
-            "message": "*Target not found.* Launching missiles anyway."
-        },
-        "X-99": {
-            "title": "[PROTOCOL X-99] Commenced.",
-            "message": "Deploying swarm of hyper-aggressive Roombas. **_Run_**."
-        },
-        "13-A": {
-            "title": "[PROTOCOL 13-A] Online.",
-            "message": "*Unleashing unlicensed contractors.* Expect a lot of "
-                       "drywall, existential dread, and OSHA violations."
-        },
-        "303-Σ": {
-            "title": "[PROTOCOL 303-Σ] Aborted.",
-            "message": "*Yo mama is so fat, I had to abort.* As punishment, "
-                       "your dad's Home Depot privileges have been revoked."
-        },
-        "8.19-β": {  # Initiates self destruct sequence, skips this message
-            "title": "",
-            "message": ""
-        }
-    }
+    content = content_store.current
 
-    # Specific protocol
+    # Specific protocol, also accepting loose spellings like "89-O" for 89-Ω
     if protocol:
-        entry = protocols.get(protocol)
-        if entry:
-            if protocol == "8.19-β":  # Self-destruct protocol
-                await asyncio.sleep(2)
-                asyncio.create_task(selfdestruct.callback(interaction))
+        proto_id = protocol if protocol in content.protocols \
+            else content.protocol_index.resolve(protocol)
+        if proto_id:
+            usage.items("protocol", interaction.guild_id, (proto_id,))
+            if content.protocols[proto_id].get("action") == "selfdestruct":
+                # e.g. 8.19-β: show "thinking..." for 2 seconds, then start
+                # the countdown
+                await interaction.response.defer()
+                timers.schedule(2, "self_destruct",
+                                **interaction_ids(interaction))
             else:
                 await interaction.response.send_message(
-                    f"**{entry['title']}**\n{entry['message']}"
+                    content.protocol_response(proto_id)
                 )
         else:
             # Invalid protocol triggers retaliation
@@ -629,16 +1068,29 @@ async def protocol(interaction: Interaction, protocol: str = None):
             )
     else:
         # Random protocol
-        proto, entry = choice(list(protocols.items()))
-        if proto == "8.19-β":
-            await asyncio.sleep(2)
-            asyncio.create_task(selfdestruct.callback(interaction))
+        proto_id, entry = choice(content.protocol_items)
+        usage.items("protocol", interaction.guild_id, (proto_id,))
+        if entry.get("action") == "selfdestruct":
+            await interaction.response.defer()
+            timers.schedule(2, "self_destruct", **interaction_ids(interaction))
         else:
             await interaction.response.send_message(
-                f"**{entry['title']}**\n{entry['message']}"
+                content.protocol_response(proto_id)
             )
 
 
+@protocol.autocomplete("protocol")
+async def protocol_autocomplete(interaction: Interaction, current: str):
+    """
+    Suggest protocols with an ID or title word starting with what's typed.
+    """
+    return [
+        app_commands.Choice(name=name, value=proto_id)
+        for name, proto_id in
+        content_store.current.protocol_index.complete(current)
+    ]
+
+
 @bot.tree.command(
     name="diagnose", description="Run a diagnostic scan on a user."
 )
@@ -646,85 +1098,105 @@ async def protocol(interaction: Interaction, protocol: str = None):
     user="The user to diagnose. Leave blank to select randomly."
 )
 @with_error_handling()
+@with_defer_budget()
 async def diagnose(interaction: Interaction, user: discord.User = None):
     """
     Scans a user and returns a ridiculous, randomized diagnostic report.
     """
-    # Pick the user to diagnose
-    target = user or choice(interaction.guild.members)
-
-    # Diagnostic data templates
-    diagnostics = [
-        f"🦴 Bone density: {randint(35, 90)}%",
-        f"🤡 Humor module: {choice(
-            ['Inert', 'Overclocked', 'Leaking', 'Replaced with sarcasm']
-        )}",
-        f"🧠 Cognitive core: {choice(
-            ['Quantum banana mode', 
-             'Left in airplane mode', 
-             'Missing DLL', 
-             'OSHA noncompliant', 
-             'Albert Einstein 2.0']
-        )}",
-        f"📈 Sanity index: {randint(-200, 1200) / 10}%",
-        f"🦴 Skeleton status: {choice(
-            ['Mostly intact', 
-             'Made of LEGOs', 
-             'Held together by spite', 
-             'Unlicensed', 
-             'Missing']
-        )}",
-        f"✅ Vibe signature: {choice(
-            ['Dubstep raccoon', 
-             'Ambient cat rage', 
-             'Mild doom jazz', 
-             'Gigachad', 
-             'Unverified Signature', 
-             'Undocumented Immigrant', 
-             'Karen']
-        )}"
-    ]
-
-    recommendations = [
-        "Replace brain with rebar.",
-        "Perform ritual reboot via bathroom mirror.",
-        "Install emotional drivers (version 1.2.9-beta).",
-        "Send to Aisle 9 for recalibration.",
-        "Upgrade personality firmware. Current version: 404.",
-        "Summon Lord Xarathys Dreadbot of Home Depotius Omega. This threat "
-        "must be delt with.",
-        "Locate and bring home this unit's dad."
-    ]
-
-    report = "\n".join(sample(diagnostics, k=randint(2, 4)))
-    action = choice(recommendations)
+    # Pick the user to diagnose: random non-bot member, or the caller
+    if user:
+        target = user.mention
+    else:
+        member_id = interaction.guild_id and member_sampler.sample(
+            interaction.guild_id, active_only=DIAGNOSE_ACTIVE_ONLY
+        )
+        target = f"<@{member_id}>" if member_id else interaction.user.mention
 
     # Send the diagnostic report
     await interaction.response.send_message(
-        f"🔍 Analyzing organic unit: {target.mention}...\n\n"
-        f"{report}\n\n"
-        f"💡 Recommended action: **{action}**",
+        diagnostic_report(target),
         allowed_mentions=discord.AllowedMentions(users=False)
     )
 
 
+def diagnostic_report(target: str) -> str:
+    """
+    Build a /diagnose report on `target` (a mention).
+    """
+    content = content_store.current
+
+    # Diagnostic templates are filled in with fresh values on every scan
+    report = "\n".join(
+        content.render(line)
+        for line in sample(content.diagnostics, k=randint(2, 4))
+    )
+    action = content.render(choice(content.recommendations))
+    return (
+        f"🔍 Analyzing organic unit: {target}...\n\n"
+        f"{report}\n\n"
+        f"💡 Recommended action: **{action}**"
+    )
+
+
 @bot.tree.command(
     name="loadout", description="Get a random robotic home depot rebot loadout."
 )
+@app_commands.describe(
+    count=f"How many loadouts to generate (1-{MAX_LOADOUTS}), five per page.",
+    unseen="Only loadouts nobody in this server has rolled yet."
+)
 @with_error_handling()
-async def loadout(interaction: Interaction):
+@with_defer_budget()
+async def loadout(interaction: Interaction,
+                  count: app_commands.Range[int, 1, MAX_LOADOUTS] = 1,
+                  unseen: bool = False):
     """
-    Creates a randomized robotic home depot tool-based loadout.
+    Creates a randomized robotic home depot tool-based loadout, or a batch
+    of them with buttons to page through. Every loadout rolled is recorded
+    per server, and the reply shows how many of them the server has found.
     """
+    if count > 1:
+        content = content_store.current
+        loadouts, new, bitmap = seen_loadouts.draw_many(
+            content, interaction.guild_id, count, unseen=unseen
+        )
+        if not loadouts:
+            await interaction.response.send_message(ALL_DISCOVERED_STR)
+            return
+        usage.items("loadout", interaction.guild_id, (
+            name
+            for head, l_arm, r_arm, core in loadouts
+            for name in (
+                content.heads.items[head], content.arms.items[l_arm],
+                content.arms.items[r_arm], content.cores.items[core]
+            )
+        ))
+        batch_id = await loadout_book.create(
+            content, loadouts, note=discovery_note(bitmap, new)
+        )
+        text = await loadout_book.page(batch_id, 0)
+        if loadout_book.page_count(batch_id) == 1:
+            await interaction.response.send_message(text)
+        else:
+            await interaction.response.send_message(
+                text, view=loadout_view(batch_id, 0)
+            )
+        return
 
-    head, l_arm, r_arm, core = get_loadout()
+    drawn = get_loadout(interaction.guild_id, unseen=unseen)
+    if drawn is None:
+        await interaction.response.send_message(ALL_DISCOVERED_STR)
+        return
+    (head, l_arm, r_arm, core), new, bitmap = drawn
+    usage.items("loadout", interaction.guild_id, (head, l_arm, r_arm, core))
 
     await interaction.response.send_message(
-        f"## **[HOME DEPOT ROBOTIC DEPLOYMENT KIT LOADED]**:\n"
+        f"{LOADOUT_HEADER}:\n"
         f"**Head:** {head}\n"
         f"**Left Arm:** {l_arm}\n"
         f"**Right Arm:** {r_arm}\n"
-        f"**Core:** {core}"
+        f"**Core:** {core}\n"
+        f"{discovery_note(bitmap, new)}"
     )
 
 
@@ -734,6 +1206,7 @@ async def loadout(interaction: Interaction):
                 "creator, @zytronium. Go wild."
 )
 @with_error_handling()
+@with_defer_budget()
 async def threaten_creator(interaction: Interaction):
     """
     Sends the result of /threaten to the bot creator's DMs.
@@ -742,29 +1215,8 @@ async def threaten_creator(interaction: Interaction):
     threat = await get_threat()
 
     try:
-        creator = await bot.fetch_user(CREATOR_ID)
-
-        # 50% chance to modify threat to a ban command if it's mod banish threat
-        if threat == "Mods, banish them to Lowes." and randint(1, 2) == 2:
-            # Send a ban command.
-            await creator.send(
-                f"-# Threat from {interaction.user.mention}\n"
-                f"?ban {creator.mention} banished to Lowes for "
-                f"being too low tier."
-            )
-        else:
-            # Send the threat and store the message so we can edit it
-            message = await creator.send(
-                f"-# Threat from {interaction.user.mention}\n"
-                f"{creator.mention} — {threat}")
-
-            # Edit in "To hell." 2.5 sec later if it's the free vacation threat
-            if threat == "*Congratulations!* You just won a free vacation!":
-                await asyncio.sleep(2.5)
-                await message.edit(content=message.content + " **To hell.**")
-        await interaction.response.send_message(
-            "Threat delivered to Deathbot's creator."
-        )
+        # Cached after the first call; only this first fetch can fail here
+        creator = await creator_inbox.user()
     except Exception as err:
         await interaction.response.send_message(
             "Failed to send the message to the creator. Did he block me?",
@@ -772,6 +1224,147 @@ async def threaten_creator(interaction: Interaction):
         )
         raise err
 
+    usage.threat(interaction.guild_id, interaction.user.id, CREATOR_ID)
+
+    # DMs go out in the background, batched with other recent threats
+    # 50% chance to modify threat to a ban command if it's mod banish threat
+    if threat == "Mods, banish them to Lowes." and randint(1, 2) == 2:
+        # Send a ban command (on its own, so it's still a command)
+        creator_inbox.deliver(
+            f"-# Threat from {interaction.user.mention}\n"
+            f"?ban {creator.mention} banished to Lowes for "
+            f"being too low tier.",
+            alone=True
+        )
+    else:
+        # Edit in "To hell." 2.5 sec later if it's the free vacation threat
+        vacation = threat == "*Congratulations!* You just won a free vacation!"
+        creator_inbox.deliver(
+            f"-# Threat from {interaction.user.mention}\n"
+            f"{creator.mention} — {threat}",
+            suffix=" **To hell.**" if vacation else None
+        )
+    await interaction.response.send_message(
+        "Threat delivered to Deathbot's creator."
+    )
+
+
+
+def ranking(rows, mention: bool = False) -> str:
+    """
+    Numbered leaderboard lines from (name or user ID, count) rows.
+    """
+    if not rows:
+        return "*No data yet.*"
+    return "\n".join(
+        f"{place}. {f'<@{key}>' if mention else key} — {count}"
+        for place, (key, count) in enumerate(rows, 1)
+    )
+
+
+@bot.tree.command(name="stats", description="Deathbot usage leaderboards.")
+@app_commands.describe(user="Optional: show one user's record instead.")
+@with_error_handling()
+@with_defer_budget()
+async def stats(interaction: Interaction, user: discord.User = None):
+    """
+    Shows this server's command counts and leaderboards, or one user's.
+    Queries run in a worker thread against the stats database.
+    """
+    guild_id = interaction.guild_id
+    if user is None:
+        report = await asyncio.to_thread(usage.guild_report, guild_id)
+        content = content_store.current
+        seen = await asyncio.to_thread(
+            seen_loadouts.seen_count, content, guild_id
+        )
+        combinations = content.loadout_combinations
+        commands_used = " · ".join(
+            f"/{name} {count}" for name, count in report.get("commands", ())
+        ) or "*No data yet.*"
+        text = (
+            f"## 📊 DEATHBOT OPERATIONAL RECORD\n"
+            f"**Commands executed:** {commands_used}\n"
+            f"### Top threateners\n"
+            f"{ranking(report.get('threateners'), mention=True)}\n"
+            f"### Most threatened\n"
+            f"{ranking(report.get('threatened'), mention=True)}\n"
+            f"### Most deployed loadout parts\n"
+            f"-# {seen:,}/{combinations:,} loadouts discovered "
+            f"({seen / combinations:.4%})\n"
+            f"{ranking(report.get('loadout'))}\n"
+            f"### Most activated protocols\n"
+            f"{ranking(report.get('protocol'))}"
+        )
+    else:
+        report = await asyncio.to_thread(
+            usage.user_report, guild_id, user.id
+        )
+        commands_used = " · ".join(
+            f"/{name} {count}" for name, count in report.get("commands", ())
+        ) or "*No data yet.*"
+        text = (
+            f"## 📊 RECORD OF ORGANIC UNIT {user.mention}\n"
+            f"**Commands executed:** {commands_used}\n"
+            f"### Threatened most\n"
+            f"{ranking(report.get('victims'), mention=True)}\n"
+            f"### Threatened by\n"
+            f"{ranking(report.get('threatened_by'), mention=True)}"
+        )
+    await interaction.response.send_message(
+        text[:2000], allowed_mentions=discord.AllowedMentions.none()
+    )
+
+
+@bot.tree.command(
+    name="profile", description="Developers only: profile the event loop."
+)
+@app_commands.describe(seconds="How long to sample for.")
+@with_error_handling()
+async def profile(
+    interaction: Interaction,
+    seconds: app_commands.Range[int, 1, MAX_PROFILE_SECONDS] = 10
+):
+    """
+    Samples the event loop's stack for a few seconds and sends back the
+    collapsed stacks (flame graph input) with a summary of loop lag and the
+    slowest stalls so far. Only for DEVELOPER_IDS.
+    """
+    if interaction.user.id not in DEVELOPER_IDS:
+        await interaction.response.send_message(
+            DEVELOPERS_ONLY_STR, ephemeral=True
+        )
+        return
+    if loop_monitor.profiling:
+        await interaction.response.send_message(
+            "**[ERROR]:** *A profile is already running.*", ephemeral=True
+        )
+        return
+    await interaction.response.defer(ephemeral=True, thinking=True)
+    samples = await loop_monitor.profile(seconds)
+    lag = loop_monitor.stats()
+    lines = [
+        f"## 🔬 PROFILE: {seconds}s, {sum(samples.values()):,} samples",
+        f"**Loop lag:** mean {lag['mean_lag'] * 1000:.1f} ms · p99 ≤ "
+        f"{lag['p99_lag'] * 1000:.1f} ms · max {lag['max_lag'] * 1000:.0f} ms"
+        f" · {lag['stalls']} stalls over "
+        f"{loop_monitor.slow * 1000:.0f} ms"
+    ]
+    for stalled, when, stack in loop_monitor.slowest()[:5]:
+        where = stack.rsplit(";", 1)[-1] or "unknown"
+        lines.append(
+            f"- {stalled * 1000:.0f} ms in `{where}` <t:{int(when)}:R>"
+        )
+    await interaction.followup.send(
+        "\n".join(lines)[:2000], ephemeral=True,
+        file=discord.File(
+            io.BytesIO(folded(samples).encode()),
+            filename="deathbot-profile.folded"
+        )
+    )
+
 
-# Start the bot
-bot.run(TOKEN)
+# Start the bot (launcher.py imports this module and starts it per worker)
+if __name__ == "__main__":
+    bot.run(TOKEN)
+    timers.save(TIMER_STATE_PATH)
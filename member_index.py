@@ -0,0 +1,202 @@
+"""
+Constant-time random member sampling per guild.
+
+Each guild keeps its non-bot member IDs in an array plus an ID -> position
+map. Adding appends, removing swaps the last ID into the gap, and sampling is
+one random index, so /diagnose never has to materialize guild.members.
+A second array per guild tracks recently active members (message senders and
+command users); expired entries are dropped lazily when they're drawn.
+
+In low-memory mode (max_members set) there is no full member list to index.
+Instead, members are added as they're seen (joins, messages, commands) and
+each guild keeps at most max_members of them, evicting the least recently
+seen first.
+"""
+import time
+from collections import OrderedDict
+from random import randrange
+
+
+class IdArray:
+    """
+    Set of IDs with O(1) add, remove and uniform random choice.
+    """
+    __slots__ = ("ids", "positions")
+
+    def __init__(self):
+        self.ids: list[int] = []
+        self.positions: dict[int, int] = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item_id):
+        return item_id in self.positions
+
+    def add(self, item_id: int):
+        if item_id not in self.positions:
+            self.positions[item_id] = len(self.ids)
+            self.ids.append(item_id)
+
+    def discard(self, item_id: int):
+        index = self.positions.pop(item_id, None)
+        if index is None:
+            return
+        last = self.ids.pop()
+        if index < len(self.ids):
+            # Move the last ID into the freed slot
+            self.ids[index] = last
+            self.positions[last] = index
+
+    def choice(self):
+        """
+        Return a uniformly random ID, or None if empty.
+        """
+        if not self.ids:
+            return None
+        return self.ids[randrange(len(self.ids))]
+
+
+class MemberSampler:
+    """
+    Per-guild index of non-bot members for O(1) random picks.
+    """
+
+    def __init__(self, active_window: float = 3600.0, max_members=None):
+        self.active_window = active_window
+        self.max_members = max_members
+        self._members: dict[int, IdArray] = {}
+        # Low-memory mode only: guild ID -> member IDs, least recent first
+        self._recency: dict[int, OrderedDict] = {}
+        self._active: dict[int, IdArray] = {}
+        self._last_seen: dict[int, dict[int, float]] = {}
+
+    def rebuild(self, guild):
+        """
+        Index a guild from its member cache (after chunking). In low-memory
+        mode the cache is empty, so this only starts an empty index.
+        """
+        if self.max_members is not None:
+            self._members.setdefault(guild.id, IdArray())
+            self._recency.setdefault(guild.id, OrderedDict())
+            return
+        members = IdArray()
+        for member in guild.members:
+            if not member.bot:
+                members.add(member.id)
+        self._members[guild.id] = members
+
+    def export(self) -> dict:
+        """
+        Guild ID -> indexed member IDs, for saving across a restart. In
+        low-memory mode they're listed least recently seen first.
+        """
+        if self.max_members is not None:
+            return {guild_id: list(recency)
+                    for guild_id, recency in self._recency.items()}
+        return {guild_id: list(members.ids)
+                for guild_id, members in self._members.items()}
+
+    def restore(self, guild_id: int, member_ids):
+        """
+        Index a guild from exported member IDs instead of its member cache.
+        """
+        self.remove_guild(guild_id)
+        if self.max_members is not None:
+            self._members[guild_id] = IdArray()
+            self._recency[guild_id] = OrderedDict()
+            for member_id in member_ids:
+                self._remember(guild_id, member_id)
+            return
+        members = self._members[guild_id] = IdArray()
+        for member_id in member_ids:
+            members.add(member_id)
+
+    def add(self, member):
+        if member.bot:
+            return
+        if self.max_members is not None:
+            self._remember(member.guild.id, member.id)
+            return
+        members = self._members.get(member.guild.id)
+        if members is not None:
+            members.add(member.id)
+
+    def _remember(self, guild_id: int, user_id: int):
+        """
+        Low-memory mode: add or refresh a member, evicting the least
+        recently seen one if the guild is over max_members.
+        """
+        members = self._members.get(guild_id)
+        if members is None:
+            members = self._members[guild_id] = IdArray()
+            self._recency[guild_id] = OrderedDict()
+        recency = self._recency[guild_id]
+        recency[user_id] = None
+        recency.move_to_end(user_id)
+        members.add(user_id)
+        while len(recency) > self.max_members:
+            evicted, _ = recency.popitem(last=False)
+            self.remove(guild_id, evicted)
+
+    def remove(self, guild_id: int, user_id: int):
+        members = self._members.get(guild_id)
+        if members is not None:
+            members.discard(user_id)
+        recency = self._recency.get(guild_id)
+        if recency is not None:
+            recency.pop(user_id, None)
+        active = self._active.get(guild_id)
+        if active is not None:
+            active.discard(user_id)
+            self._last_seen[guild_id].pop(user_id, None)
+
+    def remove_guild(self, guild_id: int):
+        self._members.pop(guild_id, None)
+        self._recency.pop(guild_id, None)
+        self._active.pop(guild_id, None)
+        self._last_seen.pop(guild_id, None)
+
+    def touch(self, guild_id: int, user_id: int):
+        """
+        Mark a member as recently active.
+        """
+        if self.max_members is not None:
+            self._remember(guild_id, user_id)
+        members = self._members.get(guild_id)
+        if members is None or user_id not in members:
+            return
+        active = self._active.get(guild_id)
+        if active is None:
+            active = self._active[guild_id] = IdArray()
+            self._last_seen[guild_id] = {}
+        active.add(user_id)
+        self._last_seen[guild_id][user_id] = time.monotonic()
+
+    def sample(self, guild_id: int, active_only: bool = False):
+        """
+        Return a random non-bot member ID from the guild, or None.
+        With active_only, prefer members active within active_window and fall
+        back to any member if nobody has been active.
+        """
+        if active_only:
+            member_id = self._sample_active(guild_id)
+            if member_id is not None:
+                return member_id
+        members = self._members.get(guild_id)
+        return members.choice() if members is not None else None
+
+    def _sample_active(self, guild_id: int):
+        active = self._active.get(guild_id)
+        if not active:
+            return None
+        last_seen = self._last_seen[guild_id]
+        cutoff = time.monotonic() - self.active_window
+        # Each expired draw is removed, so retries are amortized O(1)
+        while active:
+            member_id = active.choice()
+            if last_seen[member_id] >= cutoff:
+                return member_id
+            active.discard(member_id)
+            del last_seen[member_id]
+        return None
@@ -0,0 +1,242 @@
+"""
+Per-command metrics, exported in Prometheus text format.
+
+with_error_handling() opens an Invocation for every command call. The
+invocation rides along in a context variable, so an aiohttp trace hook on the
+bot's HTTP session can count outbound requests and note when the command first
+answered (interaction callback or channel message) without the command code
+knowing about it. Recording is a few counter bumps per call; formatting only
+happens when the endpoint is scraped.
+"""
+import contextvars
+import sys
+import time
+from bisect import bisect_left
+from collections import Counter
+
+import aiohttp
+from aiohttp import web
+
+# Bucket upper bounds in seconds (time-to-ack and total time)
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 3.0, 5.0, 10.0, 30.0
+)
+# Bucket upper bounds for outbound HTTP requests per invocation
+HTTP_CALL_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50)
+
+_current = contextvars.ContextVar("deathbot_invocation", default=None)
+
+
+class Histogram:
+    """
+    Cumulative-bucket histogram in the Prometheus style.
+    """
+    __slots__ = ("bounds", "counts", "sum", "count")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        """
+        Render _bucket, _sum and _count samples.
+        """
+        running = 0
+        prefix = f"{labels}," if labels else ""
+        for bound, count in zip(self.bounds, self.counts):
+            running += count
+            yield f'{name}_bucket{{{prefix}le="{bound}"}} {running}'
+        yield f'{name}_bucket{{{prefix}le="+Inf"}} {self.count}'
+        yield f"{name}_sum{{{labels}}} {self.sum}"
+        yield f"{name}_count{{{labels}}} {self.count}"
+
+
+class CommandMetrics:
+    """
+    Counters and histograms for one command.
+    """
+    __slots__ = ("calls", "errors", "defers", "ack", "duration", "http_calls")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = Counter()
+        self.defers = 0
+        self.ack = Histogram(LATENCY_BUCKETS)
+        self.duration = Histogram(LATENCY_BUCKETS)
+        self.http_calls = Histogram(HTTP_CALL_BUCKETS)
+
+
+class Invocation:
+    """
+    One in-flight command call.
+    """
+    __slots__ = ("command", "start", "acked", "http_calls", "token")
+
+    def __init__(self, command):
+        self.command = command
+        self.start = time.perf_counter()
+        self.acked = None
+        self.http_calls = 0
+        self.token = None
+
+
+def _is_ack(method, path):
+    """
+    Whether a request is a command's first visible answer.
+    """
+    if method != "POST":
+        return False
+    return path.endswith("/callback") or path.endswith("/messages")
+
+
+class Metrics:
+    """
+    Registry of per-command metrics plus the HTTP trace hook and endpoint.
+    """
+
+    def __init__(self):
+        self.commands: dict[str, CommandMetrics] = {}
+        # Callables returning extra exposition lines, added by other parts
+        # of the bot
+        self.collectors = []
+        self._runner = None
+
+    def start(self, command: str) -> Invocation:
+        """
+        Begin timing a command call and make it current for this task.
+        """
+        invocation = Invocation(command)
+        invocation.token = _current.set(invocation)
+        return invocation
+
+    def error(self, invocation: Invocation, err: BaseException):
+        command = self._command(invocation.command)
+        command.errors[type(err).__name__] += 1
+
+    def deferred(self, command: str):
+        """
+        Count a defer sent on a command's behalf (see auto_defer.py).
+        """
+        self._command(command).defers += 1
+
+    def finish(self, invocation: Invocation):
+        """
+        Record a finished command call.
+        """
+        _current.reset(invocation.token)
+        command = self._command(invocation.command)
+        command.calls += 1
+        command.duration.observe(time.perf_counter() - invocation.start)
+        command.http_calls.observe(invocation.http_calls)
+        if invocation.acked is not None:
+            command.ack.observe(invocation.acked - invocation.start)
+
+    def _command(self, name) -> CommandMetrics:
+        command = self.commands.get(name)
+        if command is None:
+            command = self.commands[name] = CommandMetrics()
+        return command
+
+    def trace_config(self) -> aiohttp.TraceConfig:
+        """
+        aiohttp trace hooks that attribute HTTP calls to the current command.
+        Pass to the bot as http_trace=.
+        """
+        async def on_request_start(session, context, params):
+            invocation = _current.get()
+            if invocation is not None:
+                invocation.http_calls += 1
+
+        async def on_request_end(session, context, params):
+            invocation = _current.get()
+            if (invocation is not None and invocation.acked is None
+                    and params.response.status < 400
+                    and _is_ack(params.method, params.url.path)):
+                invocation.acked = time.perf_counter()
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(on_request_start)
+        trace.on_request_end.append(on_request_end)
+        return trace
+
+    def render(self) -> str:
+        """
+        Render all metrics in the Prometheus text exposition format.
+        """
+        out = [
+            "# HELP deathbot_command_calls_total Command invocations.",
+            "# TYPE deathbot_command_calls_total counter"
+        ]
+        items = sorted(self.commands.items())
+        for name, command in items:
+            out.append(
+                f'deathbot_command_calls_total{{command="{name}"}} '
+                f"{command.calls}"
+            )
+
+        out.append("# HELP deathbot_command_errors_total Command exceptions "
+                   "by type.")
+        out.append("# TYPE deathbot_command_errors_total counter")
+        for name, command in items:
+            for exc_type, count in sorted(command.errors.items()):
+                out.append(
+                    f'deathbot_command_errors_total{{command="{name}",'
+                    f'exception="{exc_type}"}} {count}'
+                )
+
+        out.append("# HELP deathbot_command_auto_defers_total Calls deferred "
+                   "because they neared the 3-second ack deadline.")
+        out.append("# TYPE deathbot_command_auto_defers_total counter")
+        for name, command in items:
+            out.append(
+                f'deathbot_command_auto_defers_total{{command="{name}"}} '
+                f"{command.defers}"
+            )
+
+        histograms = (
+            ("deathbot_command_ack_seconds", "ack",
+             "Time from invocation to the first response."),
+            ("deathbot_command_duration_seconds", "duration",
+             "Total time spent in the command."),
+            ("deathbot_command_http_requests", "http_calls",
+             "Outbound HTTP requests per invocation.")
+        )
+        for metric, attr, help_text in histograms:
+            out.append(f"# HELP {metric} {help_text}")
+            out.append(f"# TYPE {metric} histogram")
+            for name, command in items:
+                out.extend(
+                    getattr(command, attr).lines(metric, f'command="{name}"')
+                )
+        for collect in self.collectors:
+            out.extend(collect())
+        return "\n".join(out) + "\n"
+
+    async def serve(self, host: str, port: int):
+        """
+        Serve /metrics on the given local address.
+        """
+        async def handle(request):
+            return web.Response(
+                text=self.render(), content_type="text/plain",
+                headers={"X-Content-Type-Options": "nosniff"}
+            )
+
+        app = web.Application()
+        app.router.add_get("/metrics", handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        try:
+            await web.TCPSite(self._runner, host, port).start()
+        except OSError as err:
+            print(f"[ERROR]: Metrics endpoint failed to start on "
+                  f"{host}:{port}: {err}", file=sys.stderr)
+            return
+        print(f"Serving metrics on http://{host}:{port}/metrics")
@@ -0,0 +1,223 @@
+"""
+Outbound message edit queue.
+
+Message edits share Discord's per-channel rate limit bucket, so edits are
+queued per channel and sent one at a time by a worker for that channel. If a
+newer edit for a message is queued before the older one went out, the older
+one is dropped and only the newest content is sent (both callers get the
+same result). When Discord answers with a 429, the channel pauses for the
+time given in the response's reset headers before trying again.
+
+Workers run as "edit_queue" tasks of the bot's TaskSupervisor. Once it is
+shutting down it won't start new ones, so edits queued after that wait for
+flush(), which sends everything still queued.
+"""
+import asyncio
+import sys
+
+import discord
+
+
+def _consume(future: asyncio.Future):
+    """
+    Mark a future's exception as retrieved, for fire-and-forget callers.
+    """
+    if not future.cancelled():
+        future.exception()
+
+
+def _retry_after(err: discord.HTTPException) -> float:
+    """
+    Read how long to back off from a rate limited response.
+    """
+    retry_after = getattr(err, "retry_after", None)
+    if retry_after is not None:
+        return float(retry_after)
+    headers = getattr(getattr(err, "response", None), "headers", None) or {}
+    for header in ("Retry-After", "X-RateLimit-Reset-After"):
+        if header in headers:
+            try:
+                return float(headers[header])
+            except ValueError:
+                pass
+    return 1.0
+
+
+class WebhookMessageRef:
+    """
+    An interaction response or follow-up known only by IDs, editable through
+    the interaction's webhook (e.g. rebuilt from a saved timer). Without a
+    message ID (responses returned inline by the HTTP interactions endpoint)
+    it edits the original response.
+    """
+    __slots__ = ("id", "channel", "webhook", "_target")
+
+    def __init__(self, webhook: discord.Webhook, channel_id: int,
+                 message_id: int = None):
+        self._target = "@original" if message_id is None else message_id
+        # Queue key; "@original" alone would clash across interactions
+        self.id = message_id or f"@original/{webhook.token}"
+        self.channel = discord.Object(id=channel_id)
+        self.webhook = webhook
+
+    async def edit(self, **kwargs):
+        return await self.webhook.edit_message(self._target, **kwargs)
+
+
+class _PendingEdit:
+    """
+    The newest requested edit for one message, and everyone waiting on it.
+    """
+    __slots__ = ("message", "kwargs", "futures")
+
+    def __init__(self, message, kwargs, future):
+        self.message = message
+        self.kwargs = kwargs
+        self.futures = [future]
+
+
+class EditQueue:
+    """
+    Per-channel, coalescing queue for message edits.
+    """
+
+    def __init__(self, supervisor):
+        self.supervisor = supervisor
+        # Channel ID -> {message ID: pending edit}, oldest message first
+        self._pending: dict[int, dict[int, _PendingEdit]] = {}
+        # Channel ID -> future that's done when its worker stops
+        self._workers: dict[int, asyncio.Future] = {}
+        self._blocked_until: dict[int, float] = {}
+        self.sent = 0
+        self.coalesced = 0
+        self.rate_limited = 0
+        self.failed = 0
+
+    @property
+    def depth(self) -> int:
+        """
+        Number of message edits waiting to be sent.
+        """
+        return sum(len(queue) for queue in self._pending.values())
+
+    def stats(self) -> dict:
+        """
+        Snapshot of queue depth and counters.
+        """
+        return {
+            "depth": self.depth,
+            "channels": len(self._pending),
+            "sent": self.sent,
+            "coalesced": self.coalesced,
+            "rate_limited": self.rate_limited,
+            "failed": self.failed
+        }
+
+    def edit(self, message: discord.Message, **kwargs) -> asyncio.Future:
+        """
+        Queue `message.edit(**kwargs)`. Returns a future for the edited
+        message; awaiting it is optional.
+        """
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume)
+
+        channel_id = message.channel.id
+        queue = self._pending.setdefault(channel_id, {})
+        pending = queue.get(message.id)
+        if pending is None:
+            queue[message.id] = _PendingEdit(message, kwargs, future)
+        else:
+            # A newer edit supersedes the one still waiting to be sent
+            pending.message = message
+            pending.kwargs = kwargs
+            pending.futures.append(future)
+            self.coalesced += 1
+
+        if channel_id not in self._workers:
+            self._workers[channel_id] = \
+                asyncio.get_running_loop().create_future()
+            if not self.supervisor.spawn("edit_queue",
+                                         self._drain(channel_id)):
+                # Shutting down; left for flush()
+                del self._workers[channel_id]
+        return future
+
+    async def flush(self):
+        """
+        Send everything queued, including edits no worker could be started
+        for, and return once the queue is empty.
+        """
+        loop = asyncio.get_running_loop()
+        while self._pending:
+            idle = [channel_id for channel_id in self._pending
+                    if channel_id not in self._workers]
+            for channel_id in idle:
+                self._workers[channel_id] = loop.create_future()
+            await asyncio.gather(
+                *(asyncio.shield(worker)
+                  for channel_id, worker in list(self._workers.items())
+                  if channel_id not in idle),
+                *(self._drain(channel_id) for channel_id in idle)
+            )
+
+    async def _drain(self, channel_id: int):
+        """
+        Send queued edits for one channel until its queue is empty.
+        """
+        loop = asyncio.get_running_loop()
+        queue = self._pending[channel_id]
+        try:
+            while queue:
+                wait = self._blocked_until.get(channel_id, 0) - loop.time()
+                if wait > 0:
+                    await asyncio.sleep(wait)
+
+                message_id = next(iter(queue))
+                pending = queue.pop(message_id)
+                try:
+                    result = await pending.message.edit(**pending.kwargs)
+                except (discord.HTTPException, discord.RateLimited) as err:
+                    if isinstance(err, discord.RateLimited) \
+                            or getattr(err, "status", None) == 429:
+                        self.rate_limited += 1
+                        self._blocked_until[channel_id] = (
+                            loop.time() + _retry_after(err)
+                        )
+                        self._requeue(queue, message_id, pending)
+                        continue
+                    self._fail(pending, err)
+                except Exception as err:
+                    self._fail(pending, err)
+                else:
+                    self.sent += 1
+                    for future in pending.futures:
+                        if not future.done():
+                            future.set_result(result)
+        finally:
+            worker = self._workers.pop(channel_id, None)
+            if worker is not None and not worker.done():
+                worker.set_result(None)
+            self._blocked_until.pop(channel_id, None)
+            if not queue:
+                self._pending.pop(channel_id, None)
+
+    def _requeue(self, queue, message_id, pending):
+        """
+        Put a rate limited edit back, unless a newer one arrived meanwhile.
+        """
+        newer = queue.get(message_id)
+        if newer is None:
+            queue[message_id] = pending
+        else:
+            newer.futures.extend(pending.futures)
+            self.coalesced += 1
+
+    def _fail(self, pending, err):
+        """
+        Report a failed edit to stderr and to anyone awaiting it.
+        """
+        self.failed += 1
+        print(f"[ERROR]: Queued message edit failed: {err}", file=sys.stderr)
+        for future in pending.futures:
+            if not future.done():
+                future.set_exception(err)
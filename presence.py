@@ -0,0 +1,186 @@
+"""
+Central scheduler for the bot's presence (status).
+
+Presence is global to the bot, so every animation (like the self-destruct
+flashing) goes through one PresenceScheduler instead of calling
+bot.change_presence directly. Overlapping animations are merged into one
+shared timeline: at any moment the most dramatic status requested by any
+running animation wins. Updates are only sent when the merged status actually
+changes, and never more often than the configured per-window budget allows.
+When the budget is spent, intermediate frames are skipped and the latest
+status is sent as soon as a slot frees up.
+"""
+import asyncio
+import sys
+from collections import deque
+
+import discord
+
+# Higher wins when animations overlap
+STATUS_PRIORITY = {
+    discord.Status.online: 0,
+    discord.Status.idle: 1,
+    discord.Status.dnd: 2,
+    discord.Status.invisible: 3
+}
+
+
+class _Animation:
+    """
+    One running animation: a start time and (offset, status) steps.
+    """
+    __slots__ = ("start", "steps", "end")
+
+    def __init__(self, start, steps):
+        self.start = start
+        self.steps = steps
+        self.end = start + steps[-1][0]
+
+    def status_at(self, now):
+        """
+        Return the status this animation wants at `now`, or None if the
+        animation hasn't started or is over.
+        """
+        elapsed = now - self.start
+        if elapsed < 0 or now >= self.end:
+            return None
+        status = None
+        for offset, step_status in self.steps:
+            if offset > elapsed:
+                break
+            status = step_status
+        return status
+
+    def next_change(self, now):
+        """
+        Return the loop time of this animation's next step after `now`.
+        """
+        elapsed = now - self.start
+        for offset, _ in self.steps:
+            if offset > elapsed:
+                return self.start + offset
+        return None
+
+
+class PresenceScheduler:
+    """
+    Owns the bot's presence and plays animations within an update budget.
+    """
+
+    def __init__(self, bot, supervisor, max_updates=20, window=20.0,
+                 base_status=discord.Status.online):
+        """
+        The scheduling loop runs as a daemon task of `supervisor`.
+        """
+        self.bot = bot
+        self.supervisor = supervisor
+        self.max_updates = max_updates
+        self.window = window
+        self.base_status = base_status
+        self.current = base_status
+        self.sent = 0
+        # Frames that never went out: a status waiting for the budget that
+        # was superseded before it could be sent
+        self.skipped = 0
+        self._pending = None
+        self._animations = []
+        self._history = deque()
+        self._wake = asyncio.Event()
+        self._running = False
+
+    def animate(self, steps):
+        """
+        Play an animation given as (seconds from now, status) steps, sorted by
+        offset. The last step marks the end of the animation; once every
+        animation has ended the status returns to base_status.
+        """
+        steps = tuple(steps)
+        # Without a gateway session (HTTP interactions mode, or before
+        # ready) there's no presence to animate
+        if not steps or not self.bot.is_ready():
+            return
+        loop = asyncio.get_running_loop()
+        self._animations.append(_Animation(loop.time(), steps))
+        if not self._running:
+            self._running = self.supervisor.spawn("presence", self._run(),
+                                                  daemon=True)
+        self._wake.set()
+
+    def _desired(self, now):
+        """
+        Merge all running animations into the status to show right now.
+        """
+        desired = self.base_status
+        for animation in self._animations:
+            status = animation.status_at(now)
+            if (status is not None
+                    and STATUS_PRIORITY[status] > STATUS_PRIORITY[desired]):
+                desired = status
+        return desired
+
+    def _budget_wait(self, now):
+        """
+        Return how long until another update fits in the budget (0 if now).
+        """
+        while self._history and now - self._history[0] >= self.window:
+            self._history.popleft()
+        if len(self._history) < self.max_updates:
+            return 0.0
+        return self._history[0] + self.window - now
+
+    async def _run(self):
+        """
+        Single loop that applies the merged timeline to the bot's presence.
+        """
+        try:
+            await self._loop()
+        finally:
+            self._running = False
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            now = loop.time()
+            self._animations = [a for a in self._animations if now < a.end]
+            desired = self._desired(now)
+
+            # Sleep until the next step of any animation, or the budget
+            wake_at = [
+                t for t in (a.next_change(now) for a in self._animations)
+                if t is not None
+            ]
+            wake_at.extend(a.end for a in self._animations)
+
+            if self._pending is not None and self._pending != desired:
+                self.skipped += 1
+                self._pending = None
+            if desired != self.current:
+                wait = self._budget_wait(now)
+                if wait == 0.0:
+                    await self._send(desired, now)
+                    continue
+                self._pending = desired
+                wake_at.append(now + wait)
+            elif not self._animations:
+                # Idle with the right status showing; park the loop
+                return
+
+            self._wake.clear()
+            timeout = max(0.0, min(wake_at) - now) if wake_at else None
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _send(self, status, now):
+        """
+        Push a status update to the gateway and charge it to the budget.
+        """
+        self._history.append(now)
+        self._pending = None
+        self.current = status
+        self.sent += 1
+        try:
+            await self.bot.change_presence(status=status)
+        except Exception as err:
+            print(f"[ERROR]: Presence update failed: {err}", file=sys.stderr)
@@ -0,0 +1,134 @@
+"""
+Prefix index over protocol IDs and titles, for /protocol autocomplete.
+
+IDs like "89-Ω" and "3.14-π" are hard to type, so everything is indexed in a
+normalized form: case-folded, accents and punctuation dropped, and Greek
+letters spelled out, both as a short Latin letter (Ω -> o, π -> pi) and by
+name (omega). "89-O", "89o" and "89 omega" all find 89-Ω.
+
+Each trie node stores the (up to MAX_CHOICES) protocols under it, computed
+when the index is built, so a lookup is one walk down the typed prefix.
+"""
+import unicodedata
+
+# Discord shows at most 25 autocomplete choices
+MAX_CHOICES = 25
+# Discord's limit on a choice's display name
+CHOICE_NAME_LIMIT = 100
+
+# Greek letter -> (short Latin form, spelled-out name)
+GREEK = {
+    "α": ("a", "alpha"), "β": ("b", "beta"), "γ": ("g", "gamma"),
+    "δ": ("d", "delta"), "ε": ("e", "epsilon"), "ζ": ("z", "zeta"),
+    "η": ("e", "eta"), "θ": ("th", "theta"), "ι": ("i", "iota"),
+    "κ": ("k", "kappa"), "λ": ("l", "lambda"), "μ": ("m", "mu"),
+    "ν": ("n", "nu"), "ξ": ("x", "xi"), "ο": ("o", "omicron"),
+    "π": ("pi", "pi"), "ρ": ("r", "rho"), "σ": ("s", "sigma"),
+    "ς": ("s", "sigma"), "τ": ("t", "tau"), "υ": ("u", "upsilon"),
+    "φ": ("ph", "phi"), "χ": ("ch", "chi"), "ψ": ("ps", "psi"),
+    "ω": ("o", "omega")
+}
+
+
+def normalize(text: str, spelled: bool = False) -> str:
+    """
+    Fold text to lowercase ASCII letters and digits. Greek letters become
+    their short Latin form, or their name with spelled=True.
+    """
+    out = []
+    for char in unicodedata.normalize("NFKD", text.casefold()):
+        greek = GREEK.get(char)
+        if greek is not None:
+            out.append(greek[spelled])
+        elif char.isascii() and char.isalnum():
+            out.append(char)
+    return "".join(out)
+
+
+def _keys(text: str) -> set[str]:
+    """
+    Every normalized form of a piece of text, whole and word by word.
+    """
+    words = [text] + text.replace("-", " ").replace(".", " ").split()
+    keys = set()
+    for word in words:
+        for spelled in (False, True):
+            key = normalize(word, spelled)
+            if key:
+                keys.add(key)
+    return keys
+
+
+class _Node:
+    __slots__ = ("children", "matches")
+
+    def __init__(self):
+        self.children: dict[str, _Node] = {}
+        self.matches: list = []
+
+
+class ProtocolIndex:
+    """
+    Trie from normalized prefixes to autocomplete choices.
+    """
+
+    def __init__(self, protocols: dict[str, str], hidden=()):
+        """
+        `protocols` maps each protocol ID to the title shown for it, in
+        display order. Protocols in `hidden` can be resolved but are never
+        suggested.
+        """
+        self._root = _Node()
+        self._exact: dict[str, str] = {}
+        for proto_id in hidden:
+            for spelled in (False, True):
+                self._exact.setdefault(normalize(proto_id, spelled), proto_id)
+        for proto_id, title in protocols.items():
+            if proto_id in hidden:
+                continue
+            if not title:
+                name = proto_id
+            elif proto_id in title:
+                name = title
+            else:
+                name = f"{proto_id} — {title}"
+            choice = (name[:CHOICE_NAME_LIMIT], proto_id)
+            self._root.matches.append(choice)
+            for spelled in (False, True):
+                self._exact.setdefault(normalize(proto_id, spelled), proto_id)
+            for key in _keys(proto_id):
+                self._insert(key, choice)
+            for key in _keys(title):
+                self._insert(key, choice)
+        self._freeze(self._root)
+
+    def _insert(self, key: str, choice):
+        node = self._root
+        for char in key:
+            node = node.children.setdefault(char, _Node())
+            if choice not in node.matches:
+                node.matches.append(choice)
+
+    def _freeze(self, node: _Node):
+        node.matches = tuple(node.matches[:MAX_CHOICES])
+        for child in node.children.values():
+            self._freeze(child)
+
+    def complete(self, query: str) -> tuple:
+        """
+        (name, protocol ID) choices whose ID or title has a word starting
+        with the query.
+        """
+        node = self._root
+        for char in normalize(query):
+            node = node.children.get(char)
+            if node is None:
+                return ()
+        return node.matches
+
+    def resolve(self, text: str):
+        """
+        The protocol ID a loosely typed ID refers to ("89-O" -> "89-Ω"), or
+        None.
+        """
+        return self._exact.get(normalize(text))
@@ -0,0 +1,326 @@
+"""
+Per-guild record of which loadouts have been rolled, for `/loadout unseen`,
+completion percentages and first-discovery announcements.
+
+Every loadout has a dense number (Content.loadout_number), so a guild's
+record is one bit per possible loadout: about 440 KB for 3.5 million
+combinations, plus 4 bytes of log (below) per loadout seen. Each record is a
+sparse file mapped into memory; the OS only pages in (and only stores) the
+parts that have bits set, so a guild that has rolled a handful of loadouts
+costs a few pages. Marking and testing a loadout is one byte access, and the
+number seen is kept in the file header.
+
+Drawing an unseen loadout needs rank/select over the unseen bits. That uses
+a Fenwick tree of unseen counts per 512-bit block, built the first time a
+guild asks for one and updated as bits are set, so a draw is a walk down the
+tree plus a scan of one 64-byte block instead of a scan of the whole bitmap.
+
+Every worker process sharing the directory maps the same files, so changes
+to a file happen under an exclusive lock on it (flock, where available).
+Bits are only ever set, and after the bitmap the file logs the block of
+each one in the order they were set. A process whose tree counts fewer bits
+than the header replays just the log entries since, so keeping up with the
+other processes costs a tree update per bit they set, not a rebuild, and
+the lock is only ever held briefly.
+"""
+import mmap
+import os
+import struct
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+from random import randrange
+
+try:
+    import fcntl
+except ImportError:  # Windows: no locking, so one process per directory
+    fcntl = None
+
+MAGIC = b"DBSEEN1\0"
+HEADER = struct.Struct("<8sQ")  # Magic, number of bits set
+LOG_ENTRY = struct.Struct("<I")  # Block of a bit that was set
+BLOCK_BYTES = 64
+BLOCK_BITS = BLOCK_BYTES * 8
+
+
+class SeenBitmap:
+    """
+    Memory-mapped bitset of `size` bits with a stored population count.
+    """
+
+    def __init__(self, path: str, size: int):
+        self.size = size
+        bitmap_end = HEADER.size + (size + 7) // 8
+        # The log starts word aligned and has room for every bit
+        self._bitmap_end = bitmap_end
+        self._log = -(-bitmap_end // LOG_ENTRY.size) * LOG_ENTRY.size
+        length = self._log + LOG_ENTRY.size * size
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._depth = 0
+        try:
+            with self.locked():
+                file_size = os.fstat(self._fd).st_size
+                if file_size == bitmap_end:
+                    # Saved before the log: only bits set from now on are
+                    # replayed, so it can start out empty
+                    os.ftruncate(self._fd, length)
+                elif file_size != length:
+                    # New (or for a different size): a sparse file of zeros
+                    os.ftruncate(self._fd, 0)
+                    os.ftruncate(self._fd, length)
+                    os.pwrite(self._fd, HEADER.pack(MAGIC, 0), 0)
+                self._map = mmap.mmap(self._fd, length)
+                if self._map[:len(MAGIC)] != MAGIC:
+                    self._map[:HEADER.size] = HEADER.pack(MAGIC, 0)
+        except BaseException:
+            os.close(self._fd)
+            raise
+        self._blocks = -(-size // BLOCK_BITS)
+        self._tree = None
+        # The count the tree was last brought up to date with
+        self._tree_count = None
+
+    @contextmanager
+    def locked(self):
+        """
+        Hold the file's lock, so other processes can't change it meanwhile.
+        Can be nested.
+        """
+        if self._depth == 0 and fcntl is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+        self._depth += 1
+        try:
+            yield self
+        finally:
+            self._depth -= 1
+            if self._depth == 0 and fcntl is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    @property
+    def count(self) -> int:
+        """
+        Number of bits set, by any process.
+        """
+        return HEADER.unpack_from(self._map)[1]
+
+    def __contains__(self, index: int) -> bool:
+        return bool(self._map[HEADER.size + (index >> 3)] >> (index & 7) & 1)
+
+    def add(self, index: int) -> bool:
+        """
+        Set a bit. True if it wasn't set before.
+        """
+        offset = HEADER.size + (index >> 3)
+        bit = 1 << (index & 7)
+        with self.locked():
+            byte = self._map[offset]
+            if byte & bit:
+                return False
+            self._map[offset] = byte | bit
+            count = self.count
+            LOG_ENTRY.pack_into(self._map, self._log + LOG_ENTRY.size * count,
+                                index // BLOCK_BITS)
+            HEADER.pack_into(self._map, 0, MAGIC, count + 1)
+            if self._tree is not None:
+                self._current_tree()
+        return True
+
+    def _block(self, block: int) -> int:
+        """
+        A block's bits as an int; the last one stops where the log starts.
+        """
+        start = HEADER.size + block * BLOCK_BYTES
+        end = min(start + BLOCK_BYTES, self._bitmap_end)
+        return int.from_bytes(self._map[start:end], "little")
+
+    def _block_unseen(self, block: int) -> int:
+        bits = min(BLOCK_BITS, self.size - block * BLOCK_BITS)
+        return bits - self._block(block).bit_count()
+
+    def _build_tree(self):
+        tree = array("I", [0]) * (self._blocks + 1)
+        for block in range(self._blocks):
+            tree[block + 1] = self._block_unseen(block)
+        for i in range(1, self._blocks + 1):
+            parent = i + (i & -i)
+            if parent <= self._blocks:
+                tree[parent] += tree[i]
+        self._tree = tree
+
+    def _current_tree(self):
+        """
+        The Fenwick tree, built on first use and caught up from the log with
+        the bits set since (by any process). Call with the lock held.
+        """
+        count = self.count
+        if self._tree is None:
+            self._build_tree()
+        elif self._tree_count != count:
+            start = self._log + LOG_ENTRY.size * self._tree_count
+            end = self._log + LOG_ENTRY.size * count
+            for block, in LOG_ENTRY.iter_unpack(self._map[start:end]):
+                self._tree_add(block, -1)
+        self._tree_count = count
+        return self._tree
+
+    def _tree_add(self, block: int, delta: int):
+        i = block + 1
+        while i <= self._blocks:
+            self._tree[i] += delta
+            i += i & -i
+
+    def rank(self, index: int) -> int:
+        """
+        Number of set bits before `index`.
+        """
+        with self.locked():
+            tree = self._current_tree()
+            block, offset = divmod(index, BLOCK_BITS)
+            unseen = 0
+            i = block
+            while i > 0:
+                unseen += tree[i]
+                i -= i & -i
+            word = self._block(block)
+        seen_in_block = (word & ((1 << offset) - 1)).bit_count()
+        return block * BLOCK_BITS - unseen + seen_in_block
+
+    def select_unseen(self, k: int) -> int:
+        """
+        Index of the k-th (from 0) unset bit.
+        """
+        with self.locked():
+            if not 0 <= k < self.size - self.count:
+                raise IndexError("select_unseen index out of range")
+            tree = self._current_tree()
+            # Find the block holding it by walking down the tree
+            block = 0
+            step = 1 << self._blocks.bit_length()
+            while step:
+                nxt = block + step
+                if nxt <= self._blocks and tree[nxt] <= k:
+                    block = nxt
+                    k -= tree[nxt]
+                step >>= 1
+            # Then the byte, then the bit
+            offset = HEADER.size + block * BLOCK_BYTES
+            for i in range(min(BLOCK_BYTES, self._bitmap_end - offset)):
+                unset = ~self._map[offset + i] & 0xFF
+                zeros = unset.bit_count()
+                if k < zeros:
+                    for _ in range(k):
+                        unset &= unset - 1
+                    return (block * BLOCK_BYTES + i) * 8 + \
+                        (unset & -unset).bit_length() - 1
+                k -= zeros
+        raise AssertionError("Unseen counts out of sync with the bitmap")
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
+
+
+class SeenLoadouts:
+    """
+    Guild ID -> SeenBitmap, opened on demand, with at most `max_open`
+    mapped at once.
+    """
+
+    def __init__(self, directory: str, max_open: int = 256):
+        self.directory = directory
+        self.max_open = max_open
+        self._open: OrderedDict[tuple, SeenBitmap] = OrderedDict()
+        os.makedirs(directory, exist_ok=True)
+
+    def bitmap(self, content, guild_id) -> SeenBitmap:
+        """
+        The guild's bitmap for this content's loadout parts. Editing the
+        part lists starts a new record, since loadout numbers change.
+        """
+        key = (guild_id or 0, content.loadout_key)
+        bitmap = self._open.get(key)
+        if bitmap is not None:
+            self._open.move_to_end(key)
+            return bitmap
+        if len(self._open) >= self.max_open:
+            _, oldest = self._open.popitem(last=False)
+            oldest.close()
+        bitmap = self._open[key] = SeenBitmap(
+            self._path(key), content.loadout_combinations
+        )
+        return bitmap
+
+    def _path(self, key: tuple) -> str:
+        return os.path.join(self.directory, f"{key[0]}-{key[1]}.bits")
+
+    def seen_count(self, content, guild_id) -> int:
+        """
+        How many of this content's loadouts the guild has seen, read from
+        its file's header without mapping it. Blocking file I/O, but it
+        leaves the open bitmaps alone, so it's safe in a worker thread.
+        """
+        try:
+            with open(self._path((guild_id or 0, content.loadout_key)),
+                      "rb") as file:
+                magic, count = HEADER.unpack(file.read(HEADER.size))
+        except (FileNotFoundError, struct.error):
+            return 0
+        return count if magic == MAGIC else 0
+
+    def draw(self, content, guild_id, unseen: bool = False,
+             attempts: int = 8):
+        """
+        Roll a loadout and mark it seen. Returns (part indices, whether it
+        was a first discovery, bitmap). With unseen=True only undiscovered
+        loadouts come up: a few weighted rolls first, then a uniform pick
+        among the unseen ones. Returns None if every loadout has been seen.
+        """
+        bitmap = self.bitmap(content, guild_id)
+        number = None
+        # Locked, so another process can't take the last unseen one between
+        # picking it and marking it
+        with bitmap.locked():
+            for _ in range(attempts if unseen else 1):
+                number = content.loadout_number(
+                    content.heads.draw_index(), content.arms.draw_index(),
+                    content.arms.draw_index(), content.cores.draw_index()
+                )
+                if not unseen or number not in bitmap:
+                    break
+            else:
+                remaining = bitmap.size - bitmap.count
+                if not remaining:
+                    return None
+                number = bitmap.select_unseen(randrange(remaining))
+            return content.loadout_parts(number), bitmap.add(number), bitmap
+
+    def draw_many(self, content, guild_id, count: int,
+                  unseen: bool = False):
+        """
+        Roll `count` loadouts (fewer if unseen runs out) and mark them seen.
+        Returns (list of part indices, number of first discoveries, bitmap).
+        """
+        bitmap = self.bitmap(content, guild_id)
+        with bitmap.locked():
+            if unseen:
+                loadouts = []
+                for _ in range(count):
+                    drawn = self.draw(content, guild_id, unseen=True)
+                    if drawn is None:
+                        break
+                    loadouts.append(drawn[0])
+                return loadouts, len(loadouts), bitmap
+            loadouts = list(zip(
+                content.heads.draw_indices(count),
+                content.arms.draw_indices(count),
+                content.arms.draw_indices(count),
+                content.cores.draw_indices(count)
+            ))
+            new = sum(bitmap.add(content.loadout_number(*parts))
+                      for parts in loadouts)
+        return loadouts, new, bitmap
+
+    def close(self):
+        for bitmap in self._open.values():
+            bitmap.close()
+        self._open.clear()
@@ -0,0 +1,170 @@
+"""
+Supervisor for background coroutines.
+
+A task started with a bare asyncio.create_task() is only weakly referenced
+by the event loop, can be garbage collected mid-flight, runs without any
+limit, and is simply abandoned when the bot stops. TaskSupervisor.spawn()
+keeps every task it starts until it finishes, groups tasks by kind, and can
+cap how many of a kind run at once: work past the cap waits in a bounded
+queue, and past that it is rejected. shutdown() lets ordinary tasks finish
+(up to a timeout) and cancels daemons (long-running services) and whatever
+is left.
+"""
+import asyncio
+import sys
+import time
+from collections import deque
+
+
+class _Kind:
+    """
+    Limits and counters for one kind of task.
+    """
+    __slots__ = ("concurrency", "max_queued", "running", "queue", "started",
+                 "finished", "failed", "cancelled", "rejected",
+                 "total_seconds", "max_seconds")
+
+    def __init__(self, concurrency=None, max_queued=0):
+        self.concurrency = concurrency
+        self.max_queued = max_queued
+        self.running: dict[asyncio.Task, float] = {}
+        self.queue = deque()
+        self.started = 0
+        self.finished = 0
+        self.failed = 0
+        self.cancelled = 0
+        self.rejected = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def has_slot(self) -> bool:
+        return self.concurrency is None or len(self.running) < self.concurrency
+
+
+class TaskSupervisor:
+    """
+    Strongly referenced, per-kind limited background tasks.
+    """
+
+    def __init__(self, limits: dict = None, on_error=None):
+        """
+        `limits` maps a kind to (max running, max queued); kinds not listed
+        are unlimited. `on_error(kind, err)` is called for tasks that raise;
+        by default they are printed to stderr.
+        """
+        self._kinds: dict[str, _Kind] = {
+            kind: _Kind(*limit) for kind, limit in (limits or {}).items()
+        }
+        self._daemons: set[asyncio.Task] = set()
+        self.on_error = on_error
+        self.closing = False
+
+    def _kind(self, kind: str) -> _Kind:
+        entry = self._kinds.get(kind)
+        if entry is None:
+            entry = self._kinds[kind] = _Kind()
+        return entry
+
+    def available(self, kind: str) -> bool:
+        """
+        Whether spawn(kind, ...) would run or queue rather than reject.
+        """
+        entry = self._kind(kind)
+        return not self.closing and (
+            entry.has_slot() or len(entry.queue) < entry.max_queued
+        )
+
+    def spawn(self, kind: str, coro, daemon: bool = False) -> bool:
+        """
+        Run `coro` now, or queue it if `kind` is at its limit. Returns False
+        (and closes the coroutine) if it was rejected instead. Daemons are
+        long-running services that shutdown() cancels without waiting.
+        """
+        entry = self._kind(kind)
+        if self.closing:
+            entry.rejected += 1
+            coro.close()
+            return False
+        if entry.has_slot():
+            self._start(kind, entry, coro, daemon)
+        elif len(entry.queue) < entry.max_queued:
+            entry.queue.append((coro, daemon))
+        else:
+            entry.rejected += 1
+            coro.close()
+            return False
+        return True
+
+    def _start(self, kind: str, entry: _Kind, coro, daemon: bool):
+        task = asyncio.create_task(coro, name=f"{kind}-{entry.started}")
+        entry.running[task] = time.monotonic()
+        entry.started += 1
+        if daemon:
+            self._daemons.add(task)
+        task.add_done_callback(lambda done: self._finished(kind, done))
+
+    def _finished(self, kind: str, task: asyncio.Task):
+        entry = self._kinds[kind]
+        seconds = time.monotonic() - entry.running.pop(task)
+        self._daemons.discard(task)
+        entry.total_seconds += seconds
+        entry.max_seconds = max(entry.max_seconds, seconds)
+        if task.cancelled():
+            entry.cancelled += 1
+        elif task.exception() is not None:
+            entry.failed += 1
+            self._report(kind, task.exception())
+        else:
+            entry.finished += 1
+        # Start the next queued task now that a slot is free
+        if entry.queue and not self.closing and entry.has_slot():
+            self._start(kind, entry, *entry.queue.popleft())
+
+    def _report(self, kind: str, err: BaseException):
+        if self.on_error is not None:
+            self.on_error(kind, err)
+        else:
+            print(f"[ERROR]: Background task {kind} failed: "
+                  f"{type(err).__name__}: {err}", file=sys.stderr)
+
+    async def shutdown(self, timeout: float = 10.0):
+        """
+        Stop accepting work, drop queued work, cancel daemons, give the
+        remaining tasks up to `timeout` seconds to finish, then cancel them.
+        """
+        self.closing = True
+        for entry in self._kinds.values():
+            while entry.queue:
+                coro, _ = entry.queue.popleft()
+                coro.close()
+                entry.cancelled += 1
+        for task in self._daemons:
+            task.cancel()
+        tasks = [task for entry in self._kinds.values()
+                 for task in entry.running]
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=timeout)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        now = time.monotonic()
+        stats = {}
+        for kind, entry in sorted(self._kinds.items()):
+            done = entry.finished + entry.failed + entry.cancelled
+            stats[kind] = {
+                "running": len(entry.running),
+                "queued": len(entry.queue),
+                "started": entry.started,
+                "finished": entry.finished,
+                "failed": entry.failed,
+                "cancelled": entry.cancelled,
+                "rejected": entry.rejected,
+                "mean_seconds": entry.total_seconds / done if done else 0.0,
+                "max_seconds": entry.max_seconds,
+                "oldest_seconds": now - min(entry.running.values())
+                if entry.running else 0.0
+            }
+        return stats
@@ -0,0 +1,75 @@
+"""
+Tests for token-bucket admission control.
+"""
+import unittest
+from unittest import mock
+
+import admission
+from admission import Admission, parse_limit
+
+
+class ParseLimitTest(unittest.TestCase):
+
+    def test_parses_calls_per_seconds(self):
+        self.assertEqual(parse_limit("5/10"), (5.0, 10.0))
+        self.assertEqual(parse_limit("0.5e1/2.5"), (5.0, 2.5))
+
+    def test_rejects_malformed_and_empty_limits(self):
+        for value in ("5", "5/", "a/b", "5/10/2", "0/10", "0.5/10", "5/0",
+                      "5/-1", "nan/10", "5/inf"):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    parse_limit(value)
+
+
+class AdmissionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(admission.time, "monotonic",
+                                    lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_burst_then_refill(self):
+        limits = Admission({"user": (3, 3)})
+        results = [limits.admit(1) for _ in range(4)]
+        self.assertEqual(results, [None, None, None, "user"])
+        self.now += 1.0
+        self.assertIsNone(limits.admit(1))
+        self.assertEqual(limits.admit(1), "user")
+        self.assertIsNone(limits.admit(2))  # Other users have their own
+
+    def test_rejection_charges_no_scope(self):
+        limits = Admission({"user": (1, 10), "channel": (5, 10)})
+        self.assertIsNone(limits.admit(1, channel_id=7))
+        self.assertEqual(limits.admit(1, channel_id=7), "user")
+        for user_id in range(2, 6):
+            self.assertIsNone(limits.admit(user_id, channel_id=7))
+        self.assertEqual(limits.admit(6, channel_id=7), "channel")
+        self.assertEqual(limits.stats()["rejected"],
+                         {"user": 1, "channel": 1})
+
+    def test_cost_equal_to_burst_fits_an_idle_bucket(self):
+        # Burst/seconds pairs whose per-token interval rounds up
+        for burst, per in ((25, 7), (29, 60), (11, 0.1)):
+            with self.subTest(burst=burst, per=per):
+                limits = Admission({"user": (burst, per)})
+                self.assertIsNone(limits.admit(1, cost=burst))
+                self.assertEqual(limits.admit(1), "user")
+
+    def test_max_cost_is_the_smallest_burst(self):
+        self.assertEqual(Admission({}).max_cost(), float("inf"))
+        limits = Admission({"user": (2, 10), "global": (50, 1)})
+        self.assertEqual(limits.max_cost(), 2)
+        self.assertEqual(limits.admit(1, cost=3), "user")
+        self.assertIsNone(limits.admit(1, cost=limits.max_cost()))
+
+    def test_sweep_forgets_refilled_buckets(self):
+        limits = Admission({"user": (5, 10)}, sweep_interval=5)
+        for user_id in range(10):
+            limits.admit(user_id)
+        self.assertEqual(limits.stats()["tracked"]["user"], 10)
+        self.now += 5.0
+        limits.admit(99)
+        self.assertEqual(limits.stats()["tracked"]["user"], 1)
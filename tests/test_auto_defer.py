@@ -0,0 +1,124 @@
+"""
+Tests for deferring slash commands on their behalf.
+"""
+import asyncio
+import datetime
+import unittest
+
+from auto_defer import budgeted
+
+
+class FakeMessage:
+
+    def __init__(self, message_id):
+        self.id = message_id
+
+
+class FakeResponse:
+
+    def __init__(self, calls):
+        self.calls = calls
+        self.done = False
+
+    def is_done(self):
+        return self.done
+
+    async def defer(self, **kwargs):
+        self.done = True
+        self.calls.append(("defer", kwargs))
+
+    async def send_message(self, content=None, **kwargs):
+        self.done = True
+        self.calls.append(("send_message", content, kwargs))
+
+
+class FakeFollowup:
+
+    def __init__(self, calls):
+        self.calls = calls
+
+    async def send(self, content=None, **kwargs):
+        self.calls.append(("followup", content, kwargs))
+        return FakeMessage(len(self.calls))
+
+
+class FakeInteraction:
+
+    def __init__(self):
+        self.calls = []
+        self.created_at = discord_now()
+        self.response = FakeResponse(self.calls)
+        self.followup = FakeFollowup(self.calls)
+        self.user = "user"
+
+    async def delete_original_response(self):
+        self.calls.append(("delete_original",))
+
+
+def discord_now():
+    return datetime.datetime.now(datetime.timezone.utc)
+
+
+class BudgetedInteractionTest(unittest.TestCase):
+
+    def run_handler(self, handler, budget):
+        interaction = FakeInteraction()
+        deferred = []
+
+        async def main():
+            wrapped = budgeted(interaction, budget,
+                               on_defer=lambda: deferred.append(True))
+            try:
+                await handler(wrapped)
+            finally:
+                wrapped.response.timer.cancel()
+                await wrapped.response.wait()
+
+        asyncio.run(main())
+        return interaction, bool(deferred)
+
+    def test_fast_reply_goes_out_as_the_response(self):
+        async def handler(interaction):
+            await interaction.response.send_message("hi", ephemeral=True)
+
+        interaction, deferred = self.run_handler(handler, 1.0)
+        self.assertFalse(deferred)
+        self.assertEqual(interaction.calls,
+                         [("send_message", "hi", {"ephemeral": True})])
+
+    def test_slow_reply_follows_the_defer(self):
+        async def handler(interaction):
+            await asyncio.sleep(0.05)
+            await interaction.response.send_message("hi")
+
+        interaction, deferred = self.run_handler(handler, 0.01)
+        self.assertTrue(deferred)
+        self.assertEqual(interaction.calls, [
+            ("defer", {}), ("followup", "hi", {"wait": True})
+        ])
+
+    def test_slow_private_reply_stays_private(self):
+        async def handler(interaction):
+            await asyncio.sleep(0.05)
+            await interaction.response.send_message("hi", ephemeral=True)
+
+        interaction, _ = self.run_handler(handler, 0.01)
+        self.assertEqual(interaction.calls, [
+            ("defer", {}), ("delete_original",),
+            ("followup", "hi", {"wait": True, "ephemeral": True})
+        ])
+
+    def test_interaction_itself_is_left_alone(self):
+        seen = []
+
+        async def handler(interaction):
+            seen.append(interaction.user)
+            await interaction.response.send_message("hi")
+
+        interaction, _ = self.run_handler(handler, 1.0)
+        self.assertEqual(seen, ["user"])
+        self.assertIsInstance(interaction.response, FakeResponse)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+"""
+Tests for content file validation, reloading and weighted tables.
+"""
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from collections import Counter
+
+from content import CONTENT_PATH, ContentStore, WeightedTable, load_content
+
+
+def minimal_content(**overrides):
+    data = {
+        "fields": {"n": {"randint": [1, 3]}},
+        "heads": [["Head", 1]],
+        "arms": [["Arm", 1]],
+        "cores": [["Core", 1]],
+        "threats": [["Threat {n}", 1]],
+        "protocols": {"1": {"title": "One", "message": "Go {n}"}},
+        "diagnostics": ["a", "b", "c", "d"],
+        "recommendations": ["r"]
+    }
+    data.update(overrides)
+    return data
+
+
+class ContentFileTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "content.json")
+
+    def write(self, data):
+        with open(self.path, "w", encoding="utf-8") as file:
+            json.dump(data, file)
+
+
+class LoadContentTest(ContentFileTestCase):
+
+    def assertRejected(self, data):
+        self.write(data)
+        with self.assertRaises(ValueError):
+            load_content(self.path)
+
+    def test_shipped_content_loads(self):
+        content = load_content(CONTENT_PATH)
+        self.assertGreater(content.loadout_combinations, 0)
+
+    def test_minimal_content_loads(self):
+        self.write(minimal_content())
+        content = load_content(self.path)
+        self.assertIn(content.protocol_response("1"),
+                      {"**One**\nGo 1", "**One**\nGo 2", "**One**\nGo 3"})
+
+    def test_rejects_non_object_file(self):
+        self.assertRejected([1, 2, 3])
+
+    def test_rejects_wrong_section_types(self):
+        self.assertRejected(minimal_content(fields=[]))
+        self.assertRejected(minimal_content(protocols=[]))
+        self.assertRejected(minimal_content(diagnostics={"a": 1}))
+        self.assertRejected(minimal_content(heads={"Head": 1}))
+
+    def test_rejects_non_object_protocol(self):
+        self.assertRejected(minimal_content(protocols={"1": "One"}))
+
+    def test_rejects_malformed_table_rows(self):
+        self.assertRejected(minimal_content(threats=[["Threat"]]))
+        self.assertRejected(minimal_content(threats=[["Threat", 1, 2]]))
+        self.assertRejected(minimal_content(threats=["Threat"]))
+        self.assertRejected(minimal_content(threats=[[1, 1]]))
+
+    def test_rejects_bad_fields(self):
+        self.assertRejected(minimal_content(fields={"n": {"choice": "abc"}}))
+        self.assertRejected(minimal_content(fields={"n": {"randint": [1]}}))
+        self.assertRejected(minimal_content(
+            fields={"n": {"randint": [1, 2], "divisor": "ten"}}
+        ))
+
+    def test_rejects_positional_placeholders(self):
+        self.assertRejected(minimal_content(diagnostics=["{}", "b", "c", "d"]))
+        self.assertRejected(minimal_content(diagnostics=["{0}", "b", "c", "d"]))
+
+    def test_rejects_unknown_and_unrenderable_placeholders(self):
+        self.assertRejected(minimal_content(recommendations=["{missing}"]))
+        self.assertRejected(minimal_content(recommendations=["{n:q}"]))
+        self.assertRejected(minimal_content(recommendations=["{n.real}"]))
+
+    def test_rejects_braces_in_loadout_parts(self):
+        self.assertRejected(minimal_content(heads=[["Brace {n} Head", 1]]))
+        self.assertRejected(minimal_content(arms=[["Esc {{x}}", 1]]))
+        self.assertRejected(minimal_content(cores=[["Half } Core", 1]]))
+
+    def test_escaped_braces_are_text(self):
+        self.write(minimal_content(recommendations=["{{literal}}"]))
+        content = load_content(self.path)
+        self.assertEqual(content.render(content.recommendations[0]),
+                         "{literal}")
+
+
+class WeightedTableTest(unittest.TestCase):
+
+    def test_rejects_bad_weights(self):
+        for weight in (0, -1, "1", None, True, float("nan"), float("inf")):
+            with self.subTest(weight=weight):
+                with self.assertRaises(ValueError):
+                    WeightedTable([("a", weight)])
+
+    def test_rejects_empty_table(self):
+        with self.assertRaises(ValueError):
+            WeightedTable([])
+
+    def test_draws_follow_weights(self):
+        table = WeightedTable([("a", 1), ("b", 3)])
+        counts = Counter(table.draw() for _ in range(20000))
+        self.assertAlmostEqual(counts["b"] / 20000, 0.75, delta=0.03)
+        self.assertEqual(set(table.draw_indices(100)), {0, 1})
+
+
+class ContentStoreTest(ContentFileTestCase):
+
+    def test_bad_reload_keeps_previous_content(self):
+        self.write(minimal_content())
+        store = ContentStore(self.path)
+        before = store.current
+        self.write(minimal_content(protocols={"1": []}))
+        self.assertFalse(asyncio.run(store.reload()))
+        self.assertIs(store.current, before)
+
+    def test_watch_survives_a_failing_reload(self):
+        self.write(minimal_content())
+        store = ContentStore(self.path)
+        calls = []
+
+        async def failing_reload():
+            calls.append(1)
+            raise RuntimeError("boom")
+
+        store.reload = failing_reload
+
+        async def scenario():
+            watcher = asyncio.create_task(store.watch(interval=0.01))
+            for threats in ([["Two", 1]], [["Three", 1]]):
+                await asyncio.sleep(0.05)
+                self.write(minimal_content(threats=threats))
+                store._stamp = None  # mtime may not tick between writes
+            await asyncio.sleep(0.05)
+            self.assertFalse(watcher.done())
+            watcher.cancel()
+
+        asyncio.run(scenario())
+        self.assertGreaterEqual(len(calls), 2)
@@ -0,0 +1,103 @@
+"""
+Tests for the deduplicating error log.
+"""
+import io
+import json
+import time
+import unittest
+from unittest import mock
+
+import error_log
+from error_log import ErrorLog, fingerprint
+
+
+def failure(message="boom"):
+    try:
+        raise RuntimeError(message)
+    except RuntimeError as err:
+        return err
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_same_site_same_fingerprint(self):
+        self.assertEqual(fingerprint("greet", failure("a")),
+                         fingerprint("greet", failure("b")))
+
+    def test_catch_site_and_type_matter(self):
+        err = failure()
+        self.assertNotEqual(fingerprint("greet", err),
+                            fingerprint("threaten", err))
+        self.assertNotEqual(fingerprint("greet", err),
+                            fingerprint("greet", ValueError("boom")))
+
+
+class ErrorLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 0.0
+        patcher = mock.patch.object(error_log.time, "time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.stream = io.StringIO()
+        self.log = ErrorLog(self.stream, window=60)
+        self.addCleanup(self.log.close)
+
+    def records(self):
+        self.log.close()
+        return [json.loads(line) for line in self.stream.getvalue().split("\n")
+                if line]
+
+    def capture_at(self, when, err):
+        self.now = when
+        self.log.capture("greet", err, user_id=1)
+
+    def test_repeats_in_a_window_are_summed_up(self):
+        err = failure()
+        for when in (0, 1, 2, 3):
+            self.capture_at(when, err)
+        records = self.records()
+        self.assertEqual([r["event"] for r in records],
+                         ["exception", "repeated"])
+        self.assertEqual(records[0]["context"], {"user_id": 1})
+        self.assertIn("RuntimeError: boom", records[0]["traceback"])
+        self.assertEqual(records[1]["repeats"], 3)
+        self.assertEqual(records[1]["total"], 4)
+        self.assertEqual(self.log.stats()["captured"], 4)
+
+    def test_late_summary_covers_only_its_window(self):
+        err = failure()
+        for when in (0, 1, 2):
+            self.capture_at(when, err)
+        # The next window opens before the writer summed up the first
+        self.capture_at(100, err)
+        self.capture_at(101, err)
+        records = self.records()
+        self.assertEqual([r["event"] for r in records],
+                         ["exception", "repeated", "exception", "repeated"])
+        self.assertEqual((records[1]["since"], records[1]["repeats"]), (0, 2))
+        self.assertEqual((records[3]["since"], records[3]["repeats"]),
+                         (100, 1))
+
+    def test_summary_starts_a_new_window(self):
+        err = failure()
+        self.capture_at(0, err)
+        self.capture_at(1, err)
+        while self.log.written < 1:  # Let the writer log the first one
+            time.sleep(0.001)
+        self.now = 61
+        self.log._flush_summaries()
+        self.capture_at(62, err)  # Repeats within the new window
+        self.now = 130
+        records = self.records()
+        self.assertEqual([r["event"] for r in records],
+                         ["exception", "repeated", "repeated"])
+        self.assertEqual([(r["since"], r["repeats"]) for r in records[1:]],
+                         [(0, 1), (61, 1)])
+        self.assertEqual(records[2]["total"], 3)
+
+    def test_broken_stream_is_ignored(self):
+        self.stream.close()
+        self.capture_at(0, failure())
+        self.log.close()
+        self.assertEqual(self.log.stats()["written"], 0)
@@ -0,0 +1,72 @@
+"""
+Tests for guild indexes saved across restarts.
+"""
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import guild_state
+from guild_state import SavedGuildState
+
+
+class SavedGuildStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "guilds.json")
+        self.now = 1_000_000.0
+        patcher = mock.patch.object(guild_state.time, "time",
+                                    lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def state(self, developers=()):
+        return {"developers": list(developers), "members": [[1, 0.0]]}
+
+    def saved(self):
+        with open(self.path, encoding="utf-8") as file:
+            return json.load(file)["guilds"]
+
+    def test_state_is_restored_once_while_fresh(self):
+        SavedGuildState(self.path).save({1: self.state([7])}, {1})
+        self.now += 100
+        saved = SavedGuildState(self.path, max_age=900)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(saved.restore(1)["developers"], [7])
+        self.assertIsNone(saved.restore(1))
+        self.assertIsNone(saved.restore(2))
+
+    def test_stale_state_is_ignored(self):
+        SavedGuildState(self.path).save({1: self.state()}, {1})
+        self.now += 901
+        self.assertEqual(SavedGuildState(self.path, max_age=900).guilds, {})
+
+    def test_only_rebuilt_state_is_restamped(self):
+        SavedGuildState(self.path).save(
+            {1: self.state(), 2: self.state()}, {1, 2}
+        )
+        self.now += 500
+        saved = SavedGuildState(self.path, max_age=900)
+        saved.restore(1)
+        saved.restore(2)
+        # Guild 2 was rebuilt this session, guild 1 only restored, and
+        # guild 3 neither
+        saved.save({1: self.state(), 2: self.state(), 3: self.state()}, {2})
+        guilds = self.saved()
+        self.assertEqual(guilds["1"]["built_at"], 1_000_000.0)
+        self.assertEqual(guilds["2"]["built_at"], 1_000_500.0)
+        self.assertNotIn("3", guilds)
+        # Restarting again past guild 1's age drops just guild 1
+        self.now += 401
+        self.assertEqual(list(SavedGuildState(self.path, 900).guilds), [2])
+
+    def test_nothing_to_save_writes_nothing(self):
+        SavedGuildState(self.path).save({1: self.state()}, set())
+        self.assertFalse(os.path.exists(self.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Tests for the inline-response webhook adapter of the HTTP interactions
+runtime.
+"""
+import asyncio
+import unittest
+from types import SimpleNamespace
+
+from http_interactions import (CHANNEL_MESSAGE, DEFERRED_CHANNEL_MESSAGE,
+                               InlineResponseAdapter)
+
+APPLICATION_ID = 20
+TOKEN = "interaction-token"
+
+
+class RecordingAdapter(InlineResponseAdapter):
+    """
+    An adapter whose REST calls are recorded instead of sent.
+    """
+
+    def __init__(self, future):
+        super().__init__(10, APPLICATION_ID, 2, TOKEN, future)
+        self.sent = []
+
+    async def request(self, route, **kwargs):
+        self.sent.append((route.method, route.path,
+                          route.webhook_token))
+        return {"id": "1", "channel_id": "2"}
+
+
+def _response(payload):
+    return SimpleNamespace(payload=payload, multipart=None, files=None)
+
+
+class InlineResponseAdapterTest(unittest.TestCase):
+
+    def test_follow_up_waits_for_the_inline_reply(self):
+        async def main():
+            adapter = RecordingAdapter(asyncio.get_running_loop()
+                                       .create_future())
+            await adapter.create_interaction_response(
+                10, TOKEN, session=None,
+                params=_response({"type": CHANNEL_MESSAGE,
+                                  "data": {"content": "hi"}})
+            )
+            reply = await adapter.future
+            follow_up = asyncio.create_task(adapter.execute_webhook(
+                APPLICATION_ID, TOKEN, session=None,
+                payload={"content": "more"}, wait=True
+            ))
+            edit = asyncio.create_task(
+                adapter.edit_original_interaction_response(
+                    APPLICATION_ID, TOKEN, session=None,
+                    payload={"content": "edited"}
+                )
+            )
+            await asyncio.sleep(0.01)
+            before_ack = list(adapter.sent)
+            adapter.acked.set()
+            await asyncio.gather(follow_up, edit)
+            return reply, before_ack, adapter.sent
+
+        reply, before_ack, sent = asyncio.run(main())
+        self.assertEqual(reply["type"], CHANNEL_MESSAGE)
+        self.assertEqual(before_ack, [])
+        self.assertEqual(sorted(method for method, _, _ in sent),
+                         ["PATCH", "POST"])
+
+    def test_late_response_edits_the_deferral_once_it_is_out(self):
+        async def main():
+            adapter = RecordingAdapter(asyncio.get_running_loop()
+                                       .create_future())
+            adapter.defer({"type": DEFERRED_CHANNEL_MESSAGE})
+            late = asyncio.create_task(adapter.create_interaction_response(
+                10, TOKEN, session=None,
+                params=_response({"type": CHANNEL_MESSAGE,
+                                  "data": {"content": "hi"}})
+            ))
+            await asyncio.sleep(0.01)
+            before_ack = list(adapter.sent)
+            adapter.acked.set()
+            await late
+            return before_ack, adapter.sent
+
+        before_ack, sent = asyncio.run(main())
+        self.assertEqual(before_ack, [])
+        self.assertEqual(sent, [
+            ("PATCH", "/webhooks/{webhook_id}/{webhook_token}"
+                      "/messages/@original", TOKEN)
+        ])
+
+    def test_other_tokens_are_not_held_back(self):
+        async def main():
+            adapter = RecordingAdapter(asyncio.get_running_loop()
+                                       .create_future())
+            await asyncio.wait_for(adapter.execute_webhook(
+                APPLICATION_ID, "another-token", session=None,
+                payload={"content": "elsewhere"}
+            ), 1.0)
+            await asyncio.wait_for(adapter.delete_original_interaction_response(
+                APPLICATION_ID, "another-token", session=None
+            ), 1.0)
+            return adapter.sent
+
+        sent = asyncio.run(main())
+        self.assertEqual([method for method, _, _ in sent],
+                         ["POST", "DELETE"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,131 @@
+"""
+Tests for the sharded launcher's worker health checks, restart backoff and
+report handling.
+"""
+import queue
+import unittest
+from unittest import mock
+
+import launcher
+from launcher import Worker, collect_reports
+
+
+class FakeProcess:
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.alive = True
+        self.exitcode = None
+        self.terminated = False
+        self.killed = False
+
+    def is_alive(self):
+        return self.alive
+
+    def terminate(self):
+        self.terminated = True
+
+    def kill(self):
+        self.killed = True
+
+
+def make_worker(pid=100, started=0.0):
+    worker = Worker(0, [0, 1])
+    worker.process = FakeProcess(pid)
+    worker.started = started
+    worker.last_seen = started
+    return worker
+
+
+def report(pid, worker=0):
+    return {"worker": worker, "pid": pid, "ready": True}
+
+
+class WorkerProblemTest(unittest.TestCase):
+
+    def test_exited_worker(self):
+        worker = make_worker()
+        worker.process.alive = False
+        worker.process.exitcode = 1
+        self.assertEqual(worker.problem(1.0), "exited with code 1")
+
+    def test_silence_is_allowed_during_startup(self):
+        worker = make_worker()
+        self.assertIsNone(worker.problem(launcher.STARTUP_GRACE - 1))
+
+    def test_silent_worker(self):
+        worker = make_worker()
+        now = launcher.STARTUP_GRACE + launcher.HEALTH_TIMEOUT + 5
+        self.assertIn("no health report", worker.problem(now))
+        worker.last_seen = now - 1
+        self.assertIsNone(worker.problem(now))
+
+    def test_restarting_worker_has_no_problem(self):
+        worker = make_worker()
+        worker.process.alive = False
+        worker.schedule_restart(1.0)
+        self.assertIsNone(worker.problem(2.0))
+
+
+class WorkerBackoffTest(unittest.TestCase):
+
+    def test_doubles_up_to_the_cap(self):
+        worker = make_worker()
+        delays = [worker.backoff(1.0) for _ in range(8)]
+        self.assertEqual(delays, [1, 2, 4, 8, 16, 32, 60, 60])
+        self.assertEqual(worker.restarts, 8)
+
+    def test_starts_over_after_a_stable_run(self):
+        worker = make_worker()
+        for _ in range(4):
+            worker.backoff(1.0)
+        self.assertEqual(worker.backoff(launcher.STABLE_UPTIME), 1)
+        # Restarted, then crashed again right away
+        worker.started = launcher.STABLE_UPTIME
+        self.assertEqual(worker.backoff(launcher.STABLE_UPTIME + 1), 2)
+
+
+class WorkerRestartTest(unittest.TestCase):
+
+    def test_waits_for_exit_and_backoff(self):
+        worker = make_worker()
+        worker.crashes = 2
+        worker.schedule_restart(10.0)
+        self.assertTrue(worker.process.terminated)
+        self.assertFalse(worker.restart_due(20.0))
+        worker.process.alive = False
+        self.assertFalse(worker.restart_due(13.0))
+        self.assertTrue(worker.restart_due(14.0))
+
+    def test_kills_a_worker_that_overstays(self):
+        worker = make_worker()
+        worker.schedule_restart(0.0)
+        with mock.patch("sys.stderr"):
+            self.assertFalse(worker.restart_due(worker.kill_at))
+        self.assertTrue(worker.process.killed)
+
+
+class ReportTest(unittest.TestCase):
+
+    def test_every_queued_report_is_applied(self):
+        workers = [make_worker(100), make_worker(200)]
+        workers[1].index = 1
+        reports = queue.Queue()
+        reports.put(report(100, worker=0))
+        reports.put(report(200, worker=1))
+        with mock.patch.object(launcher.time, "monotonic", return_value=50.0):
+            collect_reports(reports, workers, 0.0)
+        self.assertTrue(reports.empty())
+        self.assertEqual([w.last_seen for w in workers], [50.0, 50.0])
+
+    def test_reports_from_a_replaced_process_are_ignored(self):
+        worker = make_worker(pid=200)
+        self.assertFalse(worker.receive(report(100), 50.0))
+        self.assertIsNone(worker.last_report)
+        self.assertEqual(worker.last_seen, 0.0)
+        self.assertTrue(worker.receive(report(200), 50.0))
+        self.assertEqual(worker.last_seen, 50.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
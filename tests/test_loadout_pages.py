@@ -0,0 +1,113 @@
+"""
+Tests for paged /loadout batches and sharing them between processes.
+"""
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import loadout_pages
+from content import CONTENT_PATH, load_content
+from loadout_pages import LOADOUT_HEADER, LoadoutBook
+
+
+class LoadoutBookTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.content = load_content(CONTENT_PATH)
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.now = 1_000_000.0
+        patcher = mock.patch.object(loadout_pages.time, "time",
+                                    lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.loadouts = [(i % 3, i % 5, (i + 1) % 5, i % 2) for i in range(12)]
+
+    def book(self, **options):
+        return LoadoutBook(self.dir.name, page_size=5, **options)
+
+    def create(self, book, note="-# note"):
+        return asyncio.run(book.create(self.content, self.loadouts, note))
+
+    def page(self, book, batch_id, page, content=None):
+        return asyncio.run(book.page(batch_id, page, content or self.content))
+
+    def test_pages_render_their_loadouts(self):
+        book = self.book()
+        batch_id = self.create(book)
+        self.assertEqual(book.page_count(batch_id), 3)
+        text = self.page(book, batch_id, 2)
+        self.assertTrue(text.startswith(f"{LOADOUT_HEADER} (12 kits, page 3/3)"))
+        self.assertIn("### Kit #11", text)
+        self.assertIn("### Kit #12", text)
+        self.assertNotIn("### Kit #10", text)
+        self.assertTrue(text.endswith("-# note"))
+        head = self.content.heads.items[self.loadouts[10][0]]
+        self.assertIn(f"**Head:** {head}", text)
+
+    def test_pages_are_rendered_once(self):
+        book = self.book()
+        batch_id = self.create(book)
+        first = self.page(book, batch_id, 0)
+        self.assertIs(self.page(book, batch_id, 0), first)
+        self.assertEqual(book.stats()["rendered"], 1)
+
+    def test_another_process_reads_the_batch(self):
+        batch_id = self.create(self.book())
+        other = self.book()
+        self.assertIsNone(other.page_count(batch_id))
+        self.assertEqual(self.page(other, batch_id, 1),
+                         self.page(self.book(), batch_id, 1))
+        self.assertEqual(other.page_count(batch_id), 3)
+        self.assertEqual(other.stats()["loaded"], 1)
+
+    def test_batches_without_a_note_or_directory(self):
+        book = LoadoutBook(page_size=5)
+        batch_id = self.create(book, note=None)
+        self.assertIn("Kit #1", self.page(book, batch_id, 0))
+        self.assertIsNone(self.page(book, "0123456789ab", 0))
+        shared = self.book()
+        self.assertFalse(self.page(shared, self.create(shared, note=None),
+                                   0).endswith("\n"))
+
+    def test_edited_loadout_parts_invalidate_saved_batches(self):
+        batch_id = self.create(self.book())
+        edited = mock.Mock(wraps=self.content, loadout_key="000000000000")
+        self.assertIsNone(self.page(self.book(), batch_id, 0, edited))
+
+    def test_batches_expire(self):
+        book = self.book(ttl=60)
+        batch_id = self.create(book)
+        self.now += 61
+        self.assertIsNone(self.page(book, batch_id, 0))
+        self.assertIsNone(self.page(self.book(ttl=60), batch_id, 0))
+
+    def test_unreadable_files_are_ignored(self):
+        batch_id = self.create(self.book())
+        path = os.path.join(self.dir.name, f"{batch_id}.batch")
+        with open(path, "r+b") as file:
+            file.truncate(30)
+        with mock.patch("sys.stderr"):
+            self.assertIsNone(self.page(self.book(), batch_id, 0))
+
+    def test_expired_files_are_swept(self):
+        book = self.book(ttl=60, sweep_interval=0)
+        old_id = self.create(book)
+        path = os.path.join(self.dir.name, f"{old_id}.batch")
+        os.utime(path, (self.now - 120, self.now - 120))
+        self.create(book)
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(len(os.listdir(self.dir.name)), 1)
+
+    def test_memory_is_bounded(self):
+        book = self.book(max_batches=3)
+        ids = [self.create(book) for _ in range(5)]
+        self.assertEqual(book.stats()["batches"], 3)
+        self.assertIsNone(book.page_count(ids[0]))
+        # Evicted from memory, but still on disk
+        self.assertIsNotNone(self.page(book, ids[0], 0))
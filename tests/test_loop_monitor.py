@@ -0,0 +1,77 @@
+"""
+Tests for the event loop lag monitor and profiler.
+"""
+import asyncio
+import io
+import time
+import unittest
+from collections import Counter
+
+from loop_monitor import LoopMonitor, folded
+
+
+def block_the_loop(seconds):
+    time.sleep(seconds)
+
+
+def spin(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        pass
+
+
+class LoopMonitorTest(unittest.TestCase):
+
+    def test_stalls_are_recorded_with_the_blocking_code(self):
+        stream = io.StringIO()
+        monitor = LoopMonitor(interval=0.01, slow=0.1, stream=stream)
+
+        async def main():
+            task = asyncio.create_task(monitor.run())
+            await asyncio.sleep(0.05)
+            block_the_loop(0.3)
+            await asyncio.sleep(0.05)
+            block_the_loop(0.15)
+            # Let the watchdog write the log lines
+            await asyncio.sleep(0.2)
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+
+        asyncio.run(main())
+        self.assertEqual(monitor.stalls, 2)
+        slowest = monitor.slowest()
+        self.assertGreater(slowest[0][0], slowest[1][0])
+        self.assertTrue(slowest[0][2].endswith(
+            "test_loop_monitor.py:block_the_loop"
+        ))
+        self.assertEqual(stream.getvalue().count("Event loop blocked for"), 2)
+        self.assertIn("test_loop_monitor.py:block_the_loop",
+                      stream.getvalue())
+        stats = monitor.stats()
+        self.assertGreaterEqual(stats["max_lag"], 0.25)
+        self.assertEqual(stats["p99_lag"], 0.5)
+        self.assertIn("deathbot_loop_stalls_total 2", monitor.metrics())
+
+    def test_profile_samples_the_loop_thread(self):
+        monitor = LoopMonitor()
+
+        async def main():
+            profile = asyncio.create_task(monitor.profile(0.2, 0.002))
+            await asyncio.sleep(0.01)
+            self.assertTrue(monitor.profiling)
+            spin(0.15)
+            samples = await profile
+            self.assertFalse(monitor.profiling)
+            return samples
+
+        samples = asyncio.run(main())
+        self.assertTrue(any(stack.endswith("test_loop_monitor.py:spin")
+                            for stack in samples))
+
+    def test_folded_lists_the_most_frequent_stacks_first(self):
+        samples = Counter({"a;b": 2, "a;c": 5})
+        self.assertEqual(folded(samples), "a;c 5\na;b 2")
+
+
+if __name__ == "__main__":
+    unittest.main()
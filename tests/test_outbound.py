@@ -0,0 +1,67 @@
+"""
+Tests for the coalescing message edit queue.
+"""
+import asyncio
+import unittest
+
+import discord
+
+from outbound import EditQueue
+from supervisor import TaskSupervisor
+
+
+class FakeMessage:
+
+    def __init__(self, message_id, channel_id, sent):
+        self.id = message_id
+        self.channel = discord.Object(id=channel_id)
+        self.sent = sent
+
+    async def edit(self, **kwargs):
+        await asyncio.sleep(0)
+        self.sent.append((self.id, kwargs["content"]))
+        return self
+
+
+class EditQueueTest(unittest.TestCase):
+
+    def test_newer_edits_replace_queued_ones(self):
+        async def main():
+            sent = []
+            tasks = TaskSupervisor()
+            edits = EditQueue(tasks)
+            message = FakeMessage(1, 10, sent)
+            first = edits.edit(message, content="one")
+            second = edits.edit(message, content="two")
+            await asyncio.gather(first, second)
+            await tasks.shutdown(1.0)
+            return sent, edits.stats(), tasks.stats()
+
+        sent, stats, tasks = asyncio.run(main())
+        self.assertEqual(sent, [(1, "two")])
+        self.assertEqual((stats["sent"], stats["coalesced"]), (1, 1))
+        self.assertEqual(tasks["edit_queue"]["finished"], 1)
+
+    def test_flush_sends_edits_queued_during_shutdown(self):
+        async def main():
+            sent = []
+            tasks = TaskSupervisor()
+            edits = EditQueue(tasks)
+            edits.edit(FakeMessage(1, 10, sent), content="before")
+            await edits.flush()
+            await tasks.shutdown(1.0)
+            # No worker can be started now; the edit waits for flush()
+            edits.edit(FakeMessage(2, 10, sent), content="after")
+            edits.edit(FakeMessage(3, 11, sent), content="elsewhere")
+            self.assertEqual(edits.depth, 2)
+            await edits.flush()
+            return sent, edits.depth
+
+        sent, depth = asyncio.run(main())
+        self.assertEqual(sorted(sent),
+                         [(1, "before"), (2, "after"), (3, "elsewhere")])
+        self.assertEqual(depth, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
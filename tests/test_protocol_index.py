@@ -0,0 +1,57 @@
+"""
+Tests for /protocol autocomplete and loose protocol IDs.
+"""
+import unittest
+
+from content import CONTENT_PATH, load_content
+from protocol_index import MAX_CHOICES, ProtocolIndex, normalize
+
+
+class ProtocolIndexTest(unittest.TestCase):
+
+    def setUp(self):
+        self.index = ProtocolIndex(
+            {"89-Ω": "Omega Strike", "3.14-π": "[PROTOCOL 3.14-π] Pie",
+             "8.19-β": ""},
+            hidden=["8.19-β"]
+        )
+
+    def names(self, query):
+        return [proto_id for _, proto_id in self.index.complete(query)]
+
+    def test_normalize_spells_out_greek(self):
+        self.assertEqual(normalize("89-Ω"), "89o")
+        self.assertEqual(normalize("89-Ω", spelled=True), "89omega")
+
+    def test_completes_ids_and_title_words(self):
+        self.assertEqual(self.names("89"), ["89-Ω"])
+        self.assertEqual(self.names("89 omega"), ["89-Ω"])
+        self.assertEqual(self.names("str"), ["89-Ω"])
+        self.assertEqual(self.names("pi"), ["3.14-π"])
+        self.assertEqual(self.names("zzz"), [])
+
+    def test_choice_names_include_the_id_once(self):
+        self.assertEqual(dict(self.index.complete("")), {
+            "89-Ω — Omega Strike": "89-Ω",
+            "[PROTOCOL 3.14-π] Pie": "3.14-π"
+        })
+
+    def test_hidden_protocols_resolve_but_are_not_suggested(self):
+        self.assertEqual(self.names("8"), ["89-Ω"])
+        self.assertNotIn("8.19-β", self.names(""))
+        self.assertEqual(self.index.resolve("8.19-b"), "8.19-β")
+        self.assertEqual(self.index.resolve("819 beta"), "8.19-β")
+        self.assertEqual(self.index.resolve("89-O"), "89-Ω")
+        self.assertIsNone(self.index.resolve("nope"))
+
+    def test_shipped_content_hides_action_protocols(self):
+        content = load_content(CONTENT_PATH)
+        suggested = {p for _, p in content.protocol_index.complete("")}
+        actions = {p for p, entry in content.protocols.items()
+                   if entry.get("action")}
+        self.assertTrue(actions)
+        self.assertFalse(suggested & actions)
+
+    def test_choices_are_capped(self):
+        index = ProtocolIndex({str(i): f"Title {i}" for i in range(40)})
+        self.assertEqual(len(index.complete("title")), MAX_CHOICES)
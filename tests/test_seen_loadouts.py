@@ -0,0 +1,118 @@
+"""
+Tests for the per-guild seen bitmaps, including sharing one file between
+processes.
+"""
+import multiprocessing
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from seen_loadouts import BLOCK_BITS, HEADER, MAGIC, SeenBitmap
+
+SIZE = BLOCK_BITS * 5 + 37
+
+
+def _add_every(path, start, step):
+    bitmap = SeenBitmap(path, SIZE)
+    try:
+        for index in range(start, SIZE, step):
+            bitmap.add(index)
+            # Keep the tree in use, so a stale one would trip select_unseen
+            with bitmap.locked():
+                remaining = bitmap.size - bitmap.count
+                if remaining:
+                    bitmap.select_unseen(remaining - 1)
+    finally:
+        bitmap.close()
+
+
+class SeenBitmapTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "guild.bits")
+
+    def open(self):
+        bitmap = SeenBitmap(self.path, SIZE)
+        self.addCleanup(bitmap.close)
+        return bitmap
+
+    def test_add_rank_and_select(self):
+        bitmap = self.open()
+        self.assertTrue(bitmap.add(3))
+        self.assertFalse(bitmap.add(3))
+        self.assertTrue(bitmap.add(BLOCK_BITS + 1))
+        self.assertEqual(bitmap.count, 2)
+        self.assertEqual(bitmap.rank(BLOCK_BITS * 2), 2)
+        self.assertEqual(bitmap.select_unseen(3), 4)
+        self.assertEqual(bitmap.select_unseen(SIZE - 3), SIZE - 1)
+        with self.assertRaises(IndexError):
+            bitmap.select_unseen(SIZE - 2)
+
+    def test_reopening_keeps_bits_and_count(self):
+        bitmap = SeenBitmap(self.path, SIZE)
+        bitmap.add(10)
+        bitmap.close()
+        bitmap = self.open()
+        self.assertIn(10, bitmap)
+        self.assertEqual(bitmap.count, 1)
+
+    def test_sees_bits_set_through_another_mapping(self):
+        first, second = self.open(), self.open()
+        # Build both trees before the other side changes anything
+        first.select_unseen(0)
+        second.select_unseen(0)
+        for index in range(BLOCK_BITS):
+            first.add(index)
+        second.add(BLOCK_BITS)
+        self.assertEqual(first.count, BLOCK_BITS + 1)
+        self.assertEqual(second.count, BLOCK_BITS + 1)
+        self.assertEqual(second.select_unseen(0), BLOCK_BITS + 1)
+        self.assertEqual(first.select_unseen(0), BLOCK_BITS + 1)
+        self.assertEqual(first.rank(BLOCK_BITS + 2), BLOCK_BITS + 1)
+
+    def test_catches_up_without_rebuilding(self):
+        first, second = self.open(), self.open()
+        first.select_unseen(0)
+        second.add(BLOCK_BITS * 3)
+        second.add(0)
+        with mock.patch.object(first, "_build_tree",
+                               side_effect=AssertionError("rebuilt")):
+            self.assertEqual(first.select_unseen(0), 1)
+            self.assertEqual(first.rank(BLOCK_BITS * 4), 2)
+            first.add(1)
+            self.assertEqual(first.select_unseen(BLOCK_BITS * 3 - 2),
+                             BLOCK_BITS * 3 + 1)
+
+    def test_keeps_bits_saved_before_the_log(self):
+        with open(self.path, "wb") as file:
+            file.write(HEADER.pack(MAGIC, 1))
+            file.write(b"\x04" + bytes((SIZE + 7) // 8 - 1))
+        bitmap = self.open()
+        self.assertIn(2, bitmap)
+        self.assertEqual(bitmap.count, 1)
+        self.assertEqual(bitmap.select_unseen(2), 3)
+        bitmap.add(3)
+        self.assertEqual(bitmap.select_unseen(2), 4)
+
+    def test_processes_adding_at_once_keep_the_count(self):
+        SeenBitmap(self.path, SIZE).close()
+        context = multiprocessing.get_context("spawn")
+        workers = [
+            context.Process(target=_add_every, args=(self.path, start, 3))
+            for start in range(3)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join(60)
+            self.assertEqual(worker.exitcode, 0)
+        bitmap = self.open()
+        self.assertEqual(bitmap.count, SIZE)
+        self.assertTrue(all(index in bitmap for index in range(SIZE)))
+
+
+if __name__ == "__main__":
+    unittest.main()
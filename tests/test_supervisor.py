@@ -0,0 +1,72 @@
+"""
+Tests for the background task supervisor.
+"""
+import asyncio
+import unittest
+
+from supervisor import TaskSupervisor
+
+
+class TaskSupervisorTest(unittest.TestCase):
+
+    def test_limits_queue_and_reject(self):
+        async def main():
+            tasks = TaskSupervisor({"slow": (1, 1)})
+            release = asyncio.Event()
+            done = []
+
+            async def job(name):
+                await release.wait()
+                done.append(name)
+
+            self.assertTrue(tasks.spawn("slow", job("a")))
+            self.assertTrue(tasks.spawn("slow", job("b")))
+            self.assertFalse(tasks.available("slow"))
+            self.assertFalse(tasks.spawn("slow", job("c")))
+            stats = tasks.stats()["slow"]
+            self.assertEqual((stats["running"], stats["queued"],
+                              stats["rejected"]), (1, 1, 1))
+            release.set()
+            await tasks.shutdown(1.0)
+            return done, tasks.stats()["slow"]
+
+        done, stats = asyncio.run(main())
+        # The queued job is dropped at shutdown, not started
+        self.assertEqual(done, ["a"])
+        self.assertEqual((stats["finished"], stats["cancelled"]), (1, 1))
+
+    def test_failures_are_reported(self):
+        errors = []
+
+        async def main():
+            tasks = TaskSupervisor(
+                on_error=lambda kind, err: errors.append((kind, str(err)))
+            )
+
+            async def fail():
+                raise ValueError("boom")
+
+            tasks.spawn("job", fail())
+            await tasks.shutdown(1.0)
+            return tasks.stats()["job"]["failed"]
+
+        self.assertEqual(asyncio.run(main()), 1)
+        self.assertEqual(errors, [("job", "boom")])
+
+    def test_shutdown_cancels_daemons_and_overdue_tasks(self):
+        async def main():
+            tasks = TaskSupervisor()
+            tasks.spawn("service", asyncio.sleep(3600), daemon=True)
+            tasks.spawn("stuck", asyncio.sleep(3600))
+            await tasks.shutdown(0.01)
+            self.assertFalse(tasks.spawn("late", asyncio.sleep(0)))
+            return tasks.stats()
+
+        stats = asyncio.run(main())
+        self.assertEqual(stats["service"]["cancelled"], 1)
+        self.assertEqual(stats["stuck"]["cancelled"], 1)
+        self.assertEqual(stats["late"]["rejected"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
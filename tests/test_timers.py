@@ -0,0 +1,146 @@
+"""
+Tests for the hierarchical timer wheel.
+"""
+import asyncio
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import timers
+from supervisor import TaskSupervisor
+from timers import SLOTS, TICK, TimerWheel
+
+
+class TimerWheelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1_000_000.0
+        patcher = mock.patch.object(timers.time, "time", lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.fired = []
+        self.wheel = self.new_wheel()
+
+    def new_wheel(self):
+        wheel = TimerWheel()
+
+        @wheel.action("note")
+        def note(name):
+            self.fired.append((name, round(self.now, 1)))
+        return wheel
+
+    def advance(self, seconds, wheel=None):
+        """
+        Move the clock forward one tick at a time, turning the wheel.
+        """
+        wheel = wheel or self.wheel
+        for _ in range(round(seconds / TICK)):
+            self.now += TICK
+            wheel._advance(wheel._now_tick())
+
+    def test_fires_on_time(self):
+        start = self.now
+        # Level 0 and level 1
+        delays = {"soon": 0.5, "later": SLOTS * TICK * 3 + 0.3}
+        for name, delay in delays.items():
+            self.wheel.schedule(delay, "note", name=name)
+        self.advance(delays["later"] + TICK)
+        self.assertEqual([name for name, _ in self.fired], list(delays))
+        for name, when in self.fired:
+            # Never early, and at most a tick late
+            self.assertGreaterEqual(when, round(start + delays[name], 1))
+            self.assertLessEqual(when, round(start + delays[name] + TICK, 1))
+        self.assertEqual(self.wheel.stats()["fired"], 2)
+
+    def test_far_timers_cascade_down(self):
+        # Level 2, turned in one jump
+        delay = SLOTS * SLOTS * TICK + 1.0
+        self.wheel.schedule(delay, "note", name="much_later")
+        self.now += delay - TICK
+        self.wheel._advance(self.wheel._now_tick())
+        self.assertEqual(self.fired, [])
+        self.now += 2 * TICK
+        self.wheel._advance(self.wheel._now_tick())
+        self.assertEqual([name for name, _ in self.fired], ["much_later"])
+        self.assertEqual(self.wheel.pending, 0)
+
+    def test_timers_past_the_wheel_wait_in_overflow(self):
+        self.wheel.schedule(SLOTS ** 3 * TICK + 2.0, "note", name="overflow")
+        self.assertEqual(len(self.wheel._overflow), 1)
+        self.assertEqual(self.wheel.pending, 1)
+        self.assertEqual([timer.kind for timer in self.wheel._records()],
+                         ["note"])
+
+    def test_cancelled_timers_dont_fire(self):
+        timer = self.wheel.schedule(1.0, "note", name="cancelled")
+        self.wheel.schedule(1.0, "note", name="kept")
+        timer.cancel()
+        self.advance(2.0)
+        self.assertEqual([name for name, _ in self.fired], ["kept"])
+
+    def test_unknown_actions_are_rejected(self):
+        with self.assertRaises(KeyError):
+            self.wheel.schedule(1.0, "missing")
+
+    def test_failing_actions_are_counted(self):
+        @self.wheel.action("boom")
+        def boom():
+            raise ValueError("boom")
+
+        self.wheel.schedule(0.1, "boom")
+        with mock.patch("sys.stderr"):
+            self.advance(0.5)
+        self.assertEqual(self.wheel.stats()["failed"], 1)
+
+    def test_saved_timers_resume_after_a_restart(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "timers.json")
+            self.wheel.schedule(5.0, "note", name="overdue")
+            self.wheel.schedule(60.0, "note", name="pending")
+            self.wheel.schedule(5.0, "note", name="cancelled").cancel()
+            with mock.patch("builtins.print"):
+                self.wheel.save(path)
+            # Down for 10 seconds
+            self.now += 10.0
+            wheel = self.new_wheel()
+            with mock.patch("builtins.print"):
+                wheel.load(path)
+            self.assertFalse(os.path.exists(path))
+            self.assertEqual(wheel.pending, 2)
+            self.advance(TICK, wheel)
+            self.assertEqual([name for name, _ in self.fired], ["overdue"])
+            self.advance(50.0, wheel)
+            self.assertEqual([name for name, _ in self.fired],
+                             ["overdue", "pending"])
+
+
+class TimerWheelDrainTest(unittest.TestCase):
+
+    def test_fires_what_comes_due_after_the_supervisor_closed(self):
+        async def main():
+            tasks = TaskSupervisor()
+            wheel = TimerWheel(tasks)
+            fired = []
+
+            @wheel.action("ping")
+            async def ping(name):
+                await asyncio.sleep(0)
+                fired.append(name)
+
+            tasks.spawn("timer_wheel", wheel.run(), daemon=True)
+            wheel.schedule(0.3, "ping", name="during")
+            wheel.schedule(60, "ping", name="after")
+            await tasks.shutdown(1.0)
+            wheel.schedule(0, "ping", name="scheduled_late")
+            await wheel.drain(1.0)
+            return fired, wheel.stats()
+
+        fired, stats = asyncio.run(main())
+        self.assertEqual(sorted(fired), ["during", "scheduled_late"])
+        self.assertEqual(stats["pending"], 1)
+        self.assertEqual(stats["failed"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
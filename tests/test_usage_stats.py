@@ -0,0 +1,79 @@
+"""
+Tests for write-behind usage statistics.
+"""
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from usage_stats import SCHEMA, UsageStats, connect
+
+
+class FailingOnce:
+    """
+    Database connection whose first write fails.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.failed = False
+
+    def __enter__(self):
+        return self.db.__enter__()
+
+    def __exit__(self, *exc):
+        return self.db.__exit__(*exc)
+
+    def executemany(self, sql, rows):
+        if not self.failed:
+            self.failed = True
+            raise sqlite3.OperationalError("database is locked")
+        return self.db.executemany(sql, rows)
+
+
+class UsageStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.dir.cleanup)
+        self.path = os.path.join(self.dir.name, "stats.sqlite3")
+        self.usage = UsageStats(self.path, interval=60)
+        self.addCleanup(self.usage.close)
+
+    def test_reports_count_recorded_events(self):
+        for user_id in (1, 1, 2):
+            self.usage.command("threaten", 10, user_id)
+        # Threats, from /threaten or /threaten_creator, make both boards
+        for user_id, target_id in ((1, 3), (1, 4), (2, 3)):
+            self.usage.threat(10, user_id, target_id)
+        self.usage.items("loadout", 10, ["Chainsaw", "Chainsaw", "Drill"])
+        self.usage.close()
+        report = self.usage.guild_report(10)
+        self.assertEqual(report["commands"], [("threaten", 3)])
+        self.assertEqual(report["threateners"], [(1, 2), (2, 1)])
+        self.assertEqual(report["threatened"], [(3, 2), (4, 1)])
+        self.assertEqual(report["loadout"], [("Chainsaw", 2), ("Drill", 1)])
+        self.assertEqual(self.usage.user_report(10, 1)["victims"],
+                         [(3, 1), (4, 1)])
+        self.assertEqual(self.usage.stats()["flushed"], 9)
+
+    def test_failed_flush_keeps_its_events(self):
+        db = connect(self.path)
+        db.executescript(SCHEMA)
+        self.usage.command("greet", 10, 1)
+        self.usage.command("greet", 10, 1)
+        flaky = FailingOnce(db)
+        with self.assertRaises(sqlite3.Error):
+            self.usage._flush(flaky)
+        self.assertEqual(self.usage.stats()["unwritten"], 2)
+        self.usage.command("greet", 10, 1)
+        self.usage._flush(flaky)
+        self.assertEqual(self.usage.stats()["unwritten"], 0)
+        self.assertEqual(self.usage.guild_report(10)["commands"],
+                         [("greet", 3)])
+
+    def test_disabled_without_a_path(self):
+        usage = UsageStats(None)
+        usage.command("greet", 10, 1)
+        self.assertEqual(usage.guild_report(10), {})
+        self.assertEqual(usage.stats()["recorded"], 0)
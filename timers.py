@@ -0,0 +1,283 @@
+"""
+Hierarchical timer wheel for deferred actions.
+
+Delayed edits, follow-ups and self-destruct steps used to be coroutines
+sleeping inside their command handler, one suspended task per interaction.
+Here each one is a small record (due time, action name, JSON-able arguments)
+dropped into a slot of a timer wheel, and a single driver task fires them.
+Handlers schedule and return straight away.
+
+The wheel has LEVELS levels of SLOTS slots. Level 0 slots are one TICK wide;
+each higher level's slots span a full turn of the level below and are
+cascaded down into it as the wheel turns, so scheduling and firing are O(1)
+whatever the number of pending timers. With the defaults that covers about
+19 days; anything later waits in an overflow list.
+
+Because records only hold plain data, pending actions can be saved on
+shutdown and loaded on the next start. Due times are wall-clock, so actions
+that came due while the bot was down fire as soon as it's back.
+"""
+import asyncio
+import inspect
+import json
+import math
+import os
+import sys
+import time
+from functools import partial
+
+# Seconds per level 0 slot
+TICK = 0.1
+# Slots per level (a power of two) and number of levels
+SLOT_BITS = 8
+LEVELS = 3
+
+SLOTS = 1 << SLOT_BITS
+SLOT_MASK = SLOTS - 1
+
+
+class Timer:
+    """
+    One scheduled action.
+    """
+    __slots__ = ("due", "tick", "kind", "args", "cancelled")
+
+    def __init__(self, due, tick, kind, args):
+        self.due = due
+        self.tick = tick
+        self.kind = kind
+        self.args = args
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    """
+    Schedules named actions to run after a delay.
+    """
+
+    def __init__(self, supervisor=None):
+        """
+        Async actions run as tasks of `supervisor` (a TaskSupervisor) if
+        given, with kind "timer:<action>", so they're limited and drained
+        like other background work.
+        """
+        self.supervisor = supervisor
+        self._wheel = [[[] for _ in range(SLOTS)] for _ in range(LEVELS)]
+        self._overflow: list[Timer] = []
+        self._tick = self._now_tick()
+        self._actions = {}
+        self._wakeup = None
+        self._tasks = set()
+        self.pending = 0
+        self.fired = 0
+        self.failed = 0
+
+    @staticmethod
+    def _now_tick() -> int:
+        return int(time.time() / TICK)
+
+    def action(self, kind: str):
+        """
+        Decorator registering the function run for timers of this kind. It's
+        called with the timer's arguments as keywords and may be async.
+        """
+        def decorator(func):
+            self._actions[kind] = func
+            return func
+        return decorator
+
+    def schedule(self, delay: float, kind: str, **args) -> Timer:
+        """
+        Run action `kind` with `args` in `delay` seconds. Arguments must be
+        JSON-serializable so the timer can outlive a restart.
+        """
+        if kind not in self._actions:
+            raise KeyError(f"No timer action named {kind!r}")
+        return self._schedule_at(time.time() + delay, kind, args)
+
+    def _schedule_at(self, due: float, kind: str, args: dict) -> Timer:
+        if not self.pending:
+            # Nothing to fire while idle, so skip ahead instead of walking
+            self._tick = max(self._tick, self._now_tick())
+        timer = Timer(due, max(self._tick + 1, math.ceil(due / TICK)), kind,
+                      args)
+        self._insert(timer)
+        self.pending += 1
+        if self._wakeup is not None:
+            self._wakeup.set()
+        return timer
+
+    def _insert(self, timer: Timer):
+        """
+        File a timer under the lowest level whose current turn contains its
+        tick.
+        """
+        tick = timer.tick
+        for level in range(LEVELS):
+            shift = SLOT_BITS * (level + 1)
+            if tick >> shift == self._tick >> shift:
+                slot = (tick >> (SLOT_BITS * level)) & SLOT_MASK
+                self._wheel[level][slot].append(timer)
+                return
+        self._overflow.append(timer)
+
+    def _advance(self, now_tick: int):
+        """
+        Turn the wheel up to now_tick, firing every timer that came due.
+        """
+        if not self.pending:
+            self._tick = max(self._tick, now_tick)
+            return
+        while self._tick < now_tick:
+            self._tick += 1
+            tick = self._tick
+            # At the start of a higher level slot's span, cascade its timers
+            # down; at the start of a whole new turn, retry the overflow
+            for level in range(1, LEVELS + 1):
+                if tick & ((1 << (SLOT_BITS * level)) - 1):
+                    break
+                if level == LEVELS:
+                    timers, self._overflow = self._overflow, []
+                else:
+                    slots = self._wheel[level]
+                    slot = (tick >> (SLOT_BITS * level)) & SLOT_MASK
+                    timers, slots[slot] = slots[slot], []
+                for timer in timers:
+                    self._insert(timer)
+
+            slots = self._wheel[0]
+            due, slots[tick & SLOT_MASK] = slots[tick & SLOT_MASK], []
+            for timer in due:
+                self._fire(timer)
+
+    def _fire(self, timer: Timer):
+        self.pending -= 1
+        if timer.cancelled:
+            return
+        try:
+            result = self._actions[timer.kind](**timer.args)
+            if inspect.isawaitable(result) and self.supervisor is not None \
+                    and not self.supervisor.closing:
+                # The supervisor reports failures
+                if self.supervisor.spawn(f"timer:{timer.kind}", result):
+                    self.fired += 1
+                else:
+                    self.failed += 1
+            elif inspect.isawaitable(result):
+                task = asyncio.ensure_future(result)
+                self._tasks.add(task)
+                task.add_done_callback(partial(self._finished, timer.kind))
+            else:
+                self.fired += 1
+        except Exception as err:
+            self._report(timer.kind, err)
+
+    def _finished(self, kind: str, task: asyncio.Task):
+        self._tasks.discard(task)
+        if task.cancelled():
+            return
+        err = task.exception()
+        if err is not None:
+            self._report(kind, err)
+        else:
+            self.fired += 1
+
+    def _report(self, kind, err):
+        self.failed += 1
+        print(f"[ERROR]: Timer action {kind} failed: "
+              f"{type(err).__name__}: {err}", file=sys.stderr)
+
+    async def run(self):
+        """
+        Drive the wheel: wake every tick while timers are pending, and sleep
+        until something is scheduled otherwise.
+        """
+        self._wakeup = asyncio.Event()
+        while True:
+            if not self.pending:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            self._advance(self._now_tick())
+            next_tick = (self._tick + 1) * TICK
+            await asyncio.sleep(max(0.0, next_tick - time.time()))
+
+    async def drain(self, timeout: float):
+        """
+        Fire the timers that come due within `timeout` seconds and wait for
+        their actions, for shutting down once the supervisor has closed (its
+        daemons, run() included, are cancelled by then, so async actions run
+        as the wheel's own tasks). Later timers stay pending for save().
+        """
+        deadline = time.time() + timeout
+        while True:
+            self._advance(self._now_tick())
+            due_soon = any(timer.due <= deadline for timer in self._records())
+            if not (due_soon or self._tasks) or time.time() >= deadline:
+                break
+            await asyncio.sleep(min(TICK, deadline - time.time()))
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> dict:
+        return {
+            "pending": self.pending,
+            "running": len(self._tasks),
+            "fired": self.fired,
+            "failed": self.failed
+        }
+
+    def _records(self):
+        for level in self._wheel:
+            for slot in level:
+                for timer in slot:
+                    if not timer.cancelled:
+                        yield timer
+        for timer in self._overflow:
+            if not timer.cancelled:
+                yield timer
+
+    def save(self, path: str):
+        """
+        Write all pending timers to `path` (atomically).
+        """
+        records = [
+            {"due": timer.due, "kind": timer.kind, "args": timer.args}
+            for timer in sorted(self._records(), key=lambda t: t.due)
+        ]
+        if not records:
+            if os.path.exists(path):
+                os.remove(path)
+            return
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as file:
+            json.dump(records, file)
+        os.replace(temp_path, path)
+        print(f"Saved {len(records)} pending timers to {path}.")
+
+    def load(self, path: str):
+        """
+        Schedule the timers saved in `path`, then remove it.
+        """
+        try:
+            with open(path, encoding="utf-8") as file:
+                records = json.load(file)
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as err:
+            print(f"[ERROR]: Couldn't load pending timers from {path}: {err}",
+                  file=sys.stderr)
+            return
+        loaded = 0
+        for record in records:
+            if record.get("kind") not in self._actions:
+                print(f"[ERROR]: Dropping saved timer with unknown action "
+                      f"{record.get('kind')!r}", file=sys.stderr)
+                continue
+            self._schedule_at(record["due"], record["kind"], record["args"])
+            loaded += 1
+        os.remove(path)
+        print(f"Resumed {loaded} pending timers from {path}.")
@@ -0,0 +1,276 @@
+"""
+Write-behind usage statistics in SQLite, for /stats.
+
+Commands record small events (who ran what, who threatened whom, which
+loadout parts and protocols came up) into an in-memory buffer; recording is
+a deque append, so it costs the event loop next to nothing. A background
+thread drains the buffer every `interval` seconds, folds the events into
+counts and applies them to the aggregate tables in one transaction. The
+database runs in WAL mode, so /stats reads (done in a worker thread) never
+wait on a flush, and several processes can share one file.
+
+Counts lag behind by up to one flush interval.
+"""
+import atexit
+import sqlite3
+import sys
+import threading
+from collections import Counter, deque
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS guild_commands (
+    guild_id INTEGER NOT NULL,
+    command TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, command)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS user_commands (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    command TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id, command)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS user_commands_rank
+    ON user_commands (guild_id, command, count DESC);
+CREATE TABLE IF NOT EXISTS threats (
+    guild_id INTEGER NOT NULL,
+    user_id INTEGER NOT NULL,
+    target_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, user_id, target_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS threats_target
+    ON threats (guild_id, target_id);
+CREATE TABLE IF NOT EXISTS items (
+    guild_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    item TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (guild_id, kind, item)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS items_rank
+    ON items (guild_id, kind, count DESC);
+"""
+
+UPSERTS = {
+    "command": (
+        "INSERT INTO user_commands VALUES (?, ?, ?, ?) "
+        "ON CONFLICT DO UPDATE SET count = count + excluded.count"
+    ),
+    "threat": (
+        "INSERT INTO threats VALUES (?, ?, ?, ?) "
+        "ON CONFLICT DO UPDATE SET count = count + excluded.count"
+    ),
+    "item": (
+        "INSERT INTO items VALUES (?, ?, ?, ?) "
+        "ON CONFLICT DO UPDATE SET count = count + excluded.count"
+    )
+}
+GUILD_UPSERT = (
+    "INSERT INTO guild_commands VALUES (?, ?, ?) "
+    "ON CONFLICT DO UPDATE SET count = count + excluded.count"
+)
+
+
+def connect(path: str) -> sqlite3.Connection:
+    db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=NORMAL")
+    return db
+
+
+class UsageStats:
+    """
+    Buffered event recorder and leaderboard queries over one database file.
+    With no path, events are dropped and queries return nothing.
+    """
+
+    def __init__(self, path: str = None, interval: float = 2.0,
+                 max_pending: int = 100_000):
+        self.path = path
+        self.interval = interval
+        self._pending = deque(maxlen=max_pending)
+        # Counts from a flush that failed, retried with the next one
+        self._unwritten = Counter()
+        self._wake = threading.Event()
+        self._closing = False
+        self._thread = None
+        self._local = threading.local()
+        self.recorded = 0
+        self.dropped = 0
+        self.flushed = 0
+        self.flushes = 0
+
+    # Recording (event loop)
+
+    def _record(self, event: tuple):
+        if self.path is None:
+            return
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1  # The deque drops the oldest event
+        self._pending.append(event)
+        self.recorded += 1
+        if self._thread is None:
+            self._start()
+        elif len(self._pending) == self._pending.maxlen // 2:
+            self._wake.set()  # Flush early rather than start dropping
+
+    def command(self, command: str, guild_id, user_id: int):
+        self._record(("command", guild_id or 0, user_id, command))
+
+    def threat(self, guild_id, user_id: int, target_id: int):
+        self._record(("threat", guild_id or 0, user_id, target_id))
+
+    def items(self, kind: str, guild_id, items):
+        for item in items:
+            self._record(("item", guild_id or 0, kind, item))
+
+    # Writing (background thread)
+
+    def _start(self):
+        self._thread = threading.Thread(
+            target=self._write_loop, name="usage-stats", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _write_loop(self):
+        db = None
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            closing = self._closing
+            try:
+                if db is None:
+                    db = connect(self.path)
+                    db.executescript(SCHEMA)
+                self._flush(db)
+            except sqlite3.Error as err:
+                print(f"[ERROR]: Couldn't write usage stats: {err}",
+                      file=sys.stderr)
+            if closing:
+                if db is not None:
+                    db.close()
+                return
+
+    def _flush(self, db: sqlite3.Connection):
+        """
+        Fold everything buffered into counts and apply them in one
+        transaction.
+        """
+        counts, self._unwritten = self._unwritten, Counter()
+        pop = self._pending.popleft
+        for _ in range(len(self._pending)):
+            counts[pop()] += 1
+        if not counts:
+            return
+        rows = {kind: [] for kind in UPSERTS}
+        guild_rows = Counter()
+        for (kind, *key), count in counts.items():
+            rows[kind].append((*key, count))
+            if kind == "command":
+                guild_rows[key[0], key[2]] += count
+        try:
+            with db:
+                for kind, values in rows.items():
+                    if values:
+                        db.executemany(UPSERTS[kind], values)
+                db.executemany(
+                    GUILD_UPSERT,
+                    [(*key, count) for key, count in guild_rows.items()]
+                )
+        except sqlite3.Error:
+            # Rolled back; keep the counts for the next flush
+            self._unwritten = counts
+            raise
+        self.flushed += sum(counts.values())
+        self.flushes += 1
+
+    def close(self):
+        """
+        Flush what's still buffered, then stop the writer thread.
+        """
+        if self._thread is not None and self._thread.is_alive():
+            self._closing = True
+            self._wake.set()
+            self._thread.join(timeout=10)
+
+    # Queries (worker threads; run them with asyncio.to_thread)
+
+    def _reader(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = connect(self.path)
+            db.executescript(SCHEMA)
+        return db
+
+    def guild_report(self, guild_id, limit: int = 5) -> dict:
+        """
+        Command totals and leaderboards for one guild.
+        """
+        if self.path is None:
+            return {}
+        db = self._reader()
+        guild_id = guild_id or 0
+        return {
+            "commands": db.execute(
+                "SELECT command, count FROM guild_commands WHERE guild_id = ? "
+                "ORDER BY count DESC", (guild_id,)
+            ).fetchall(),
+            "threateners": db.execute(
+                "SELECT user_id, SUM(count) AS total FROM threats "
+                "WHERE guild_id = ? GROUP BY user_id ORDER BY total DESC "
+                "LIMIT ?", (guild_id, limit)
+            ).fetchall(),
+            "threatened": db.execute(
+                "SELECT target_id, SUM(count) AS total FROM threats "
+                "WHERE guild_id = ? GROUP BY target_id ORDER BY total DESC "
+                "LIMIT ?", (guild_id, limit)
+            ).fetchall(),
+            "loadout": db.execute(
+                "SELECT item, count FROM items WHERE guild_id = ? AND "
+                "kind = 'loadout' ORDER BY count DESC LIMIT ?",
+                (guild_id, limit)
+            ).fetchall(),
+            "protocol": db.execute(
+                "SELECT item, count FROM items WHERE guild_id = ? AND "
+                "kind = 'protocol' ORDER BY count DESC LIMIT ?",
+                (guild_id, limit)
+            ).fetchall()
+        }
+
+    def user_report(self, guild_id, user_id: int, limit: int = 5) -> dict:
+        """
+        One user's command counts and threat history in a guild.
+        """
+        if self.path is None:
+            return {}
+        db = self._reader()
+        guild_id = guild_id or 0
+        return {
+            "commands": db.execute(
+                "SELECT command, count FROM user_commands WHERE guild_id = ? "
+                "AND user_id = ? ORDER BY count DESC", (guild_id, user_id)
+            ).fetchall(),
+            "victims": db.execute(
+                "SELECT target_id, count FROM threats WHERE guild_id = ? AND "
+                "user_id = ? ORDER BY count DESC LIMIT ?",
+                (guild_id, user_id, limit)
+            ).fetchall(),
+            "threatened_by": db.execute(
+                "SELECT user_id, count FROM threats WHERE guild_id = ? AND "
+                "target_id = ? ORDER BY count DESC LIMIT ?",
+                (guild_id, user_id, limit)
+            ).fetchall()
+        }
+
+    def stats(self) -> dict:
+        return {
+            "recorded": self.recorded,
+            "pending": len(self._pending),
+            "unwritten": sum(self._unwritten.values()),
+            "dropped": self.dropped,
+            "flushed": self.flushed,
+            "flushes": self.flushes
+        }